@@ -0,0 +1,76 @@
+"""Registry of `lmspace` backends, loaded on demand.
+
+Each top-level command (`lmspace code ...`) is a backend: a module exposing
+
+    add_parsers(parser: argparse.ArgumentParser) -> None
+    run(args: argparse.Namespace) -> int
+
+Only the backend named on the command line is imported, so one backend's
+dependencies never slow down another's commands. Built-in backends are listed
+in BUILTIN_BACKENDS. Other packages can add backends through the
+`lmspace.backends` entry point group, e.g. in their pyproject.toml:
+
+    [project.entry-points."lmspace.backends"]
+    chat = "my_package.lmspace_backend"
+
+Entry points are only scanned when the command is not a built-in backend,
+because reading installed package metadata costs more than the rest of
+startup.
+"""
+
+from __future__ import annotations
+
+import importlib
+from typing import Any, NamedTuple, Optional
+
+ENTRY_POINT_GROUP = "lmspace.backends"
+
+
+class BackendSpec(NamedTuple):
+    """Where to find a backend and how to describe it in `lmspace --help`."""
+
+    name: str
+    target: str  # "module" or "module:attribute"
+    help: str
+
+
+BUILTIN_BACKENDS = {
+    "code": BackendSpec("code", "lmspace.vscode.cli", "Manage VS Code workspace agents"),
+}
+
+
+def _entry_point_specs() -> dict[str, BackendSpec]:
+    from importlib.metadata import entry_points
+
+    specs = {}
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name in BUILTIN_BACKENDS:
+            continue
+        dist = entry_point.dist.name if entry_point.dist else entry_point.module
+        specs[entry_point.name] = BackendSpec(
+            entry_point.name, entry_point.value, f"Backend provided by {dist}"
+        )
+    return specs
+
+
+def backend_specs(selected: Optional[str] = None) -> dict[str, BackendSpec]:
+    """Return the known backends by name.
+
+    When `selected` is a built-in backend, installed entry points are not
+    scanned.
+    """
+    if selected in BUILTIN_BACKENDS:
+        return dict(BUILTIN_BACKENDS)
+    return {**BUILTIN_BACKENDS, **_entry_point_specs()}
+
+
+def load_backend(spec: BackendSpec) -> Any:
+    """Import a backend and return the object providing add_parsers/run."""
+    module_name, _, attribute = spec.target.partition(":")
+    backend: Any = importlib.import_module(module_name)
+    for part in filter(None, attribute.split(".")):
+        backend = getattr(backend, part)
+    for required in ("add_parsers", "run"):
+        if not callable(getattr(backend, required, None)):
+            raise TypeError(f"lmspace backend {spec.name!r} ({spec.target}) has no {required}()")
+    return backend
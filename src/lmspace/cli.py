@@ -4,61 +4,53 @@ from __future__ import annotations
 
 import argparse
 import sys
-from typing import Sequence
+from typing import Optional, Sequence
+
+from .backends import backend_specs, load_backend
+
+
+def _selected_command(argv: Sequence[str]) -> Optional[str]:
+    """Return the backend named on the command line, if any."""
+    for arg in argv:
+        if not arg.startswith("-"):
+            return arg
+        if arg in ("-h", "--help"):
+            return None
+    return None
 
 
 def main(argv: Sequence[str] | None = None) -> int:
     """Main entry point for the lmspace CLI."""
+    if argv is None:
+        argv = sys.argv[1:]
+
     parser = argparse.ArgumentParser(
         prog="lmspace",
         description="Manage workspace agents across different backends",
     )
-    
+
     subparsers = parser.add_subparsers(
         dest="command",
         help="Available commands",
         required=True,
     )
-    
-    # Add the 'code' subcommand for VS Code workspace agents
-    code_parser = subparsers.add_parser(
-        "code",
-        help="Manage VS Code workspace agents",
-    )
-    code_subparsers = code_parser.add_subparsers(
-        dest="action",
-        help="VS Code agent actions",
-        required=True,
-    )
-    
-    # Add 'code provision' subcommand
-    from .vscode.cli import add_provision_parser, add_chat_parser, add_warmup_parser, add_list_parser, add_unlock_parser
-    add_provision_parser(code_subparsers)
-    add_chat_parser(code_subparsers)
-    add_warmup_parser(code_subparsers)
-    add_list_parser(code_subparsers)
-    add_unlock_parser(code_subparsers)
-    
+
+    # Only the backend being invoked is imported; the others just get a
+    # placeholder parser so they show up in --help and as valid choices
+    selected = _selected_command(argv)
+    backend = None
+    for spec in backend_specs(selected).values():
+        backend_parser = subparsers.add_parser(spec.name, help=spec.help)
+        if spec.name == selected:
+            backend = load_backend(spec)
+            backend.add_parsers(backend_parser)
+
     args = parser.parse_args(argv)
-    
+
     # Route to the appropriate handler
-    if args.command == "code":
-        if args.action == "provision":
-            from .vscode.cli import handle_provision
-            return handle_provision(args)
-        elif args.action == "chat":
-            from .vscode.cli import handle_chat
-            return handle_chat(args)
-        elif args.action == "warmup":
-            from .vscode.cli import handle_warmup
-            return handle_warmup(args)
-        elif args.action == "list":
-            from .vscode.cli import handle_list
-            return handle_list(args)
-        elif args.action == "unlock":
-            from .vscode.cli import handle_unlock
-            return handle_unlock(args)
-    
+    if backend is not None:
+        return backend.run(args)
+
     return 1
 
 
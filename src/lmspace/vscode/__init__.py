@@ -2,10 +2,22 @@
 
 from __future__ import annotations
 
-from .agent_dispatch import dispatch_agent
-from .provision import provision_subagents
+from typing import Any
 
 __all__ = [
     "dispatch_agent",
     "provision_subagents",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    # Resolved on first use so `import lmspace.vscode.cli` stays cheap
+    if name == "dispatch_agent":
+        from .agent_dispatch import dispatch_agent
+
+        return dispatch_agent
+    if name == "provision_subagents":
+        from .provision import provision_subagents
+
+        return provision_subagents
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
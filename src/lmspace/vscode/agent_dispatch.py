@@ -3,22 +3,59 @@
 from __future__ import annotations
 
 import argparse
+import codecs
+import functools
 import json
 import os
 import shutil
+import socket
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
 import uuid
-from datetime import datetime
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional, Sequence
+from typing import Any, Callable, Optional, Sequence
 
-DEFAULT_LOCK_NAME = "subagent.lock"
+from .defaults import (
+    DEFAULT_LOCK_NAME,
+    DEFAULT_WARMUP_CONCURRENCY,
+    DEFAULT_WARMUP_RETRIES,
+    DEFAULT_WARMUP_TIMEOUT,
+)
+from .launcher import get_launcher
+from .pool_state import STATUS_LOCKED, PoolStateStore, open_pool_state, read_lock_file
+from .tracing import set_attribute, span, trace, trace_file_for
+
+SUBAGENT_ROOT_ENV = "LMSPACE_SUBAGENT_ROOT"
+# Safety-net interval at which queued waiters re-check without a wakeup
+QUEUE_RECHECK_INTERVAL = 5.0
+# Lease lifetimes: async agents get DEFAULT_LEASE_TTL (or LMSPACE_LEASE_TTL) to run
+# `lmspace code unlock`; a process waiting on its agent renews a shorter lease
+# every HEARTBEAT_INTERVAL.
+LEASE_TTL_ENV = "LMSPACE_LEASE_TTL"
+DEFAULT_LEASE_TTL = 3600.0
+HEARTBEAT_INTERVAL = 30.0
+HEARTBEAT_TTL = 120.0
+# Responses are copied to stdout in chunks of this size, never read whole
+RESPONSE_CHUNK_SIZE = 64 * 1024
+# Poll interval bounds while tailing a response that is still being written
+STREAM_POLL_MIN_INTERVAL = 0.02
+STREAM_POLL_MAX_INTERVAL = 0.5
+
+# `code -r chat` targets the focused window, so focusing a workspace and
+# sending its chat must not interleave between concurrent dispatches.
+_LAUNCH_LOCK = threading.Lock()
 
 
 def get_subagent_root() -> Path:
-    """Get the root directory for subagents."""
+    """Get the root directory for subagents (LMSPACE_SUBAGENT_ROOT overrides it)."""
+    configured = os.environ.get(SUBAGENT_ROOT_ENV)
+    if configured:
+        return Path(configured).expanduser()
     return Path.home() / ".lmspace" / "vscode-agents"
 
 
@@ -31,18 +68,10 @@ def get_all_subagent_workspaces(subagent_root: Path) -> list[Path]:
     if not subagent_root.exists():
         return []
     
-    subagents = sorted(
-        (d for d in subagent_root.iterdir() if d.is_dir() and d.name.startswith("subagent-")),
-        key=lambda d: int(d.name.split("-")[1])
-    )
-    
-    workspaces = []
-    for subagent_dir in subagents:
-        workspace_file = subagent_dir / f"{subagent_dir.name}.code-workspace"
-        if workspace_file.exists():
-            workspaces.append(workspace_file)
+    with open_pool_state(subagent_root) as store:
+        records = store.list_subagents()
     
-    return workspaces
+    return [Path(record["workspace"]) for record in records if record["workspace"]]
 
 
 def get_default_template_dir() -> Path:
@@ -53,73 +82,442 @@ def get_default_template_dir() -> Path:
 def find_unlocked_subagent(subagent_root: Path) -> Optional[Path]:
     """Find the first unlocked subagent directory.
     
-    Returns the path to the first subagent-* directory that does not contain
-    a subagent.lock file. Returns None if no unlocked subagents are found.
+    Returns the path to the first subagent-* directory that is recorded as
+    unlocked in the pool state store. Returns None if no unlocked subagents
+    are found. This only peeks; use claim_subagent to take a subagent.
     """
     if not subagent_root.exists():
         return None
     
-    subagents = sorted(
-        (d for d in subagent_root.iterdir() if d.is_dir() and d.name.startswith("subagent-")),
-        key=lambda d: int(d.name.split("-")[1])
-    )
+    with open_pool_state(subagent_root) as store:
+        return store.first_available()
+
+
+def lease_ttl() -> float:
+    """Return the lifetime in seconds of a lease nobody renews (LMSPACE_LEASE_TTL)."""
+    try:
+        ttl = float(os.environ.get(LEASE_TTL_ENV, DEFAULT_LEASE_TTL))
+    except ValueError:
+        return DEFAULT_LEASE_TTL
+    return ttl if ttl > 0 else DEFAULT_LEASE_TTL
+
+
+def _lock_metadata(request_id: Optional[str]) -> dict[str, Any]:
+    """Build the lease metadata recorded in a subagent lock file."""
+    now = datetime.now(timezone.utc)
+    return {
+        "pid": os.getpid(),
+        "host": socket.gethostname(),
+        "request_id": request_id,
+        "acquired_at": now.isoformat(),
+        "expires_at": (now + timedelta(seconds=lease_ttl())).isoformat(),
+    }
+
+
+def renew_lease(
+    subagent_dir: Path,
+    *,
+    request_id: Optional[str],
+    ttl: float = HEARTBEAT_TTL,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    heartbeat: bool = True,
+) -> bool:
+    """Extend a held lease and mark it as kept alive by this process.
+    
+    A heartbeat lease expires `ttl` seconds after its last renewal, and the
+    reaper may reclaim it as soon as the renewing process has exited. With
+    heartbeat=False the lease is handed back to the agent: it lasts `ttl`
+    seconds whether or not this process keeps running.
+    
+    Returns False if the lock is gone or held by a different request.
+    """
+    lock_file = subagent_dir / lock_name
+    with open_pool_state(subagent_dir.parent, lock_name=lock_name) as store:
+        with store.transaction():
+            lease = read_lock_file(lock_file)
+            if lease is None or lease.get("request_id") != request_id:
+                return False
+            now = datetime.now(timezone.utc)
+            lease.update(
+                pid=os.getpid(),
+                host=socket.gethostname(),
+                heartbeat=heartbeat,
+                heartbeat_at=now.isoformat(),
+                expires_at=(now + timedelta(seconds=ttl)).isoformat(),
+            )
+            tmp_file = lock_file.with_name(f".{lock_name}.{os.getpid()}.tmp")
+            tmp_file.write_text(json.dumps(lease), encoding="utf-8")
+            os.replace(tmp_file, lock_file)
+    return True
+
+
+class LeaseHeartbeat:
+    """Keep a lease alive from a background thread while its owner waits.
+    
+    Used as a context manager around a wait. The lease is renewed once on
+    entry and then every `interval` seconds until the block exits or the
+    lock is released by someone else.
+    """
+
+    def __init__(
+        self,
+        subagent_dir: Path,
+        request_id: Optional[str],
+        *,
+        interval: float = HEARTBEAT_INTERVAL,
+        ttl: float = HEARTBEAT_TTL,
+        lock_name: str = DEFAULT_LOCK_NAME,
+    ) -> None:
+        self.subagent_dir = subagent_dir
+        self.request_id = request_id
+        self.interval = interval
+        self.ttl = ttl
+        self.lock_name = lock_name
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _renew(self) -> bool:
+        try:
+            return renew_lease(
+                self.subagent_dir, request_id=self.request_id, ttl=self.ttl, lock_name=self.lock_name
+            )
+        except (OSError, sqlite3.Error) as e:
+            print(f"warning: Failed to renew lease on {self.subagent_dir.name}: {e}", file=sys.stderr)
+            return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self._renew():
+                return
+
+    def start(self) -> "LeaseHeartbeat":
+        if self._renew():
+            self._thread = threading.Thread(
+                target=self._run, name=f"lmspace-heartbeat-{self.subagent_dir.name}", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, *, wait: bool = True) -> None:
+        """Stop renewing; with wait=False, do not block on the renewal thread."""
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def _create_lock_file(
+    subagent_dir: Path,
+    request_id: Optional[str],
+    lock_name: str,
+) -> Optional[dict[str, Any]]:
+    """Exclusively create a lock file and return its lease, or None if taken."""
+    lock_file = subagent_dir / lock_name
+    try:
+        fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except (FileExistsError, FileNotFoundError):
+        return None
+
+    lease = _lock_metadata(request_id)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(lease, handle)
+    return lease
+
+
+def try_lock_subagent(
+    subagent_dir: Path,
+    *,
+    request_id: Optional[str] = None,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    store: Optional[PoolStateStore] = None,
+) -> bool:
+    """Atomically lock a single subagent directory.
+    
+    The lock file is created with an exclusive create so that exactly one
+    caller can win the lock, even across processes. The lock records the
+    owner PID, host, request id and acquire time.
     
-    for subagent_dir in subagents:
-        lock_file = subagent_dir / DEFAULT_LOCK_NAME
-        if not lock_file.exists():
+    Args:
+        subagent_dir: Subagent directory to lock.
+        request_id: Identifier of the request taking the lock.
+        lock_name: Name of the lock file.
+        store: Open pool state store to record the lock in. When omitted,
+            the store of the subagent's pool root is opened.
+    
+    Returns:
+        True if the lock was acquired, False if the subagent is already
+        locked or the directory does not exist.
+    """
+    lease = _create_lock_file(subagent_dir, request_id, lock_name)
+    if lease is None:
+        return False
+
+    if store is not None:
+        store.record_locked(subagent_dir, lease)
+    else:
+        with open_pool_state(subagent_dir.parent, lock_name=lock_name) as opened:
+            opened.record_locked(subagent_dir, lease)
+    return True
+
+
+def read_subagent_lock(
+    subagent_dir: Path,
+    *,
+    lock_name: str = DEFAULT_LOCK_NAME,
+) -> Optional[dict[str, Any]]:
+    """Read the lease metadata of a locked subagent.
+    
+    Returns None if the subagent is not locked. Lock files without readable
+    metadata (e.g., created by older versions) yield an empty dict.
+    """
+    return read_lock_file(subagent_dir / lock_name)
+
+
+def claim_subagent(
+    subagent_root: Path,
+    *,
+    request_id: Optional[str] = None,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    record_failure: bool = True,
+) -> Optional[Path]:
+    """Claim the first free subagent by atomically creating its lock file.
+    
+    The candidate comes from the pool state store, so no directory walk is
+    needed. The lock check and the lock acquisition are a single
+    exclusive-create, so concurrent callers never receive the same subagent
+    even when the store is stale. A row that turns out to be locked, or a
+    pool that looks exhausted, resyncs the index from the lock files once.
+    
+    A failed claim counts towards the autoscaler's demand signal unless
+    `record_failure` is False, for callers that retry and record only their
+    final failure.
+    
+    Returns the claimed subagent directory, or None if all are locked.
+    """
+    if not subagent_root.exists():
+        return None
+    
+    with open_pool_state(subagent_root, lock_name=lock_name) as store:
+        with store.transaction() as conn:
+            subagent_dir = _claim_in_transaction(store, conn, request_id, lock_name)
+            if subagent_dir is None and record_failure:
+                # Demand signal for the autoscaler
+                store.record_claim_failure(conn)
+            return subagent_dir
+
+
+def _claim_in_transaction(
+    store: PoolStateStore,
+    conn: sqlite3.Connection,
+    request_id: Optional[str],
+    lock_name: str,
+) -> Optional[Path]:
+    resynced = False
+    while True:
+        subagent_dir = store.first_available()
+        if subagent_dir is None:
+            if resynced:
+                return None
+            # Rows recorded as locked may have lost their lock files behind the store's back
+            store.rebuild(conn)
+            resynced = True
+            continue
+        lease = _create_lock_file(subagent_dir, request_id, lock_name)
+        if lease is not None:
+            store.record_locked(subagent_dir, lease, conn)
             return subagent_dir
+        # Locked (or removed) behind the store's back: the index is stale, so resync it
+        store.record_lock_collision(conn)
+        if resynced:
+            store.observe(subagent_dir, conn)
+        else:
+            store.rebuild(conn)
+            resynced = True
+
+
+def claim_subagent_queued(
+    subagent_root: Path,
+    *,
+    request_id: Optional[str] = None,
+    max_wait: Optional[float] = None,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    on_queued: Optional[Callable[[int], None]] = None,
+) -> Optional[Path]:
+    """Claim a subagent, waiting in a FIFO queue while the pool is exhausted.
     
-    return None
+    The queue lives in the pool state store, so waiters from different
+    processes are served in arrival order. Every release wakes the waiter at
+    the front of the queue through the file watcher; waiters also re-check
+    every QUEUE_RECHECK_INTERVAL seconds, dropping entries left behind by
+    processes that have exited.
+    
+    on_queued is called with the waiter's queue position if it has to wait.
+    
+    Returns the claimed subagent directory, or None if max_wait expired.
+    """
+    if not subagent_root.exists():
+        return None
+    
+    from .watcher import get_file_watcher
+    
+    deadline = None if max_wait is None else time.monotonic() + max_wait
+    with open_pool_state(subagent_root, lock_name=lock_name) as store:
+        with store.transaction() as conn:
+            if store.queue_head(conn) is None:
+                subagent_dir = _claim_in_transaction(store, conn, request_id, lock_name)
+                if subagent_dir is not None:
+                    return subagent_dir
+            ticket: Optional[int] = store.enqueue(request_id, conn)
+            position = len(store.queue_entries(conn))
+        if on_queued is not None:
+            on_queued(position)
+        
+        try:
+            while True:
+                wake_file = store.queue_wake_path(ticket)
+                wake_file.unlink(missing_ok=True)
+                with get_file_watcher().watch(wake_file) as woken:
+                    with store.transaction() as conn:
+                        _prune_dead_waiters(store, conn)
+                        if store.queue_head(conn) == ticket:
+                            subagent_dir = _claim_in_transaction(store, conn, request_id, lock_name)
+                            if subagent_dir is not None:
+                                store.dequeue(ticket, conn)
+                                ticket = None
+                                # Pass the turn on if more subagents were freed meanwhile
+                                if store.first_available() is not None:
+                                    store.wake_queue_head(conn)
+                                return subagent_dir
+                    timeout = QUEUE_RECHECK_INTERVAL
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return None
+                        timeout = min(timeout, remaining)
+                    woken.wait(timeout)
+        finally:
+            if ticket is not None:
+                with store.transaction() as conn:
+                    store.dequeue(ticket, conn)
+                    store.wake_queue_head(conn)
+
+
+def _prune_dead_waiters(store: PoolStateStore, conn: sqlite3.Connection) -> None:
+    from .windows import process_alive
+
+    host = socket.gethostname()
+    for entry in store.queue_entries(conn):
+        if entry["host"] == host and process_alive(entry["pid"]) is False:
+            store.dequeue(entry["ticket"], conn)
+
+
+def release_subagent(
+    subagent_dir: Path,
+    *,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    store: Optional[PoolStateStore] = None,
+    request_id: Optional[str] = None,
+) -> bool:
+    """Release a claimed subagent by removing its lock file.
+    
+    When request_id is given, the lock is only removed if it is still held
+    by that request, so a late unlock from a finished agent cannot free a
+    subagent that has since been claimed by another request.
+    
+    Returns True if a lock was removed, False if the subagent was not locked
+    (or is locked by a different request).
+    """
+    if not subagent_dir.parent.exists():
+        return False
+    if store is None:
+        with open_pool_state(subagent_dir.parent, lock_name=lock_name) as opened:
+            return release_subagent(
+                subagent_dir, lock_name=lock_name, store=opened, request_id=request_id
+            )
+
+    lock_file = subagent_dir / lock_name
+    with store.transaction():
+        if request_id is not None:
+            lease = read_lock_file(lock_file)
+            if lease is None or lease.get("request_id") != request_id:
+                return False
+        try:
+            lock_file.unlink()
+        except FileNotFoundError:
+            released = False
+        else:
+            released = True
+        store.record_released(subagent_dir)
+    return released
 
 
 def check_workspace_opened(workspace_name: str) -> bool:
     """Check if a workspace is currently opened in VS Code.
     
+    Always runs `code --status`; dispatch consults the cached WindowRegistry instead.
+    
     Args:
-        workspace_name: Name to search for in workspace list (e.g., 'subagent-1')
+        workspace_name: Exact workspace name to look for (e.g., 'subagent-1')
     
     Returns:
         True if the workspace is currently open, False otherwise
     """
-    try:
-        result = subprocess.run(
-            'code --status',
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        # Look for the workspace name in the output
-        # Format in output: "window [...] (workspace_name (Workspace) - Visual Studio Code)"
-        return workspace_name in result.stdout
-    except Exception:
-        # If we can't determine, assume it's not open (safer to open)
-        return False
+    from .windows import probe_open_windows
+
+    # If we can't determine, assume it's not open (safer to open)
+    return workspace_name in (probe_open_windows() or {})
 
 
-def ensure_workspace_focused(workspace_path: Path, workspace_name: str, subagent_dir: Path, poll_interval: float = 1.0, timeout: float = 60.0) -> bool:
+def ensure_workspace_focused(workspace_path: Path, workspace_name: str, subagent_dir: Path, timeout: float = 60.0) -> bool:
     """Ensure VS Code workspace is open and focused.
     
     Opens the workspace only if it's not already open, then waits for .alive file to signal readiness.
+    Whether the window is open comes from the pool's WindowRegistry, so a window known to be
+    open and ready is focused without probing VS Code.
     
     Args:
         workspace_path: Path to the .code-workspace file
         workspace_name: Name of the workspace (e.g., 'subagent-1') for checking if open
         subagent_dir: Path to the subagent directory
-        poll_interval: Time between checks for .alive file (default: 1.0 seconds)
         timeout: Maximum time to wait for .alive file (default: 60.0 seconds)
     
     Returns:
         True if workspace is ready, False if timeout occurred
     """
-    workspace_already_open = check_workspace_opened(workspace_name)
-    
-    if workspace_already_open:
-        # Workspace is already open, just focus it and return
-        subprocess.Popen(f'code "{workspace_path}"', shell=True)
-        return True
-    
-    # Workspace not open, need to open and wait for readiness
+    from .windows import WindowRegistry
+
+    with span("window.focus", **{"lmspace.workspace": workspace_name}), \
+            open_pool_state(subagent_dir.parent) as store:
+        windows = WindowRegistry(store)
+        if windows.is_open(workspace_name):
+            # Workspace is already open, just focus it and return
+            set_attribute("lmspace.window_reused", True)
+            get_launcher().open_workspace(workspace_path)
+            return True
+        set_attribute("lmspace.window_reused", False)
+        ready = _open_and_wait_ready(workspace_path, subagent_dir, timeout)
+        if ready:
+            windows.mark_ready(workspace_name)
+    return ready
+
+
+def _open_and_wait_ready(
+    workspace_path: Path,
+    subagent_dir: Path,
+    timeout: float,
+    *,
+    launch_lock: Optional[threading.Lock] = None,
+) -> bool:
+    """Open a workspace window and wait until it answers the wakeup chat.
+
+    When `launch_lock` is given it is held only while the window is opened and
+    sent its wakeup chat, so several windows can wait for readiness at once.
+    """
     # Delete any existing .alive file first
     alive_file = subagent_dir / ".alive"
     if alive_file.exists():
@@ -131,38 +529,70 @@ def ensure_workspace_focused(workspace_path: Path, workspace_name: str, subagent
         wakeup_dst = subagent_dir / "wakeup.chatmode.md"
         shutil.copy2(wakeup_src, wakeup_dst)
 
-    subprocess.Popen(f'code "{workspace_path}"', shell=True)
-    time.sleep(0.1)  # Brief wait for VS Code to start
-    
-    # Use a unique chat_id for this readiness check
-    wakeup_chat_id = "wakeup"
-    chat_cmd = f'code -r chat -m {wakeup_chat_id} "create a file named .alive"'
-    subprocess.Popen(chat_cmd, shell=True)
-    
-    # Wait for .alive file to appear
-    elapsed = 0.0
-    while not alive_file.exists() and elapsed < timeout:
-        time.sleep(poll_interval)
-        elapsed += poll_interval
+    from .watcher import get_file_watcher
+
+    # Start watching before the window can answer so the .alive write is not missed
+    with get_file_watcher().watch(alive_file) as alive_ready:
+        with launch_lock or nullcontext(), span("window.open"):
+            launcher = get_launcher()
+            launcher.open_workspace(workspace_path)
+            time.sleep(0.1)  # Brief wait for VS Code to start
+
+            # Use a unique chat_id for this readiness check
+            launcher.chat("wakeup", "create a file named .alive")
+        
+        with span("window.ready"):
+            # Event.wait measures the deadline on the monotonic clock
+            ready = alive_ready.wait(timeout)
+            set_attribute("lmspace.ready", ready)
     
-    if not alive_file.exists():
+    if not ready:
         print(f"warning: Workspace readiness timeout after {timeout}s", file=sys.stderr)
+        _count_pool_event(subagent_dir.parent, "readiness_timeouts")
         return False
     
     return True
 
 
+def _count_pool_event(subagent_root: Path, key: str) -> None:
+    """Bump a pool counter reported by `lmspace code metrics`; never fails the caller."""
+    try:
+        with open_pool_state(subagent_root) as store:
+            with store.transaction() as conn:
+                store.increment_counter(key, conn)
+    except (OSError, sqlite3.Error):
+        pass
+
+
 def copy_agent_config(
     subagent_dir: Path,
 ) -> dict:
-    """Copy default workspace file into the subagent directory."""
-    default_template_dir = get_default_template_dir()
-    workspace_src = default_template_dir / "subagent.code-workspace"
+    """Copy the subagent's workspace file into the subagent directory.
+
+    The template comes from the subagent's manifest, so a pool provisioned or
+    reconciled from a custom template keeps it; an update deferred by
+    `lmspace code reconcile` while the subagent was locked is applied here.
+    Subagents without a manifest use the default template.
+    """
+    from .manifest import read_manifest, write_manifest
+
+    manifest = read_manifest(subagent_dir) or {}
+    pending = manifest.get("pending")
+    template_dir = Path((pending or manifest).get("template") or get_default_template_dir())
+    workspace_src = template_dir / "subagent.code-workspace"
+    if not workspace_src.exists():
+        template_dir = get_default_template_dir()
+        workspace_src = template_dir / "subagent.code-workspace"
     if not workspace_src.exists():
         raise FileNotFoundError(f"Default workspace template not found: {workspace_src}")
 
     workspace_dst = subagent_dir / f"{subagent_dir.name}.code-workspace"
-    shutil.copy2(workspace_src, workspace_dst)
+    if not (workspace_dst.exists() and os.path.samefile(workspace_src, workspace_dst)):
+        # A workspace provisioned as a hard link to another template must not be written through
+        workspace_dst.unlink(missing_ok=True)
+        shutil.copy2(workspace_src, workspace_dst)
+    if pending and str(template_dir) == pending["template"]:
+        write_manifest(subagent_dir, template_dir, pending["template_hash"])
 
     messages_dir = subagent_dir / "messages"
     messages_dir.mkdir(exist_ok=True)
@@ -173,13 +603,15 @@ def copy_agent_config(
     }
 
 
-def create_subagent_lock(subagent_dir: Path) -> Path:
-    """Create a lock file to mark the subagent as in-use.
-    
-    Also clears any existing messages and chatmodes from previous runs.
-    
-    Returns the path to the created lock file.
-    """
+def _clear_previous_run(subagent_dir: Path) -> None:
+    """Archive and clear messages and chatmodes left behind by a previous run."""
+    from .history import archive_messages
+
+    try:
+        archive_messages(subagent_dir)
+    except (OSError, ValueError, sqlite3.Error) as error:
+        print(f"warning: Failed to archive previous messages: {error}", file=sys.stderr)
+
     # Clear existing messages
     messages_dir = subagent_dir / "messages"
     if messages_dir.exists():
@@ -190,9 +622,23 @@ def create_subagent_lock(subagent_dir: Path) -> Path:
     # Clear existing chatmode files
     for chatmode_file in subagent_dir.glob("*.chatmode.md"):
         chatmode_file.unlink()
+
+
+def create_subagent_lock(subagent_dir: Path, request_id: Optional[str] = None) -> Path:
+    """Create a lock file to mark the subagent as in-use.
+    
+    Also clears any existing messages and chatmodes from previous runs.
+    Unlike claim_subagent, this overwrites an existing lock.
+    
+    Returns the path to the created lock file.
+    """
+    _clear_previous_run(subagent_dir)
     
     lock_file = subagent_dir / DEFAULT_LOCK_NAME
-    lock_file.touch()
+    lease = _lock_metadata(request_id)
+    lock_file.write_text(json.dumps(lease), encoding="utf-8")
+    with open_pool_state(subagent_dir.parent) as store:
+        store.record_locked(subagent_dir, lease)
     return lock_file
 
 
@@ -201,25 +647,116 @@ def remove_subagent_lock(subagent_dir: Path) -> None:
     
     Silently succeeds if the lock file doesn't exist.
     """
-    lock_file = subagent_dir / DEFAULT_LOCK_NAME
-    lock_file.unlink(missing_ok=True)
+    release_subagent(subagent_dir)
+
+
+def read_response_file(
+    response_file_final: Path,
+    *,
+    poll_interval: float = 1.0,
+    max_attempts: int = 10,
+) -> str:
+    """Read a finalized response file, retrying transient read failures.
+    
+    Raises OSError if the file still cannot be read after max_attempts.
+    """
+    read_attempts = 0
+    while True:
+        try:
+            return response_file_final.read_text(encoding="utf-8")
+        except OSError:  # Handles sharing violations on Windows
+            read_attempts += 1
+            if read_attempts >= max_attempts:
+                raise
+            time.sleep(poll_interval)
+
+
+def wait_for_response_file(
+    response_file_final: Path,
+    *,
+    timeout: Optional[float] = None,
+) -> bool:
+    """Block until the agent renames its response into place.
+    
+    Uses the shared file watcher, so the rename is noticed as soon as it
+    happens rather than on the next poll.
+    Returns True once the final response file exists, False on timeout.
+    """
+    from .watcher import wait_for_file
+
+    return wait_for_file(response_file_final, timeout)
+
+
+def _forward_bytes(path: Path, offset: int, write: Callable[[bytes], None]) -> int:
+    """Pass the bytes of `path` past `offset` to `write` in bounded chunks.
+    
+    Returns the new offset. Raises OSError (FileNotFoundError if the file
+    does not exist) when the file cannot be read.
+    """
+    with path.open("rb") as handle:
+        handle.seek(offset)
+        while True:
+            chunk = handle.read(RESPONSE_CHUNK_SIZE)
+            if not chunk:
+                return offset
+            write(chunk)
+            offset += len(chunk)
+
+
+def _forward_final_response(
+    response_file_final: Path,
+    offset: int,
+    write: Callable[[bytes], None],
+    *,
+    poll_interval: float,
+    max_attempts: int = 10,
+) -> int:
+    """Forward the finalized response past `offset`, retrying transient read failures."""
+    read_attempts = 0
+    while True:
+        try:
+            return _forward_bytes(response_file_final, offset, write)
+        except OSError:  # Handles sharing violations on Windows
+            read_attempts += 1
+            if read_attempts >= max_attempts:
+                raise
+            time.sleep(poll_interval)
 
 
 def wait_for_response_output(
     response_file_final: Path,
     *,
+    response_file_tmp: Optional[Path] = None,
+    stream: bool = False,
     poll_interval: float = 1.0,
 ) -> bool:
-    """Wait for the agent to finalize the response and print it."""
+    """Wait for the agent to finalize the response and print it.
+    
+    The response is copied to stdout in bounded chunks. With stream=True,
+    the agent's temporary response file is tailed while it is being written
+    and new bytes are printed as they arrive; once the agent renames it into
+    place, printing continues from the same offset in the final file, so
+    nothing is printed twice. This assumes the agent only appends to the
+    temporary file, as it is instructed to.
+    """
     print(
         f"waiting for agent to finish: {response_file_final}",
         file=sys.stderr,
         flush=True,
     )
 
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(chunk: bytes) -> None:
+        sys.stdout.write(decoder.decode(chunk))
+
+    offset = 0
     try:
-        while not response_file_final.exists():
-            time.sleep(poll_interval)
+        with span("agent.answer"):
+            if stream and response_file_tmp is not None:
+                offset = _tail_response(response_file_tmp, response_file_final, write)
+            else:
+                wait_for_response_file(response_file_final)
     except KeyboardInterrupt:
         print(
             "\ninfo: interrupted while waiting for agent response.",
@@ -227,33 +764,73 @@ def wait_for_response_output(
         )
         return False
 
-    read_attempts = 0
-    max_attempts = 10
-    while True:
-        try:
-            content = response_file_final.read_text(encoding="utf-8")
-            break
-        except OSError as exc:  # Handles sharing violations on Windows
-            read_attempts += 1
-            if read_attempts >= max_attempts:
-                print(
-                    f"error: failed to read agent response: {exc}",
-                    file=sys.stderr,
-                )
-                return False
-            time.sleep(poll_interval)
+    try:
+        with span("response.read"):
+            _forward_final_response(response_file_final, offset, write, poll_interval=poll_interval)
+    except OSError as exc:
+        print(
+            f"error: failed to read agent response: {exc}",
+            file=sys.stderr,
+        )
+        return False
 
-    print(content)
+    sys.stdout.write(decoder.decode(b"", final=True) + "\n")
+    sys.stdout.flush()
     return True
 
 
+def _print_cached_response(cached_file: Path) -> None:
+    """Print a response served from the response cache, as a sync dispatch would."""
+    print(json.dumps({"success": True, "cached": True, "response_file": str(cached_file)}))
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    _forward_bytes(cached_file, 0, lambda chunk: sys.stdout.write(decoder.decode(chunk)))
+    sys.stdout.write(decoder.decode(b"", final=True) + "\n")
+    sys.stdout.flush()
+
+
+def _tail_response(
+    response_file_tmp: Path,
+    response_file_final: Path,
+    write: Callable[[bytes], None],
+) -> int:
+    """Print the temporary response as it grows until the final file appears.
+    
+    Returns how many bytes were printed. Polls back off from
+    STREAM_POLL_MIN_INTERVAL to STREAM_POLL_MAX_INTERVAL while the file does
+    not grow; the final file's appearance ends the wait immediately.
+    """
+    offset = 0
+    interval = STREAM_POLL_MIN_INTERVAL
+    while not response_file_final.exists():
+        try:
+            grown = _forward_bytes(response_file_tmp, offset, write)
+        except OSError:
+            # Not created yet, already renamed, or briefly unreadable on Windows
+            grown = offset
+        if grown > offset:
+            sys.stdout.flush()
+            offset = grown
+            interval = STREAM_POLL_MIN_INTERVAL
+        else:
+            interval = min(interval * 2, STREAM_POLL_MAX_INTERVAL)
+        if wait_for_response_file(response_file_final, timeout=interval):
+            break
+    return offset
+
+
 def _prepare_subagent_directory(
     subagent_dir: Path,
     prompt_file: Path,
     chat_id: str,
     dry_run: bool,
+    *,
+    request_id: Optional[str] = None,
 ) -> int:
-    """Prepare the subagent directory with config, lock, and chatmode.
+    """Prepare a claimed subagent directory with config and chatmode.
+    
+    The subagent must already be locked by the caller (see claim_subagent).
+    When request_id is given it is recorded with the prompt file in
+    `messages/request.json`, which indexes the run once it is archived.
     
     Returns 0 on success, 1 on failure.
     """
@@ -267,9 +844,9 @@ def _prepare_subagent_directory(
         return 1
     
     try:
-        create_subagent_lock(subagent_dir)
+        _clear_previous_run(subagent_dir)
     except OSError as e:
-        print(f"error: Failed to create subagent lock: {e}", file=sys.stderr)
+        print(f"error: Failed to clear previous subagent run: {e}", file=sys.stderr)
         return 1
     
     chatmode_file = subagent_dir / f"{chat_id}.chatmode.md"
@@ -279,6 +856,10 @@ def _prepare_subagent_directory(
         print(f"error: Failed to copy prompt file to chatmode: {e}", file=sys.stderr)
         return 1
     
+    if request_id is not None:
+        from .history import write_request_info
+
+        write_request_info(subagent_dir / "messages", request_id=request_id, prompt_file=prompt_file)
     return 0
 
 
@@ -300,13 +881,44 @@ def _resolve_attachments(extra_attachments: Optional[Sequence[Path]]) -> list[st
     return resolved_extra
 
 
+def _response_file_paths(subagent_dir: Path) -> tuple[str, Path, Path]:
+    """Return the timestamp and the temp/final response paths for a new request."""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    messages_dir = subagent_dir / "messages"
+    response_file_tmp = messages_dir / f"{timestamp}_res.tmp.md"
+    response_file_final = messages_dir / f"{timestamp}_res.md"
+    return timestamp, response_file_tmp, response_file_final
+
+
 def _create_request_prompt(
     user_query: str,
     response_file_tmp: Path,
     response_file_final: Path,
     subagent_name: str,
+    request_id: Optional[str] = None,
+    subagent_root: Optional[Path] = None,
+    *,
+    unlock: bool = True,
 ) -> str:
-    """Create the SudoLang prompt with task and system instructions."""
+    """Create the SudoLang prompt with task and system instructions.
+    
+    The unlock command names the pool root explicitly: the agent runs it in
+    VS Code's terminal, whose environment need not carry the dispatcher's
+    LMSPACE_SUBAGENT_ROOT. With `unlock=False` the agent only moves its
+    response into place; the dispatcher reads the response and then releases
+    the subagent itself, so no other claim can clear the response first.
+    """
+    unlock_cmd = f"lmspace code unlock --subagent {subagent_name}"
+    if request_id is not None:
+        unlock_cmd += f" --request-id {request_id}"
+    if subagent_root is not None:
+        # A PowerShell single-quoted string, in which quotes are doubled
+        quoted_root = str(subagent_root).replace("'", "''")
+        unlock_cmd += f" --target-root '{quoted_root}'"
+    commands = f"Move-Item -LiteralPath '{response_file_tmp}' -Destination '{response_file_final}'"
+    if unlock:
+        commands += f"\n{unlock_cmd}"
+    footer = f"\n<!-- lmspace-request-id: {request_id} -->\n" if request_id is not None else ""
     return f"""[[ ## task ## ]]
 {user_query}
 
@@ -316,12 +928,11 @@ def _create_request_prompt(
 1. Create and write your complete response to: {response_file_tmp}
 2. When completely finished, run these PowerShell commands to signal completion:
 ```
-Move-Item -LiteralPath '{response_file_tmp}' -Destination '{response_file_final}'
-lmspace code unlock --subagent {subagent_name}
+{commands}
 ```
 
 Do not proceed to step 2 until your response is completely written to the temporary file.
-"""
+{footer}"""
 
 
 def _launch_vscode_with_chat(
@@ -330,9 +941,12 @@ def _launch_vscode_with_chat(
     attachment_paths: list[str],
     sudolang_prompt: str,
     timestamp: str,
+    *,
+    bundle: Optional[str] = None,
 ) -> bool:
     """Launch VS Code with the workspace and chat.
     
+    `bundle` overrides the attachment bundling mode (see bundle.bundle_mode).
     Returns True on success, False on failure.
     """
     try:
@@ -342,27 +956,36 @@ def _launch_vscode_with_chat(
         # Write SudoLang prompt to a req.md file in the messages directory
         req_file = messages_dir / f"{timestamp}_req.md"
         req_file.write_text(sudolang_prompt, encoding='utf-8')
-        
-        # Build chat command with the unique chat mode
-        chat_cmd = f'code -r chat -m {chat_id}'
-        
-        # Add attachments
-        for attachment in attachment_paths:
-            chat_cmd += f' -a "{attachment}"'
-        
-        # Add the req.md file as an attachment
-        chat_cmd += f' -a "{req_file}"'
-        
-        # Add a simple prompt that references the req.md file
-        chat_cmd += f' "Follow instructions in {req_file.name}"'
 
-        # Ensure workspace is open and focused (with .alive file check)
-        workspace_ready = ensure_workspace_focused(workspace_path, subagent_dir.name, subagent_dir)
-        if not workspace_ready:
-            print("warning: Workspace may not be fully ready", file=sys.stderr)
+        from .bundle import should_bundle, write_attachment_bundle
+
+        if should_bundle(attachment_paths, bundle):
+            # One manifest instead of a `-a` argument per attachment
+            bundle_file = messages_dir / f"{timestamp}_attachments.md"
+            with span("attachments.bundle", **{"lmspace.attachments": len(attachment_paths)}):
+                counts = write_attachment_bundle(attachment_paths, bundle_file)
+                for key, count in counts.items():
+                    set_attribute(f"lmspace.bundle.{key}", count)
+            attachment_paths = [str(bundle_file)]
         
-        # Open the chat in VS Code
-        subprocess.Popen(chat_cmd, shell=True)
+        with span("launch.lock_wait"):
+            _LAUNCH_LOCK.acquire()
+        try:
+            # Ensure workspace is open and focused (with .alive file check)
+            workspace_ready = ensure_workspace_focused(workspace_path, subagent_dir.name, subagent_dir)
+            if not workspace_ready:
+                print("warning: Workspace may not be fully ready", file=sys.stderr)
+            
+            # Open the chat with the unique chat mode, the attachments and the
+            # req.md file, with a simple prompt that references req.md
+            with span("chat.send", **{"lmspace.attachments": len(attachment_paths) + 1}):
+                get_launcher().chat(
+                    chat_id,
+                    f"Follow instructions in {req_file.name}",
+                    attachments=[*attachment_paths, str(req_file)],
+                )
+        finally:
+            _LAUNCH_LOCK.release()
         return True
             
     except Exception as e:
@@ -377,9 +1000,20 @@ def dispatch_agent(
     extra_attachments: Optional[Sequence[Path]] = None,
     dry_run: bool = False,
     wait: bool = False,
+    use_daemon: bool = True,
+    queue: bool = False,
+    max_wait: Optional[float] = None,
+    stream: bool = False,
+    cache: Optional[bool] = None,
+    cache_ttl: Optional[float] = None,
+    auto_imports: bool = False,
+    bundle_attachments: Optional[str] = None,
 ) -> int:
     """Dispatch an agent to an isolated subagent.
     
+    When a pool daemon (`lmspace code serve`) is running for the subagent root,
+    the dispatch is handed to it; otherwise it runs in this process.
+    
     Args:
         user_query: The user's input query for the agent.
         prompt_file: Path to a prompt file to copy to subagent and attach (e.g., vscode-expert.prompt.md).
@@ -388,6 +1022,21 @@ def dispatch_agent(
         dry_run: When True, report planned actions without launching VS Code.
         wait: When True, wait for response and print to stdout (sync mode).
               When False (default), return immediately after dispatch (async mode).
+        use_daemon: When False, never hand the dispatch to a running daemon.
+        queue: When True, wait in the pool's FIFO queue for a subagent instead
+            of failing when all are locked.
+        max_wait: Maximum seconds to wait in the queue (implies queue).
+        stream: With wait, print the response while the agent is still
+            writing it. Streaming dispatches never go through the daemon.
+        cache: With wait, answer repeated queries from the response cache.
+            None defers to LMSPACE_RESPONSE_CACHE; False disables the cache.
+            Cache misses never go through the daemon.
+        cache_ttl: Maximum age in seconds of a cached response to reuse.
+        auto_imports: Also attach every file the prompt file imports
+            (`#file:` references and SudoLang imports), transitively.
+        bundle_attachments: Attachment bundling mode (`auto`, `always` or
+            `never`). None defers to LMSPACE_ATTACHMENT_BUNDLE. Dispatches
+            that set it never go through the daemon.
     
     Returns:
         Exit code (0 for success, non-zero for failure)
@@ -400,118 +1049,396 @@ def dispatch_agent(
         if not prompt_file.is_file():
             raise ValueError(f"Prompt file must be a file, not a directory: {prompt_file}")
 
-        # Find unlocked subagent
         subagent_root = get_subagent_root()
-        subagent_dir = find_unlocked_subagent(subagent_root)
-        if subagent_dir is None:
-            print(
-                "error: No unlocked subagents available. Provision additional subagents with:\n"
-                "  lmspace code provision --subagents <desired_total>",
-                file=sys.stderr,
+        if auto_imports:
+            extra_attachments = _with_prompt_imports(prompt_file, extra_attachments, subagent_root)
+
+        response_cache_key = None
+        if wait and not dry_run:
+            from .response_cache import ResponseCache, cache_enabled, cache_key, pool_template_digest
+
+            if cache_enabled(cache):
+                attachments = [Path(path) for path in _resolve_attachments(extra_attachments)]
+                response_cache_key = cache_key(
+                    prompt_file,
+                    attachments,
+                    user_query,
+                    template_digest=pool_template_digest(subagent_root),
+                )
+                cached = ResponseCache(subagent_root, ttl=cache_ttl).get(response_cache_key)
+                if cached is not None:
+                    print(f"info: Using cached response {response_cache_key[:12]}", file=sys.stderr)
+                    _print_cached_response(cached)
+                    return 0
+
+        # The daemon does not stream, fill the cache or take a bundling mode; run those here
+        if (
+            use_daemon
+            and not dry_run
+            and not (wait and (stream or response_cache_key))
+            and bundle_attachments is None
+        ):
+            from .daemon import connect_daemon, dispatch_with_daemon
+
+            client = connect_daemon(subagent_root)
+            if client is not None:
+                with client:
+                    return dispatch_with_daemon(
+                        client,
+                        user_query,
+                        prompt_file,
+                        attachment_paths=_resolve_attachments(extra_attachments),
+                        wait=wait,
+                        queue=queue,
+                        max_wait=max_wait,
+                    )
+
+        # Claim an unlocked subagent (dry runs only peek without locking)
+        request_id = uuid.uuid4().hex
+        queue = queue or max_wait is not None
+        run = functools.partial(
+            _claim_and_dispatch,
+            subagent_root,
+            user_query,
+            prompt_file,
+            request_id=request_id,
+            extra_attachments=extra_attachments,
+            dry_run=dry_run,
+            wait=wait,
+            queue=queue,
+            max_wait=max_wait,
+            stream=stream,
+            response_cache_key=response_cache_key,
+            bundle_attachments=bundle_attachments,
+        )
+        if dry_run:
+            return run()
+
+        from .singleflight import dispatch_fingerprint, run_single_flight
+
+        with trace(
+            "dispatch",
+            request_id=request_id,
+            trace_file=trace_file_for(subagent_root),
+            **{"lmspace.wait": wait, "lmspace.queue": queue},
+        ):
+            return run_single_flight(
+                subagent_root,
+                lambda: response_cache_key or dispatch_fingerprint(
+                    subagent_root,
+                    prompt_file,
+                    [Path(path) for path in _resolve_attachments(extra_attachments)],
+                    user_query,
+                ),
+                request_id=request_id,
+                lead=run,
+                follow=functools.partial(_follow_inflight, subagent_root, wait=wait),
+                # In flight until the agent unlocks the subagent
+                keep=lambda result: result == 0 and not wait,
             )
-            return 1
-        
-        # Report which subagent will be used (before acquiring lock)
+    
+    except Exception as e:
         print(
-            f"info: Acquiring subagent: {subagent_dir.name}",
-            file=sys.stderr,
+            json.dumps({"success": False, "error": str(e)}),
+            file=sys.stdout,
         )
-        
-        # Generate unique ID and prepare directory
-        chat_id = str(uuid.uuid4())[:8]
-        result = _prepare_subagent_directory(subagent_dir, prompt_file, chat_id, dry_run)
-        if result != 0:
-            return result
-        
-        # Resolve attachments
-        attachment_paths = _resolve_attachments(extra_attachments)
-        
-        # Prepare response files and prompt
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        messages_dir = subagent_dir / "messages"
-        response_file_tmp = messages_dir / f"{timestamp}_res.tmp.md"
-        response_file_final = messages_dir / f"{timestamp}_res.md"
-        
-        sudolang_prompt = _create_request_prompt(
-            user_query, response_file_tmp, response_file_final, subagent_dir.name
+        return 1
+
+
+def _claim_and_dispatch(
+    subagent_root: Path,
+    user_query: str,
+    prompt_file: Path,
+    *,
+    request_id: str,
+    extra_attachments: Optional[Sequence[Path]],
+    dry_run: bool,
+    wait: bool,
+    queue: bool,
+    max_wait: Optional[float],
+    stream: bool,
+    response_cache_key: Optional[str],
+    bundle_attachments: Optional[str] = None,
+    on_launched: Optional[Callable[[Path, Path], None]] = None,
+) -> int:
+    """Claim a subagent and run the dispatch on it."""
+    if dry_run:
+        subagent_dir = find_unlocked_subagent(subagent_root)
+    else:
+        with span("pool.claim"):
+            if queue:
+                subagent_dir = claim_subagent_queued(
+                    subagent_root,
+                    request_id=request_id,
+                    max_wait=max_wait,
+                    on_queued=_report_queued,
+                )
+            else:
+                subagent_dir = claim_subagent(subagent_root, request_id=request_id)
+            if subagent_dir is not None:
+                set_attribute("lmspace.subagent", subagent_dir.name)
+    if subagent_dir is None:
+        if max_wait is not None and not dry_run:
+            print(f"error: No subagent became available within {max_wait}s", file=sys.stderr)
+        else:
+            _report_no_subagents()
+        return 1
+
+    print(
+        f"info: Acquired subagent: {subagent_dir.name}",
+        file=sys.stderr,
+    )
+
+    try:
+        return _run_claimed_dispatch(
+            subagent_dir,
+            user_query,
+            prompt_file,
+            request_id=request_id,
+            extra_attachments=extra_attachments,
+            dry_run=dry_run,
+            wait=wait,
+            stream=stream,
+            response_cache_key=response_cache_key,
+            bundle_attachments=bundle_attachments,
+            on_launched=on_launched,
         )
-        
-        # Report the dispatched subagent
+    except BaseException:
+        if not dry_run:
+            release_subagent(subagent_dir)
+        raise
+
+
+def _with_prompt_imports(
+    prompt_file: Path,
+    extra_attachments: Optional[Sequence[Path]],
+    subagent_root: Path,
+) -> list[Path]:
+    """Append the prompt file's import closure to the attachments, skipping ones already given."""
+    from .imports import resolve_imports
+
+    attachments = list(extra_attachments or [])
+    given = {path.expanduser().resolve() for path in attachments}
+    imported = [
+        path for path in resolve_imports(prompt_file, subagent_root=subagent_root) if path not in given
+    ]
+    print(f"info: Attaching {len(imported)} imported file(s) from {prompt_file.name}", file=sys.stderr)
+    return attachments + imported
+
+
+def _follow_inflight(subagent_root: Path, leader: dict[str, Any], *, wait: bool) -> Optional[int]:
+    """Attach to an identical request already in flight instead of claiming a subagent.
+
+    Returns None if the request ended without a response, so the caller
+    dispatches the query itself.
+    """
+    response_file_final = Path(leader["response_file"])
+    print(
+        f"info: Joined identical in-flight request {leader['request_id']} on {leader['subagent']}",
+        file=sys.stderr,
+    )
+    print(
+        json.dumps(
+            {
+                "success": True,
+                "subagent_name": leader["subagent"],
+                "response_file": str(response_file_final),
+                "coalesced_with": leader["request_id"],
+            }
+        )
+    )
+    sys.stdout.flush()
+    if not wait:
+        return 0
+
+    from .singleflight import wait_for_shared_response
+
+    print(f"waiting for agent to finish: {response_file_final}", file=sys.stderr, flush=True)
+    try:
+        response = wait_for_shared_response(subagent_root, leader)
+    except KeyboardInterrupt:
+        print("\ninfo: interrupted while waiting for agent response.", file=sys.stderr)
+        return 1
+    if response is None:
         print(
-            json.dumps(
-                {
-                    "success": True,
-                    "subagent_name": subagent_dir.name,
-                    "response_file": str(response_file_final),
-                }
-            )
+            f"warning: Request {leader['request_id']} ended without a response; dispatching it here",
+            file=sys.stderr,
         )
-        sys.stdout.flush()
-        
-        # Launch VS Code
-        if dry_run:
-            return 0
+        return None
+    print(response)
+    return 0
 
-        launch_success = _launch_vscode_with_chat(
-            subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp
+
+def _report_no_subagents() -> None:
+    print(
+        "error: No unlocked subagents available. Provision additional subagents with:\n"
+        "  lmspace code provision --subagents <desired_total>",
+        file=sys.stderr,
+    )
+
+
+def _report_queued(position: int) -> None:
+    print(
+        f"info: All subagents are locked; waiting in queue (position {position})",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def _report_dispatch_started(subagent_name: str, response_file_final: Path) -> None:
+    """Print the JSON line identifying the subagent and response file."""
+    print(
+        json.dumps(
+            {
+                "success": True,
+                "subagent_name": subagent_name,
+                "response_file": str(response_file_final),
+            }
         )
-        
-        if not launch_success:
-            return 1
+    )
+    sys.stdout.flush()
 
-        # Async mode: return immediately
-        if not wait:
-            print(
-                json.dumps(
-                    {
-                        "subagent": subagent_dir.name,
-                        "status": "dispatched",
-                        "response_file": str(response_file_final),
-                        "temp_file": str(response_file_tmp),
-                    }
-                ),
-                file=sys.stdout,
-            )
-            print(
-                f"\nAgent dispatched. Response will be written to:\n  {response_file_final}\n"
-                f"Monitor: check if {response_file_tmp} has been renamed to {response_file_final.name}",
-                file=sys.stderr,
-            )
-            return 0
 
-        # Sync mode: wait for response
-        response_received = wait_for_response_output(response_file_final)
-        
+def _report_dispatched(subagent_name: str, response_file_final: Path, response_file_tmp: Path) -> None:
+    """Print the async-mode status line and monitoring hint."""
+    print(
+        json.dumps(
+            {
+                "subagent": subagent_name,
+                "status": "dispatched",
+                "response_file": str(response_file_final),
+                "temp_file": str(response_file_tmp),
+            }
+        ),
+        file=sys.stdout,
+    )
+    print(
+        f"\nAgent dispatched. Response will be written to:\n  {response_file_final}\n"
+        f"Monitor: check if {response_file_tmp} has been renamed to {response_file_final.name}",
+        file=sys.stderr,
+    )
+
+
+def _run_claimed_dispatch(
+    subagent_dir: Path,
+    user_query: str,
+    prompt_file: Path,
+    *,
+    request_id: str,
+    extra_attachments: Optional[Sequence[Path]],
+    dry_run: bool,
+    wait: bool,
+    stream: bool = False,
+    response_cache_key: Optional[str] = None,
+    bundle_attachments: Optional[str] = None,
+    on_launched: Optional[Callable[[Path, Path], None]] = None,
+) -> int:
+    """Run a dispatch on a subagent that has already been claimed.
+    
+    The lock is released here when the dispatch fails before launch or when a
+    sync-mode dispatch has read the response; async dispatches keep the lock
+    until the agent runs `lmspace code unlock`. A sync-mode response is
+    stored under `response_cache_key` when one is given. `on_launched` is
+    called with the subagent and its response file once VS Code has been
+    launched.
+    """
+    # Generate unique chat mode ID and prepare directory
+    chat_id = request_id[:8]
+    with span("subagent.prepare"):
+        result = _prepare_subagent_directory(
+            subagent_dir, prompt_file, chat_id, dry_run, request_id=request_id
+        )
+    if result != 0:
         if not dry_run:
-            try:
-                remove_subagent_lock(subagent_dir)
-            except Exception as e:
-                print(f"warning: Failed to remove subagent lock: {e}", file=sys.stderr)
-        
-        return 0 if response_received else 1
+            release_subagent(subagent_dir)
+        return result
     
-    except Exception as e:
-        print(
-            json.dumps({"success": False, "error": str(e)}),
-            file=sys.stdout,
+    # Resolve attachments
+    attachment_paths = _resolve_attachments(extra_attachments)
+    
+    # Prepare response files and prompt
+    timestamp, response_file_tmp, response_file_final = _response_file_paths(subagent_dir)
+    
+    sudolang_prompt = _create_request_prompt(
+        user_query,
+        response_file_tmp,
+        response_file_final,
+        subagent_dir.name,
+        request_id,
+        subagent_root=subagent_dir.parent,
+        # A sync dispatch keeps the lease until it has read the response
+        unlock=not wait,
+    )
+    
+    _report_dispatch_started(subagent_dir.name, response_file_final)
+    
+    # Launch VS Code
+    if dry_run:
+        return 0
+
+    with span("vscode.launch"):
+        launch_success = _launch_vscode_with_chat(
+            subagent_dir,
+            chat_id,
+            attachment_paths,
+            sudolang_prompt,
+            timestamp,
+            bundle=bundle_attachments,
         )
+    
+    if not launch_success:
+        release_subagent(subagent_dir)
+        _count_pool_event(subagent_dir.parent, "launch_failures")
         return 1
+    if on_launched is not None:
+        on_launched(subagent_dir, response_file_final)
+
+    # Async mode: return immediately
+    if not wait:
+        _report_dispatched(subagent_dir.name, response_file_final, response_file_tmp)
+        return 0
+
+    # Sync mode: wait for response
+    with LeaseHeartbeat(subagent_dir, request_id):
+        response_received = wait_for_response_output(
+            response_file_final, response_file_tmp=response_file_tmp, stream=stream
+        )
+    if response_received and response_cache_key is not None:
+        # Copied before release: the agent does not unlock a sync dispatch
+        from .response_cache import ResponseCache
+
+        try:
+            ResponseCache(subagent_dir.parent).put(response_cache_key, response_file_final)
+        except Exception as e:
+            print(f"warning: Failed to cache response: {e}", file=sys.stderr)
+    
+    try:
+        release_subagent(subagent_dir, request_id=request_id)
+    except Exception as e:
+        print(f"warning: Failed to remove subagent lock: {e}", file=sys.stderr)
+    
+    return 0 if response_received else 1
 
 
 def list_subagents(
     *,
     subagent_root: Optional[Path] = None,
     json_output: bool = False,
+    rebuild_index: bool = False,
 ) -> int:
     """List all provisioned subagents and their status.
     
     Args:
         subagent_root: Root directory containing subagents. Defaults to standard location.
         json_output: When True, output results as JSON.
+        rebuild_index: When True, reconcile the pool state store with the
+            filesystem before listing.
     
     Returns:
         Exit code (0 for success, non-zero for failure)
     """
+    from .windows import WindowRegistry
+
     if subagent_root is None:
         subagent_root = get_subagent_root()
     
@@ -527,12 +1454,18 @@ def list_subagents(
             )
         return 1
     
-    subagents = sorted(
-        (d for d in subagent_root.iterdir() if d.is_dir() and d.name.startswith("subagent-")),
-        key=lambda d: int(d.name.split("-")[1])
-    )
+    with open_pool_state(subagent_root) as store:
+        if rebuild_index:
+            summary = store.rebuild()
+            print(
+                f"info: Rebuilt pool index: {summary['added']} added, "
+                f"{summary['removed']} removed, {summary['refreshed']} refreshed",
+                file=sys.stderr,
+            )
+        records = store.list_subagents()
+        windows = {record.name: record for record in WindowRegistry(store).records()}
     
-    if not subagents:
+    if not records:
         if json_output:
             print(json.dumps({"subagents": []}))
         else:
@@ -545,18 +1478,21 @@ def list_subagents(
         return 1
     
     subagent_list = []
-    for subagent_dir in subagents:
-        lock_file = subagent_dir / DEFAULT_LOCK_NAME
-        workspace_file = subagent_dir / f"{subagent_dir.name}.code-workspace"
-        is_locked = lock_file.exists()
-        workspace_exists = workspace_file.exists()
+    for record in records:
+        is_locked = record["status"] == "locked"
         
         subagent_info = {
-            "name": subagent_dir.name,
-            "path": str(subagent_dir),
-            "workspace": str(workspace_file) if workspace_exists else None,
+            "name": record["name"],
+            "path": record["path"],
+            "workspace": record["workspace"],
             "locked": is_locked,
-            "status": "locked" if is_locked else "available",
+            "status": record["status"],
+            "request_id": record["request_id"],
+            "lock_owner": record["lock_owner"],
+            "locked_at": record["locked_at"],
+            "updated_at": record["updated_at"],
+            "window_pid": getattr(windows.get(record["name"]), "pid", None),
+            "window_ready_at": getattr(windows.get(record["name"]), "ready_at", None),
         }
         subagent_list.append(subagent_info)
     
@@ -578,26 +1514,95 @@ def list_subagents(
     return 0
 
 
+def _warm_window(workspace: Path, *, timeout: float, retries: int) -> dict[str, Any]:
+    """Open one window and wait for its `.alive` handshake, retrying on failure."""
+    name = workspace.parent.name
+    started = time.monotonic()
+    attempts = retries + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            ready = _open_and_wait_ready(
+                workspace, workspace.parent, timeout, launch_lock=_LAUNCH_LOCK
+            )
+        except (OSError, subprocess.SubprocessError) as error:
+            print(f"warning: Failed to open {workspace}: {error}", file=sys.stderr)
+            ready = False
+        if ready:
+            return {
+                "subagent": name,
+                "ready": True,
+                "attempts": attempt,
+                "seconds": time.monotonic() - started,
+            }
+        if attempt < attempts:
+            print(f"warning: {name} not ready, retrying ({attempt + 1}/{attempts})", file=sys.stderr)
+    return {"subagent": name, "ready": False, "attempts": attempts, "seconds": None}
+
+
+def _print_warmup_summary(results: list[dict[str, Any]]) -> None:
+    from statistics import median
+
+    print("Window readiness:", file=sys.stderr)
+    for result in results:
+        if result["ready"]:
+            retried = f" ({result['attempts']} attempts)" if result["attempts"] > 1 else ""
+            print(f"  {result['subagent']}  ready in {result['seconds']:.1f}s{retried}", file=sys.stderr)
+        else:
+            print(
+                f"  {result['subagent']}  not ready after {result['attempts']} attempt(s)",
+                file=sys.stderr,
+            )
+    times = [r["seconds"] for r in results if r["ready"]]
+    summary = f"{len(times)}/{len(results)} windows ready"
+    if times:
+        summary += f" (median {median(times):.1f}s, max {max(times):.1f}s)"
+    print(f"{'✓' if len(times) == len(results) else 'warning:'} {summary}", file=sys.stderr)
+
+
 def warmup_subagents(
     *,
     subagent_root: Optional[Path] = None,
     subagents: int = 1,
+    names: Optional[Sequence[str]] = None,
     dry_run: bool = False,
+    wait_ready: bool = False,
+    concurrency: int = DEFAULT_WARMUP_CONCURRENCY,
+    retries: int = DEFAULT_WARMUP_RETRIES,
+    timeout: float = DEFAULT_WARMUP_TIMEOUT,
 ) -> int:
     """Open all provisioned VSCode workspaces to warm them up.
     
+    Unlocked subagents are warmed before locked ones. By default every window
+    is launched at once without checking that it came up. With `wait_ready`,
+    at most `concurrency` windows start at a time and each must answer the
+    same `.alive` handshake dispatch uses within `timeout` seconds, being
+    relaunched up to `retries` times; a per-window time-to-ready summary is
+    printed at the end.
+    
     Args:
         subagent_root: Root directory containing subagents. Defaults to standard location.
         subagents: Number of subagent workspaces to open. Defaults to 1.
+        names: Only consider the subagents with these directory names.
         dry_run: When True, report what would be done without opening workspaces.
+        wait_ready: When True, warm in stages and wait for each window to be ready.
+        concurrency: Maximum number of windows starting at once with wait_ready.
+        retries: Relaunch attempts for a window that is not ready in time.
+        timeout: Seconds each attempt waits for the window to be ready.
     
     Returns:
-        Exit code (0 for success, non-zero for failure)
+        Exit code (0 for success, non-zero for failure, including windows
+        that never became ready with wait_ready)
     """
+    if wait_ready and (concurrency < 1 or retries < 0):
+        print("error: concurrency must be positive and retries must not be negative", file=sys.stderr)
+        return 1
+
     if subagent_root is None:
         subagent_root = get_subagent_root()
     
     workspaces = get_all_subagent_workspaces(subagent_root)
+    if names is not None:
+        workspaces = [w for w in workspaces if w.parent.name in names]
     
     if not workspaces:
         print(
@@ -611,7 +1616,11 @@ def warmup_subagents(
         )
         return 1
     
-    # Limit to the requested number of subagents
+    # Prefer unlocked subagents (stable, so each group stays in number order),
+    # then limit to the requested number of subagents
+    with open_pool_state(subagent_root) as store:
+        locked = {r["name"] for r in store.list_subagents() if r["status"] == STATUS_LOCKED}
+    workspaces = sorted(workspaces, key=lambda workspace: workspace.parent.name in locked)
     workspaces_to_open = workspaces[:subagents]
     
     print(f"Found {len(workspaces)} subagent workspace(s), opening {len(workspaces_to_open)}", file=sys.stderr)
@@ -622,16 +1631,50 @@ def warmup_subagents(
             print(f"  {workspace}", file=sys.stderr)
         return 0
     
+    from .windows import WindowRegistry
+
     print("Opening workspaces...", file=sys.stderr)
+    with open_pool_state(subagent_root) as store:
+        windows = WindowRegistry(store)
+        # Cache-only lookup: warmup never waits on a `code --status` probe
+        already_open = {
+            workspace for workspace in workspaces_to_open
+            if windows.is_open(workspace.parent.name, refresh=False)
+        }
     for i, workspace in enumerate(workspaces_to_open, 1):
+        if workspace in already_open:
+            print(f"  [{i}/{len(workspaces_to_open)}] {workspace.parent.name} (already open)", file=sys.stderr)
+            continue
+        if wait_ready:
+            continue
         try:
             print(f"  [{i}/{len(workspaces_to_open)}] {workspace.parent.name}", file=sys.stderr)
-            subprocess.Popen(f'code "{workspace}"', shell=True)
+            get_launcher().open_workspace(workspace)
         except Exception as e:
             print(f"warning: Failed to open {workspace}: {e}", file=sys.stderr)
     
-    print("✓ All workspaces opened", file=sys.stderr)
-    return 0
+    if not wait_ready:
+        print("✓ All workspaces opened", file=sys.stderr)
+        return 0
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    to_warm = [w for w in workspaces_to_open if w not in already_open]
+    if not to_warm:
+        print("✓ All workspaces already open", file=sys.stderr)
+        return 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(lambda w: _warm_window(w, timeout=timeout, retries=retries), to_warm)
+        )
+
+    with open_pool_state(subagent_root) as store:
+        windows = WindowRegistry(store)
+        for result in results:
+            if result["ready"]:
+                windows.mark_ready(result["subagent"])
+    _print_warmup_summary(results)
+    return 0 if all(result["ready"] for result in results) else 1
 
 
 def main() -> int:
@@ -0,0 +1,412 @@
+"""Asyncio API for dispatching agents to isolated subagents.
+
+`dispatch_agent_async` claims a subagent and launches the chat without
+blocking the event loop, then returns a `DispatchHandle` whose result can be
+awaited. Unlike `dispatch_agent`, nothing is printed: results are returned
+as `DispatchResult` objects, so one event loop can drive many agents.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, Optional, Sequence
+
+from .agent_dispatch import (
+    LeaseHeartbeat,
+    _create_request_prompt,
+    _launch_vscode_with_chat,
+    _prepare_subagent_directory,
+    _resolve_attachments,
+    _response_file_paths,
+    claim_subagent,
+    claim_subagent_queued,
+    get_subagent_root,
+    lease_ttl,
+    read_response_file,
+    release_subagent,
+    renew_lease,
+)
+from .singleflight import (
+    SHARED_WAIT_SLICE,
+    dispatch_fingerprint,
+    leader_in_flight,
+    run_single_flight,
+    shared_response,
+    wait_for_shared_response,
+)
+from .tracing import set_attribute, span, trace, trace_file_for
+from .watcher import get_file_watcher
+
+
+class DispatchError(RuntimeError):
+    """Raised when an agent could not be dispatched."""
+
+
+@dataclass(frozen=True)
+class DispatchResult:
+    """Outcome of a completed dispatch."""
+
+    request_id: str
+    subagent_name: str
+    response_file: Path
+    response: str
+    elapsed_s: float
+
+
+class DispatchHandle:
+    """Handle to an in-flight dispatch.
+
+    The agent's response is watched by a background task created when the
+    handle is. `await handle.result()` may be called any number of times.
+    A handle that joined an identical in-flight request (`shared`) falls
+    back to the history archive once the response file has been archived.
+    If that request ends without a response, the handle dispatches the
+    query itself with `take_over` (or raises DispatchError without one).
+
+    While a handle that owns its subagent is watching, it keeps the lease
+    alive with a heartbeat, so the reaper does not reclaim a long-running
+    agent. If it does not release the subagent on completion (or is
+    cancelled), the lease is handed back to the agent with the full lease
+    TTL.
+    """
+
+    def __init__(
+        self,
+        *,
+        request_id: str,
+        subagent_dir: Path,
+        response_file: Path,
+        temp_file: Path,
+        release_on_completion: bool,
+        shared: bool = False,
+        take_over: Optional[Callable[[], tuple[str, Path, Path, Path, bool]]] = None,
+    ) -> None:
+        self.request_id = request_id
+        self.subagent_dir = subagent_dir
+        self.response_file = response_file
+        self.temp_file = temp_file
+        self.shared = shared
+        self._release_on_completion = release_on_completion
+        self._take_over = take_over
+        self._started = time.monotonic()
+        # While this process watches its own subagent, keep the lease alive for the reaper
+        self._heartbeat = None if shared else LeaseHeartbeat(subagent_dir, request_id).start()
+        self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    @property
+    def subagent_name(self) -> str:
+        return self.subagent_dir.name
+
+    def __repr__(self) -> str:
+        return f"DispatchHandle(request_id={self.request_id!r}, subagent={self.subagent_name!r})"
+
+    async def _watch(self) -> DispatchResult:
+        try:
+            if self.shared:
+                response = await self._wait_shared()
+            else:
+                response = await self._wait_owned()
+        finally:
+            if self._heartbeat is not None:
+                self._heartbeat.stop(wait=False)
+            # A joined request's lock belongs to the dispatch that claimed it
+            if self._release_on_completion and not self.shared:
+                await asyncio.to_thread(
+                    release_subagent, self.subagent_dir, request_id=self.request_id
+                )
+            elif self._heartbeat is not None:
+                await asyncio.to_thread(
+                    renew_lease,
+                    self.subagent_dir,
+                    request_id=self.request_id,
+                    ttl=lease_ttl(),
+                    heartbeat=False,
+                )
+        return DispatchResult(
+            request_id=self.request_id,
+            subagent_name=self.subagent_name,
+            response_file=self.response_file,
+            response=response,
+            elapsed_s=round(time.monotonic() - self._started, 3),
+        )
+
+    async def _wait_owned(self) -> str:
+        await get_file_watcher().wait_for_async(self.response_file)
+        return await asyncio.to_thread(read_response_file, self.response_file)
+
+    async def _wait_shared(self) -> str:
+        subagent_root = self.subagent_dir.parent
+        leader = {"request_id": self.request_id, "response_file": str(self.response_file)}
+        while True:
+            # Wait in slices so cancelling the handle does not leave a thread blocked
+            response = await asyncio.to_thread(
+                wait_for_shared_response,
+                subagent_root,
+                leader,
+                timeout=SHARED_WAIT_SLICE,
+            )
+            if response is not None:
+                return response
+            if not await asyncio.to_thread(leader_in_flight, subagent_root, leader):
+                break
+        # Gone since the last look: any response it had is in place by now
+        response = await asyncio.to_thread(shared_response, subagent_root, leader)
+        if response is not None:
+            return response
+        if self._take_over is None:
+            raise DispatchError(f"Request {self.request_id} ended without a response")
+        started = await asyncio.to_thread(self._take_over)
+        self.request_id, self.subagent_dir, self.temp_file, self.response_file, _ = started
+        self.shared = False
+        self._heartbeat = LeaseHeartbeat(self.subagent_dir, self.request_id).start()
+        return await self._wait_owned()
+
+    def done(self) -> bool:
+        """Return True once the response has been read (or the wait failed)."""
+        return self._task.done()
+
+    def cancel(self) -> None:
+        """Stop waiting for the response.
+
+        The subagent is released if the handle owns its lock.
+        """
+        self._task.cancel()
+
+    async def result(self, timeout: Optional[float] = None) -> DispatchResult:
+        """Wait for the agent's response.
+
+        A timeout only abandons this wait; the handle keeps watching, so
+        `result()` can be awaited again later.
+
+        Raises asyncio.TimeoutError on timeout and asyncio.CancelledError if
+        the handle was cancelled.
+        """
+        return await asyncio.wait_for(asyncio.shield(self._task), timeout)
+
+
+def _start_dispatch(
+    user_query: str,
+    prompt_file: Path,
+    extra_attachments: Optional[Sequence[Path]],
+    subagent_root: Path,
+    queue: bool = False,
+    max_wait: Optional[float] = None,
+    *,
+    via: str = "async",
+    agent_unlocks: bool = True,
+    coalesce: bool = True,
+) -> tuple[str, Path, Path, Path, bool]:
+    """Claim a subagent and launch the chat (blocking; runs in a worker thread).
+
+    An identical request already in flight is joined instead, unless
+    `coalesce` is False; the last element of the result is False then, as
+    the caller does not own the subagent's lock. The claim and launch are
+    traced like `dispatch_agent`,
+    with `via` naming the entry point. With `agent_unlocks=False` the agent
+    is not told to unlock the subagent, and the caller must release it
+    after reading the response.
+    """
+    prompt_file = prompt_file.expanduser().resolve()
+    if not prompt_file.is_file():
+        raise DispatchError(f"Prompt file not found: {prompt_file}")
+    attachment_paths = _resolve_attachments(extra_attachments)
+
+    request_id = uuid.uuid4().hex
+    with trace(
+        "dispatch",
+        request_id=request_id,
+        trace_file=trace_file_for(subagent_root),
+        **{"lmspace.via": via, "lmspace.wait": False, "lmspace.queue": queue},
+    ):
+        return _start_traced_dispatch(
+            user_query,
+            prompt_file,
+            attachment_paths,
+            subagent_root,
+            request_id,
+            queue,
+            max_wait,
+            agent_unlocks=agent_unlocks,
+            coalesce=coalesce,
+        )
+
+
+def _start_traced_dispatch(
+    user_query: str,
+    prompt_file: Path,
+    attachment_paths: list[str],
+    subagent_root: Path,
+    request_id: str,
+    queue: bool,
+    max_wait: Optional[float],
+    *,
+    agent_unlocks: bool = True,
+    coalesce: bool = True,
+) -> tuple[str, Path, Path, Path, bool]:
+    launch = functools.partial(
+        _claim_and_launch,
+        user_query,
+        prompt_file,
+        attachment_paths,
+        subagent_root,
+        request_id,
+        queue,
+        max_wait,
+        agent_unlocks=agent_unlocks,
+    )
+    if not coalesce:
+        return launch()
+    return run_single_flight(
+        subagent_root,
+        lambda: dispatch_fingerprint(
+            subagent_root, prompt_file, [Path(path) for path in attachment_paths], user_query
+        ),
+        request_id=request_id,
+        lead=launch,
+        follow=functools.partial(_join_inflight, subagent_root),
+        # In flight until the subagent is released
+        keep=lambda started: True,
+    )
+
+
+def _join_inflight(subagent_root: Path, leader: dict) -> tuple[str, Path, Path, Path, bool]:
+    response_file_final = Path(leader["response_file"])
+    response_file_tmp = response_file_final.with_name(
+        response_file_final.name.replace("_res.md", "_res.tmp.md")
+    )
+    subagent_dir = subagent_root / leader["subagent"]
+    return leader["request_id"], subagent_dir, response_file_tmp, response_file_final, False
+
+
+def _claim_and_launch(
+    user_query: str,
+    prompt_file: Path,
+    attachment_paths: list[str],
+    subagent_root: Path,
+    request_id: str,
+    queue: bool,
+    max_wait: Optional[float],
+    *,
+    agent_unlocks: bool = True,
+    on_launched: Optional[Callable[[Path, Path], None]] = None,
+) -> tuple[str, Path, Path, Path, bool]:
+    with span("pool.claim"):
+        if queue or max_wait is not None:
+            subagent_dir = claim_subagent_queued(
+                subagent_root, request_id=request_id, max_wait=max_wait
+            )
+            if subagent_dir is None:
+                raise DispatchError(f"No subagent became available within {max_wait}s")
+        else:
+            subagent_dir = claim_subagent(subagent_root, request_id=request_id)
+        if subagent_dir is None:
+            raise DispatchError("No unlocked subagents available")
+        set_attribute("lmspace.subagent", subagent_dir.name)
+
+    try:
+        chat_id = request_id[:8]
+        with span("subagent.prepare"):
+            prepared = _prepare_subagent_directory(
+                subagent_dir, prompt_file, chat_id, False, request_id=request_id
+            )
+        if prepared != 0:
+            raise DispatchError(f"Failed to prepare {subagent_dir.name}")
+        timestamp, response_file_tmp, response_file_final = _response_file_paths(subagent_dir)
+        sudolang_prompt = _create_request_prompt(
+            user_query,
+            response_file_tmp,
+            response_file_final,
+            subagent_dir.name,
+            request_id,
+            subagent_root=subagent_dir.parent,
+            unlock=agent_unlocks,
+        )
+        with span("vscode.launch"):
+            launched = _launch_vscode_with_chat(
+                subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp
+            )
+        if not launched:
+            raise DispatchError(f"Failed to launch VS Code for {subagent_dir.name}")
+        if on_launched is not None:
+            on_launched(subagent_dir, response_file_final)
+    except BaseException:
+        release_subagent(subagent_dir, request_id=request_id)
+        raise
+
+    return request_id, subagent_dir, response_file_tmp, response_file_final, True
+
+
+async def dispatch_agent_async(
+    user_query: str,
+    prompt_file: Path,
+    *,
+    extra_attachments: Optional[Sequence[Path]] = None,
+    subagent_root: Optional[Path] = None,
+    release_on_completion: bool = True,
+    queue: bool = False,
+    max_wait: Optional[float] = None,
+) -> DispatchHandle:
+    """Dispatch an agent to an isolated subagent without blocking the loop.
+
+    Args:
+        user_query: The user's input query for the agent.
+        prompt_file: Path to a prompt file to copy to subagent and attach.
+        extra_attachments: Additional attachment paths to forward to the chat.
+        subagent_root: Root directory containing subagents. Defaults to standard location.
+        release_on_completion: When True (default), the subagent is unlocked
+            as soon as its response has been read, as in sync mode, and the
+            agent is not told to unlock it. When False, the agent unlocks it.
+        queue: When True, wait in the pool's FIFO queue for a subagent instead
+            of raising when all are locked.
+        max_wait: Maximum seconds to wait in the queue (implies queue).
+
+    Returns:
+        A handle for the in-flight dispatch.
+
+    Raises:
+        DispatchError: If no subagent is free (or none became free within
+            max_wait) or VS Code could not be launched.
+        FileNotFoundError: If an attachment does not exist.
+    """
+    if subagent_root is None:
+        subagent_root = get_subagent_root()
+
+    start = functools.partial(
+        _start_dispatch,
+        user_query,
+        prompt_file,
+        extra_attachments,
+        subagent_root,
+        queue,
+        max_wait,
+        # A handle that releases on completion reads the response first
+        agent_unlocks=not release_on_completion,
+    )
+    started = await asyncio.to_thread(start)
+    request_id, subagent_dir, response_file_tmp, response_file_final, owned = started
+    return DispatchHandle(
+        request_id=request_id,
+        subagent_dir=subagent_dir,
+        response_file=response_file_final,
+        temp_file=response_file_tmp,
+        release_on_completion=release_on_completion,
+        shared=not owned,
+        take_over=None if owned else functools.partial(start, coalesce=False),
+    )
+
+
+async def as_completed(handles: Iterable[DispatchHandle]) -> AsyncIterator[DispatchHandle]:
+    """Yield handles in the order their results become available.
+
+    Failed handles are yielded too; awaiting their `result()` raises.
+    """
+    pending = {handle._task: handle for handle in handles}
+    while pending:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield pending.pop(task)
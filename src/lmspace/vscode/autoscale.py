@@ -0,0 +1,327 @@
+"""Scale the subagent pool with demand.
+
+Each tick takes a snapshot of the pool: subagents by status, the depth of
+the claim queue, claims that failed since the previous tick and which idle
+subagents have an open window. `decide` turns the snapshot into one
+decision:
+
+- scale up: when fewer subagents are free than `target_idle` plus current
+  demand, provision more (never beyond `max_subagents`) with
+  `provision_subagents` and open them with `warmup_subagents`;
+- scale down: when more warm windows sit idle than `target_idle`, close
+  the windows of subagents idle for longer than `cooldown`, keeping at
+  least `min_windows` open. Subagent directories are kept so they can be
+  warmed again later.
+
+VS Code has no command to close a window, so a window is closed by
+terminating the renderer process recorded for it in the window registry.
+Every decision other than "hold" is printed to stderr and appended to
+`.lmspace-pool/autoscale.jsonl` under the subagent root.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from .agent_dispatch import (
+    _prune_dead_waiters,
+    release_subagent,
+    try_lock_subagent,
+    warmup_subagents,
+)
+from .pool_state import STATUS_AVAILABLE, STATUS_LOCKED, PoolStateStore, open_pool_state
+from .provision import DEFAULT_LOCK_NAME, DEFAULT_TEMPLATE_DIR, provision_subagents
+from .windows import WindowRegistry
+
+AUTOSCALE_LOG_NAME = "autoscale.jsonl"
+
+
+@dataclass(frozen=True)
+class AutoscaleSettings:
+    """Bounds and targets for the autoscaler."""
+
+    min_windows: int = 0
+    max_subagents: int = 8
+    target_idle: int = 1
+    cooldown: float = 300.0
+    interval: float = 10.0
+
+
+@dataclass(frozen=True)
+class IdleWindow:
+    """An available subagent whose VS Code window is open."""
+
+    name: str
+    number: int
+    pid: Optional[int]
+    idle_for: float
+
+
+@dataclass(frozen=True)
+class PoolSnapshot:
+    """Pool state observed at the start of a tick."""
+
+    total: int
+    available: int
+    locked: int
+    queue_depth: int
+    failed_claims: int
+    open_windows: int
+    idle_windows: list[IdleWindow] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ScalingDecision:
+    """What the autoscaler will do this tick."""
+
+    action: str  # "scale_up", "scale_down" or "hold"
+    reason: str
+    provision_available: int = 0
+    close: list[IdleWindow] = field(default_factory=list)
+
+
+def decide(
+    snapshot: PoolSnapshot,
+    settings: AutoscaleSettings,
+    *,
+    since_scale_up: float = float("inf"),
+) -> ScalingDecision:
+    """Choose a scaling action for a pool snapshot.
+
+    since_scale_up is the number of seconds since the last scale-up; windows
+    are not closed within one cooldown of it.
+    """
+    demand = snapshot.queue_depth + snapshot.failed_claims
+    wanted = settings.target_idle + demand
+    headroom = max(0, settings.max_subagents - snapshot.total)
+    if snapshot.available < wanted and headroom > 0:
+        add = min(wanted - snapshot.available, headroom)
+        return ScalingDecision(
+            action="scale_up",
+            reason=(
+                f"{snapshot.available} free < target {settings.target_idle} + demand {demand} "
+                f"(queue {snapshot.queue_depth}, failed claims {snapshot.failed_claims})"
+            ),
+            provision_available=snapshot.available + add,
+        )
+
+    if demand or since_scale_up < settings.cooldown:
+        return ScalingDecision(action="hold", reason="demand present or recently scaled up")
+
+    closable = sorted(
+        (w for w in snapshot.idle_windows if w.idle_for >= settings.cooldown and w.pid),
+        key=lambda w: w.number,
+        reverse=True,
+    )
+    limit = min(
+        len(snapshot.idle_windows) - settings.target_idle,
+        snapshot.open_windows - settings.min_windows,
+    )
+    if closable and limit > 0:
+        close = closable[:limit]
+        return ScalingDecision(
+            action="scale_down",
+            reason=(
+                f"{len(snapshot.idle_windows)} idle windows > target {settings.target_idle}; "
+                f"{len(close)} idle for over {settings.cooldown:g}s"
+            ),
+            close=close,
+        )
+    return ScalingDecision(action="hold", reason="pool within targets")
+
+
+def _idle_seconds(updated_at: Optional[str], now: float) -> float:
+    if not updated_at:
+        return 0.0
+    return max(0.0, now - datetime.fromisoformat(updated_at).timestamp())
+
+
+def close_window(pid: int) -> bool:
+    """Terminate a VS Code window process. Returns False if it was already gone."""
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class Autoscaler:
+    """Apply scaling decisions to one subagent root."""
+
+    def __init__(
+        self,
+        subagent_root: Path,
+        settings: AutoscaleSettings,
+        *,
+        template: Path = DEFAULT_TEMPLATE_DIR,
+        lock_name: str = DEFAULT_LOCK_NAME,
+        dry_run: bool = False,
+    ) -> None:
+        self.subagent_root = subagent_root
+        self.settings = settings
+        self.template = template
+        self.lock_name = lock_name
+        self.dry_run = dry_run
+        self.log_path = subagent_root / ".lmspace-pool" / AUTOSCALE_LOG_NAME
+        self._claim_failures: Optional[int] = None
+        self._last_scale_up = float("-inf")
+
+    def snapshot(self, store: PoolStateStore) -> PoolSnapshot:
+        """Observe the pool through its state store and window registry."""
+        now = time.time()
+        with store.transaction() as conn:
+            _prune_dead_waiters(store, conn)
+        records = store.list_subagents()
+        failures = store.claim_failures()
+        # Failures before the autoscaler started are not current demand
+        failed_claims = 0 if self._claim_failures is None else failures - self._claim_failures
+        self._claim_failures = failures
+
+        windows = WindowRegistry(store)
+        open_windows = 0
+        idle_windows = []
+        for record in records:
+            if not windows.is_open(record["name"]):
+                continue
+            open_windows += 1
+            if record["status"] == STATUS_AVAILABLE:
+                window = windows.lookup(record["name"])
+                idle_windows.append(
+                    IdleWindow(
+                        name=record["name"],
+                        number=record["number"],
+                        pid=window.pid if window else None,
+                        idle_for=_idle_seconds(record["updated_at"], now),
+                    )
+                )
+        return PoolSnapshot(
+            total=len(records),
+            available=sum(r["status"] == STATUS_AVAILABLE for r in records),
+            locked=sum(r["status"] == STATUS_LOCKED for r in records),
+            queue_depth=len(store.queue_entries()),
+            failed_claims=failed_claims,
+            open_windows=open_windows,
+            idle_windows=idle_windows,
+        )
+
+    def tick(self) -> ScalingDecision:
+        """Run one observe-decide-act cycle."""
+        self.subagent_root.mkdir(parents=True, exist_ok=True)
+        with open_pool_state(self.subagent_root, lock_name=self.lock_name) as store:
+            snapshot = self.snapshot(store)
+            decision = decide(
+                snapshot,
+                self.settings,
+                since_scale_up=time.monotonic() - self._last_scale_up,
+            )
+            if decision.action == "scale_down" and not self.dry_run:
+                windows = WindowRegistry(store)
+                request_id = f"autoscale-{os.getpid()}"
+                for window in decision.close:
+                    # Hold the subagent while its window closes so no dispatch claims it meanwhile
+                    subagent_dir = self.subagent_root / window.name
+                    if not try_lock_subagent(
+                        subagent_dir, request_id=request_id, lock_name=self.lock_name, store=store
+                    ):
+                        continue
+                    try:
+                        close_window(window.pid)
+                        windows.forget(window.name)
+                    finally:
+                        release_subagent(
+                            subagent_dir, lock_name=self.lock_name, store=store, request_id=request_id
+                        )
+
+        if decision.action == "scale_up":
+            self._last_scale_up = time.monotonic()
+            if not self.dry_run:
+                self._scale_up(decision)
+        if decision.action != "hold":
+            self._log(snapshot, decision)
+        return decision
+
+    def _scale_up(self, decision: ScalingDecision) -> None:
+        created, skipped_existing, _ = provision_subagents(
+            template=self.template,
+            target_root=self.subagent_root,
+            subagents=decision.provision_available,
+            lock_name=self.lock_name,
+            force=False,
+            dry_run=False,
+        )
+        if created:
+            warmup_subagents(
+                subagent_root=self.subagent_root,
+                subagents=len(created),
+                names=[path.name for path in created],
+                dry_run=False,
+                wait_ready=True,
+            )
+
+    def _log(self, snapshot: PoolSnapshot, decision: ScalingDecision) -> None:
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "action": decision.action,
+            "reason": decision.reason,
+            "dry_run": self.dry_run,
+            "provision_available": decision.provision_available or None,
+            "closed": [w.name for w in decision.close],
+            "snapshot": {k: v for k, v in asdict(snapshot).items() if k != "idle_windows"},
+        }
+        print(f"info: autoscale {decision.action}: {decision.reason}", file=sys.stderr)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.log_path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+
+
+def run_autoscaler(
+    *,
+    subagent_root: Path,
+    settings: AutoscaleSettings,
+    template: Path = DEFAULT_TEMPLATE_DIR,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    once: bool = False,
+    dry_run: bool = False,
+) -> int:
+    """Run the autoscaler until interrupted (or for a single tick).
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    if settings.min_windows < 0 or settings.target_idle < 0:
+        print("error: --min and --target-idle must not be negative", file=sys.stderr)
+        return 1
+    if settings.max_subagents < max(1, settings.min_windows):
+        print("error: --max must be at least 1 and at least --min", file=sys.stderr)
+        return 1
+
+    autoscaler = Autoscaler(
+        subagent_root, settings, template=template, lock_name=lock_name, dry_run=dry_run
+    )
+    print(
+        f"info: Autoscaling {subagent_root} (min {settings.min_windows} windows, "
+        f"max {settings.max_subagents} subagents, target idle {settings.target_idle})",
+        file=sys.stderr,
+    )
+    try:
+        while True:
+            try:
+                autoscaler.tick()
+            except (OSError, ValueError) as error:
+                print(f"warning: autoscale tick failed: {error}", file=sys.stderr)
+                if once:
+                    return 1
+            if once:
+                return 0
+            time.sleep(settings.interval)
+    except KeyboardInterrupt:
+        print("\ninfo: Autoscaler stopped", file=sys.stderr)
+        return 0
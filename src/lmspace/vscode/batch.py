@@ -0,0 +1,366 @@
+"""Fan a JSONL file of chat jobs across the subagent pool."""
+
+from __future__ import annotations
+
+import functools
+import json
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional, TextIO
+
+from .agent_dispatch import (
+    LeaseHeartbeat,
+    _create_request_prompt,
+    _launch_vscode_with_chat,
+    _prepare_subagent_directory,
+    _resolve_attachments,
+    _response_file_paths,
+    claim_subagent,
+    get_subagent_root,
+    read_response_file,
+    release_subagent,
+    wait_for_response_file,
+)
+from .defaults import DEFAULT_MAX_CONCURRENCY
+from .pool_state import open_pool_state
+from .singleflight import dispatch_fingerprint, run_single_flight, wait_for_shared_response
+from .tracing import set_attribute, span, trace, trace_file_for
+
+CLAIM_RETRY_INTERVAL = 1.0
+
+
+class _ClaimGate:
+    """Coordinate subagent claims between the workers of one batch.
+
+    When the pool is exhausted, a worker waits for another worker of the same
+    batch to release its subagent instead of failing. It only gives up when
+    no job of this batch holds a subagent, since nothing would free one up.
+    Claims run outside the gate's lock, and only a worker that gives up
+    counts as a failed claim, not each of its retries.
+    """
+
+    def __init__(self, subagent_root: Path) -> None:
+        self.subagent_root = subagent_root
+        self._condition = threading.Condition()
+        self._held = 0
+        self._releases = 0
+
+    def claim(self, request_id: str) -> Optional[Path]:
+        while True:
+            with self._condition:
+                releases = self._releases
+            subagent_dir = claim_subagent(
+                self.subagent_root, request_id=request_id, record_failure=False
+            )
+            with self._condition:
+                if subagent_dir is not None:
+                    self._held += 1
+                    return subagent_dir
+                if self._releases != releases:
+                    # A subagent was released while this claim ran
+                    continue
+                if self._held == 0:
+                    break
+                # Also re-check periodically for subagents freed by other processes
+                self._condition.wait(CLAIM_RETRY_INTERVAL)
+        with open_pool_state(self.subagent_root) as store, store.transaction() as conn:
+            store.record_claim_failure(conn)
+        return None
+
+    def release(self, subagent_dir: Path, request_id: str) -> None:
+        release_subagent(subagent_dir, request_id=request_id)
+        with self._condition:
+            self._held -= 1
+            self._releases += 1
+            self._condition.notify()
+
+
+def load_batch_jobs(jobs_file: Path) -> list[dict[str, Any]]:
+    """Load and validate batch jobs from a JSONL file.
+
+    Each non-blank line must be a JSON object with `prompt_file` and `query`
+    keys, and optionally `attachments` (a list of paths) and `id`. Relative
+    paths are resolved against the directory containing the jobs file.
+
+    Raises ValueError if a line is malformed.
+    """
+    base_dir = jobs_file.expanduser().resolve().parent
+    jobs: list[dict[str, Any]] = []
+    with jobs_file.open(encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise ValueError(f"{jobs_file}:{line_number}: invalid JSON: {error}") from error
+            if not isinstance(record, dict):
+                raise ValueError(f"{jobs_file}:{line_number}: job must be a JSON object")
+            for key in ("prompt_file", "query"):
+                if not isinstance(record.get(key), str):
+                    raise ValueError(f"{jobs_file}:{line_number}: missing string field '{key}'")
+            attachments = record.get("attachments") or []
+            if not isinstance(attachments, list):
+                raise ValueError(f"{jobs_file}:{line_number}: 'attachments' must be a list")
+
+            jobs.append(
+                {
+                    "id": str(record.get("id", len(jobs))),
+                    "prompt_file": base_dir / Path(record["prompt_file"]).expanduser(),
+                    "query": record["query"],
+                    "attachments": [base_dir / Path(a).expanduser() for a in attachments],
+                }
+            )
+    return jobs
+
+
+def _run_job(
+    job: dict[str, Any],
+    *,
+    gate: _ClaimGate,
+    timeout: Optional[float],
+    dry_run: bool,
+) -> dict[str, Any]:
+    """Claim a subagent, launch the chat and wait for its response."""
+    started = time.monotonic()
+    result: dict[str, Any] = {"id": job["id"], "success": False}
+
+    prompt_file = job["prompt_file"].resolve()
+    if not prompt_file.is_file():
+        result["error"] = f"Prompt file not found: {prompt_file}"
+        return result
+    attachment_paths = _resolve_attachments(job["attachments"])
+
+    if dry_run:
+        result.update({"success": True, "status": "dry_run"})
+        return result
+
+    request_id = uuid.uuid4().hex
+    with trace(
+        "dispatch",
+        request_id=request_id,
+        trace_file=trace_file_for(gate.subagent_root),
+        **{"lmspace.via": "batch", "lmspace.batch_job": job["id"]},
+    ):
+        return _run_traced_job(
+            job,
+            result,
+            request_id=request_id,
+            prompt_file=prompt_file,
+            attachment_paths=attachment_paths,
+            started=started,
+            gate=gate,
+            timeout=timeout,
+        )
+
+
+def _run_traced_job(
+    job: dict[str, Any],
+    result: dict[str, Any],
+    *,
+    request_id: str,
+    prompt_file: Path,
+    attachment_paths: list[str],
+    started: float,
+    gate: _ClaimGate,
+    timeout: Optional[float],
+) -> dict[str, Any]:
+    run = functools.partial(
+        _claim_and_run,
+        job,
+        result,
+        request_id=request_id,
+        prompt_file=prompt_file,
+        attachment_paths=attachment_paths,
+        started=started,
+        gate=gate,
+        timeout=timeout,
+    )
+    return run_single_flight(
+        gate.subagent_root,
+        lambda: dispatch_fingerprint(
+            gate.subagent_root, prompt_file, [Path(path) for path in attachment_paths], job["query"]
+        ),
+        request_id=request_id,
+        lead=run,
+        follow=functools.partial(
+            _share_inflight, result, subagent_root=gate.subagent_root, started=started, timeout=timeout
+        ),
+    )
+
+
+def _share_inflight(
+    result: dict[str, Any],
+    leader: dict[str, Any],
+    *,
+    subagent_root: Path,
+    started: float,
+    timeout: Optional[float],
+) -> Optional[dict[str, Any]]:
+    """Share the response of an identical job in flight; None if it ends without one."""
+    with span("agent.answer"):
+        response = wait_for_shared_response(subagent_root, leader, timeout=timeout)
+    if response is None:
+        return None
+    result.update(
+        {
+            "subagent_name": leader["subagent"],
+            "response_file": leader["response_file"],
+            "coalesced_with": leader["request_id"],
+            "response": response,
+            "success": True,
+            "status": "completed",
+            "elapsed_s": round(time.monotonic() - started, 3),
+        }
+    )
+    return result
+
+
+def _claim_and_run(
+    job: dict[str, Any],
+    result: dict[str, Any],
+    *,
+    request_id: str,
+    prompt_file: Path,
+    attachment_paths: list[str],
+    started: float,
+    gate: _ClaimGate,
+    timeout: Optional[float],
+    on_launched: Optional[Callable[[Path, Path], None]] = None,
+) -> dict[str, Any]:
+    """Claim a subagent for a job and run it to completion, filling in `result`."""
+    with span("pool.claim"):
+        subagent_dir = gate.claim(request_id)
+        if subagent_dir is not None:
+            set_attribute("lmspace.subagent", subagent_dir.name)
+    if subagent_dir is None:
+        result["error"] = "No unlocked subagents available"
+        return result
+    result["subagent_name"] = subagent_dir.name
+
+    try:
+        chat_id = request_id[:8]
+        with span("subagent.prepare"):
+            prepared = _prepare_subagent_directory(
+                subagent_dir, prompt_file, chat_id, False, request_id=request_id
+            )
+        if prepared != 0:
+            result["error"] = "Failed to prepare subagent directory"
+            return result
+        timestamp, response_file_tmp, response_file_final = _response_file_paths(subagent_dir)
+        sudolang_prompt = _create_request_prompt(
+            job["query"],
+            response_file_tmp,
+            response_file_final,
+            subagent_dir.name,
+            request_id,
+            subagent_root=subagent_dir.parent,
+            # The job releases its subagent once it has read the response
+            unlock=False,
+        )
+
+        with span("vscode.launch"):
+            launched = _launch_vscode_with_chat(
+                subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp
+            )
+        if not launched:
+            result["error"] = "Failed to launch VS Code"
+            return result
+        if on_launched is not None:
+            on_launched(subagent_dir, response_file_final)
+
+        result["response_file"] = str(response_file_final)
+        with LeaseHeartbeat(subagent_dir, request_id), span("agent.answer"):
+            response_ready = wait_for_response_file(response_file_final, timeout=timeout)
+        if not response_ready:
+            result["error"] = f"Timed out after {timeout}s waiting for agent response"
+            return result
+
+        with span("response.read"):
+            result["response"] = read_response_file(response_file_final)
+        result["success"] = True
+        result["status"] = "completed"
+        return result
+    finally:
+        gate.release(subagent_dir, request_id)
+        result["elapsed_s"] = round(time.monotonic() - started, 3)
+
+
+def dispatch_batch(
+    jobs_file: Path,
+    *,
+    subagent_root: Optional[Path] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout: Optional[float] = None,
+    dry_run: bool = False,
+    output: TextIO = sys.stdout,
+) -> int:
+    """Dispatch every job in a JSONL file across free subagents.
+
+    Jobs run with at most `max_concurrency` in flight; when the pool has fewer
+    free subagents, jobs wait for this batch's own jobs to release theirs.
+    One NDJSON result line is written to `output` per job as soon as that job
+    completes, so lines appear in completion order rather than file order.
+
+    Args:
+        jobs_file: JSONL file of jobs (see load_batch_jobs).
+        subagent_root: Root directory containing subagents. Defaults to standard location.
+        max_concurrency: Maximum number of jobs in flight at once.
+        timeout: Per-job limit in seconds on waiting for the agent's response.
+        dry_run: When True, validate jobs without claiming subagents.
+        output: Stream that receives the NDJSON result lines.
+
+    Returns:
+        Exit code (0 if every job succeeded, non-zero otherwise)
+    """
+    if max_concurrency < 1:
+        print("error: max concurrency must be a positive integer", file=sys.stderr)
+        return 1
+
+    try:
+        jobs = load_batch_jobs(jobs_file)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    if subagent_root is None:
+        subagent_root = get_subagent_root()
+
+    print(
+        f"info: Dispatching {len(jobs)} job(s) with concurrency {max_concurrency}",
+        file=sys.stderr,
+    )
+
+    # Imported here so building the CLI parser does not load the executor
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    gate = _ClaimGate(subagent_root)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(
+                _run_job,
+                job,
+                gate=gate,
+                timeout=timeout,
+                dry_run=dry_run,
+            ): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                result = {"id": futures[future]["id"], "success": False, "error": str(error)}
+            if not result["success"]:
+                failures += 1
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    if failures:
+        print(f"warning: {failures} of {len(jobs)} job(s) failed", file=sys.stderr)
+        return 1
+    return 0
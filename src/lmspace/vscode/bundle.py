@@ -0,0 +1,145 @@
+"""Bundle many chat attachments into a single manifest file.
+
+Every attachment becomes a `-a <path>` pair on the `code chat` command line.
+With dozens of context files that command line is slow to spawn and can
+exceed OS limits (`code` is a batch file on Windows, limited to 8191
+characters). In bundling mode the attachments are written to one Markdown
+manifest in the subagent's `messages/` directory, and only the manifest is
+attached. The agent then reads inlined files from the manifest instead of
+receiving them as attachments, so bundling is opt-in.
+
+Attachments are deduplicated by real path and then by content hash. Text
+files up to the inline limit are inlined in the manifest; larger or binary
+files and directories are listed by absolute path for the agent to open.
+
+LMSPACE_ATTACHMENT_BUNDLE (or `chat --bundle-attachments`) selects the
+mode: `never` (default) attaches every file, `auto` bundles once there are
+more than BUNDLE_MIN_ATTACHMENTS attachments or their arguments would
+exceed BUNDLE_MAX_ARGS_LENGTH characters, and `always` bundles any
+attachments. LMSPACE_ATTACHMENT_INLINE_MAX_BYTES sets the inline limit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .defaults import BUNDLE_MODES
+
+BUNDLE_ENV = "LMSPACE_ATTACHMENT_BUNDLE"
+INLINE_MAX_BYTES_ENV = "LMSPACE_ATTACHMENT_INLINE_MAX_BYTES"
+BUNDLE_MIN_ATTACHMENTS = 8
+BUNDLE_MAX_ARGS_LENGTH = 4096
+DEFAULT_INLINE_MAX_BYTES = 32 * 1024
+
+_BACKTICK_RUN = re.compile(r"`{3,}")
+
+
+def bundle_mode(requested: Optional[str] = None) -> str:
+    """Resolve the bundling mode: an explicit request wins over LMSPACE_ATTACHMENT_BUNDLE.
+
+    Unset or unknown modes are `never`.
+    """
+    mode = requested if requested is not None else os.environ.get(BUNDLE_ENV, "never")
+    mode = mode.strip().lower()
+    return mode if mode in BUNDLE_MODES else "never"
+
+
+def should_bundle(attachment_paths: Sequence[str], mode: Optional[str] = None) -> bool:
+    """Return True if these attachments should be sent as one manifest.
+
+    `mode` overrides LMSPACE_ATTACHMENT_BUNDLE (see bundle_mode).
+    """
+    mode = bundle_mode(mode)
+    if mode != "auto" or not attachment_paths:
+        return mode == "always" and bool(attachment_paths)
+    args_length = sum(len(path) + len(" -a ") for path in attachment_paths)
+    return len(attachment_paths) > BUNDLE_MIN_ATTACHMENTS or args_length > BUNDLE_MAX_ARGS_LENGTH
+
+
+def inline_max_bytes() -> int:
+    """Return the size limit for inlining a file (LMSPACE_ATTACHMENT_INLINE_MAX_BYTES)."""
+    try:
+        return int(os.environ.get(INLINE_MAX_BYTES_ENV, DEFAULT_INLINE_MAX_BYTES))
+    except ValueError:
+        return DEFAULT_INLINE_MAX_BYTES
+
+
+def _fence(text: str) -> str:
+    longest = max((len(run) for run in _BACKTICK_RUN.findall(text)), default=2)
+    return "`" * (longest + 1)
+
+
+def _decode_text(data: bytes) -> Optional[str]:
+    if b"\0" in data:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def write_attachment_bundle(
+    attachment_paths: Sequence[str],
+    bundle_file: Path,
+    *,
+    inline_limit: Optional[int] = None,
+) -> dict[str, int]:
+    """Write the manifest for `attachment_paths` to `bundle_file`.
+
+    Returns counts of inlined, referenced and duplicate attachments.
+    """
+    if inline_limit is None:
+        inline_limit = inline_max_bytes()
+    seen_paths: set[str] = set()
+    seen_hashes: dict[str, str] = {}
+    inlined: list[str] = []
+    referenced: list[str] = []
+    duplicates: list[str] = []
+
+    for attachment in attachment_paths:
+        real_path = os.path.realpath(attachment)
+        if real_path in seen_paths:
+            duplicates.append(f"- `{attachment}`: same file as an attachment above")
+            continue
+        seen_paths.add(real_path)
+        path = Path(real_path)
+        if path.is_dir():
+            referenced.append(f"- `{real_path}` (directory)")
+            continue
+
+        size = path.stat().st_size
+        if size > inline_limit:
+            # Referenced, not read: a duplicate costs one line, so it is not hashed
+            referenced.append(f"- `{real_path}` ({size} bytes)")
+            continue
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen_hashes:
+            duplicates.append(f"- `{real_path}`: same content as `{seen_hashes[digest]}`")
+            continue
+        seen_hashes[digest] = real_path
+        text = _decode_text(data)
+        if text is None:
+            referenced.append(f"- `{real_path}` (binary, {size} bytes)")
+            continue
+        fence = _fence(text)
+        if not text.endswith("\n"):
+            text += "\n"
+        inlined.append(f"## {path.name}\n\nPath: `{real_path}`\n\n{fence}\n{text}{fence}\n")
+
+    sections = [
+        "# Attachments\n\n"
+        "The files attached to this request are bundled here. Files inlined "
+        "below are complete; open the referenced files from their paths.\n"
+    ]
+    if referenced:
+        sections.append("## Referenced files\n\n" + "\n".join(referenced) + "\n")
+    if duplicates:
+        sections.append("## Duplicates (not repeated)\n\n" + "\n".join(duplicates) + "\n")
+    sections.extend(inlined)
+    bundle_file.write_text("\n".join(sections), encoding="utf-8")
+    return {"inlined": len(inlined), "referenced": len(referenced), "duplicates": len(duplicates)}
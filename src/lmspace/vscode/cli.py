@@ -8,8 +8,20 @@ import sys
 from pathlib import Path
 from typing import Any
 
-from .provision import provision_subagents, DEFAULT_TEMPLATE_DIR, DEFAULT_LOCK_NAME
-from .agent_dispatch import dispatch_agent, warmup_subagents, list_subagents, get_subagent_root
+# Only defaults are imported here; each handler imports the module it drives
+from .defaults import (
+    BUNDLE_MODES,
+    COPY_MODES,
+    DEFAULT_COPY_MODE,
+    DEFAULT_LOCK_NAME,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_PROVISION_WORKERS,
+    DEFAULT_TEMPLATE_DIR,
+    DEFAULT_WARMUP_CONCURRENCY,
+    DEFAULT_WARMUP_RETRIES,
+    DEFAULT_WARMUP_TIMEOUT,
+)
+
 
 def add_provision_parser(subparsers: Any) -> None:
     """Add the 'provision' subcommand parser."""
@@ -39,10 +51,10 @@ def add_provision_parser(subparsers: Any) -> None:
     parser.add_argument(
         "--target-root",
         type=Path,
-        default=Path.home() / ".lmspace" / "vscode-agents",
+        default=None,
         help=(
             "Destination root for subagent directories. Defaults to "
-            "~/.lmspace/vscode-agents."
+            "$LMSPACE_SUBAGENT_ROOT or ~/.lmspace/vscode-agents."
         ),
     )
     parser.add_argument(
@@ -67,12 +79,68 @@ def add_provision_parser(subparsers: Any) -> None:
         "--warmup",
         action="store_true",
         help=(
-            "Warm up provisioned subagents after provisioning completes. "
-            "Ignored during dry runs."
+            "Warm up provisioned subagents after provisioning completes, "
+            "waiting for each window to be ready. Ignored during dry runs."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_PROVISION_WORKERS,
+        help=(
+            "Number of threads writing workspace files. Defaults to "
+            f"{DEFAULT_PROVISION_WORKERS}."
+        ),
+    )
+    parser.add_argument(
+        "--copy-mode",
+        choices=COPY_MODES,
+        default=DEFAULT_COPY_MODE,
+        help=(
+            "How workspace files are copied: 'auto' clones them (reflink) where "
+            "the filesystem supports it and copies them otherwise; 'reflink' and "
+            "'hardlink' fail where unsupported. Hard links share the template "
+            "file, so only use them with a read-only template. Defaults to "
+            f"{DEFAULT_COPY_MODE}."
         ),
     )
 
 
+def add_reconcile_parser(subparsers: Any) -> None:
+    """Add the 'reconcile' subcommand parser."""
+    parser = subparsers.add_parser(
+        "reconcile",
+        help="Bring the subagent pool in line with a pool.yaml spec",
+        description=(
+            "Create missing subagents and rewrite only those whose workspace "
+            "files are out of date with the spec's template. Locked subagents "
+            "are updated the next time they are claimed."
+        ),
+    )
+    parser.add_argument(
+        "--spec",
+        type=Path,
+        default=Path("pool.yaml"),
+        help="Path to the pool spec. Defaults to pool.yaml in the current directory.",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the result as JSON",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show what would change without touching any subagent",
+    )
+
+
+def _print_provision_progress(done: int, total: int) -> None:
+    # About ten progress lines, however large the pool
+    if done == total or done % max(1, total // 10) == 0:
+        print(f"info: Provisioned {done}/{total} subagent(s)", file=sys.stderr, flush=True)
+
+
 def add_chat_parser(subparsers: Any) -> None:
     """Add the 'chat' subcommand parser."""
     parser = subparsers.add_parser(
@@ -99,6 +167,14 @@ def add_chat_parser(subparsers: Any) -> None:
             "Repeat for multiple attachments."
         ),
     )
+    parser.add_argument(
+        "--auto-imports",
+        action="store_true",
+        help=(
+            "Also attach every file the prompt file imports through #file: references "
+            "or SudoLang import statements, transitively"
+        ),
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -109,6 +185,111 @@ def add_chat_parser(subparsers: Any) -> None:
         action="store_true",
         help="Wait for response and print to stdout (sync mode). Default is async mode.",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Print the response while the agent is still writing it "
+            "(implies --wait; bypasses the pool daemon)"
+        ),
+    )
+    parser.add_argument(
+        "--queue",
+        action="store_true",
+        help="Wait in the pool's FIFO queue for a subagent instead of failing when all are locked",
+    )
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Give up after waiting this long in the queue (implies --queue)",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Dispatch in this process even if a pool daemon is running",
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--cache",
+        dest="cache",
+        action="store_const",
+        const=True,
+        default=None,
+        help=(
+            "With --wait, reuse the response of an identical earlier query "
+            "(same prompt file, attachments and query) and cache new responses"
+        ),
+    )
+    cache_group.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_const",
+        const=False,
+        help="Bypass the response cache even if LMSPACE_RESPONSE_CACHE is set",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Maximum age of a cached response to reuse (default: LMSPACE_RESPONSE_CACHE_TTL or one day)",
+    )
+    parser.add_argument(
+        "--bundle-attachments",
+        choices=BUNDLE_MODES,
+        default=None,
+        help=(
+            "Send the attachments as one manifest file: when there are many (auto), "
+            "always or never (default: LMSPACE_ATTACHMENT_BUNDLE or never)"
+        ),
+    )
+
+
+def add_chat_batch_parser(subparsers: Any) -> None:
+    """Add the 'chat-batch' subcommand parser."""
+    parser = subparsers.add_parser(
+        "chat-batch",
+        help="Dispatch a JSONL file of chats across the subagent pool",
+        description=(
+            "Read chat jobs from a JSONL file and spread them over free subagents. "
+            "Each line is an object with 'prompt_file', 'query' and optional "
+            "'attachments' and 'id'. One NDJSON result line is printed per job "
+            "as it completes."
+        ),
+    )
+    parser.add_argument(
+        "jobs_file",
+        type=Path,
+        help="Path to a JSONL file of chat jobs",
+    )
+    parser.add_argument(
+        "-j", "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help=f"Maximum number of jobs in flight at once. Defaults to {DEFAULT_MAX_CONCURRENCY}.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Per-job limit in seconds on waiting for the agent's response.",
+    )
+    parser.add_argument(
+        "--target-root",
+        type=Path,
+        default=None,
+        help=(
+            "Root directory containing subagents. Defaults to "
+            "~/.lmspace/vscode-agents."
+        ),
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Validate the jobs without claiming subagents or launching VS Code",
+    )
 
 
 def add_warmup_parser(subparsers: Any) -> None:
@@ -141,6 +322,42 @@ def add_warmup_parser(subparsers: Any) -> None:
         action="store_true",
         help="Show which workspaces would be opened without opening them",
     )
+    parser.add_argument(
+        "--wait-ready",
+        action="store_true",
+        help=(
+            "Open windows in stages and wait until each answers the readiness "
+            "check, retrying windows that do not, then print time-to-ready"
+        ),
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_WARMUP_CONCURRENCY,
+        help=(
+            "Maximum number of windows starting at once with --wait-ready. "
+            f"Defaults to {DEFAULT_WARMUP_CONCURRENCY}."
+        ),
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_WARMUP_RETRIES,
+        help=(
+            "Relaunch attempts for a window that is not ready in time. "
+            f"Defaults to {DEFAULT_WARMUP_RETRIES}."
+        ),
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_WARMUP_TIMEOUT,
+        metavar="SECONDS",
+        help=(
+            "Seconds each attempt waits for a window to be ready. "
+            f"Defaults to {DEFAULT_WARMUP_TIMEOUT:g}."
+        ),
+    )
 
 
 def add_list_parser(subparsers: Any) -> None:
@@ -167,6 +384,14 @@ def add_list_parser(subparsers: Any) -> None:
         action="store_true",
         help="Output results as JSON.",
     )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help=(
+            "Reconcile the pool state index with the subagent directories "
+            "and lock files on disk before listing."
+        ),
+    )
 
 
 def add_unlock_parser(subparsers: Any) -> None:
@@ -192,13 +417,22 @@ def add_unlock_parser(subparsers: Any) -> None:
         dest="unlock_all",
         help="Unlock all subagents.",
     )
+    parser.add_argument(
+        "--request-id",
+        default=None,
+        help=(
+            "Only unlock the subagent if it is still held by this request. "
+            "Used by dispatched agents so a late unlock cannot free a "
+            "subagent that was claimed again."
+        ),
+    )
     parser.add_argument(
         "--target-root",
         type=Path,
-        default=Path.home() / ".lmspace" / "vscode-agents",
+        default=None,
         help=(
             "Root directory containing subagents. Defaults to "
-            "~/.lmspace/vscode-agents."
+            "$LMSPACE_SUBAGENT_ROOT or ~/.lmspace/vscode-agents."
         ),
     )
     parser.add_argument(
@@ -214,22 +448,276 @@ def add_unlock_parser(subparsers: Any) -> None:
         action="store_true",
         help="Show what would be unlocked without making changes.",
     )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help=(
+            "Reconcile the pool state index with the subagent directories "
+            "and lock files on disk before unlocking."
+        ),
+    )
+
+
+def add_serve_parser(subparsers: Any) -> None:
+    """Add the 'serve' subcommand parser."""
+    parser = subparsers.add_parser(
+        "serve",
+        help="Run a pool daemon that serves dispatches over a Unix socket",
+        description=(
+            "Run a resident pool daemon for a subagent root. While it runs, "
+            "'lmspace code chat' hands dispatches to it instead of doing the "
+            "work in a new process."
+        ),
+    )
+    parser.add_argument(
+        "--target-root",
+        type=Path,
+        default=None,
+        help=(
+            "Root directory containing subagents. Defaults to "
+            "~/.lmspace/vscode-agents."
+        ),
+    )
+
+
+def add_autoscale_parser(subparsers: Any) -> None:
+    """Add the 'autoscale' subcommand parser."""
+    parser = subparsers.add_parser(
+        "autoscale",
+        help="Grow and shrink the subagent pool with demand",
+        description=(
+            "Provision and warm subagents when the claim queue or failed claims "
+            "grow, and close windows of subagents that stay idle past a cooldown."
+        ),
+    )
+    parser.add_argument(
+        "--min",
+        dest="min_windows",
+        type=int,
+        metavar="N",
+        default=0,
+        help="Minimum number of subagent windows to keep open (default: 0)",
+    )
+    parser.add_argument(
+        "--max",
+        dest="max_subagents",
+        type=int,
+        metavar="N",
+        default=8,
+        help="Maximum number of subagents to provision (default: 8)",
+    )
+    parser.add_argument(
+        "--target-idle",
+        type=int,
+        metavar="N",
+        default=1,
+        help="Number of free, warm subagents to keep ready (default: 1)",
+    )
+    parser.add_argument(
+        "--cooldown",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help="Seconds a subagent must stay idle before its window is closed (default: 300)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="Seconds between scaling decisions (default: 10)",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Make a single scaling decision and exit",
+    )
+    parser.add_argument(
+        "--template",
+        type=Path,
+        default=DEFAULT_TEMPLATE_DIR,
+        help="Path to the subagent template used for new subagents.",
+    )
+    parser.add_argument(
+        "--target-root",
+        type=Path,
+        default=None,
+        help=(
+            "Root directory containing subagents. Defaults to "
+            "~/.lmspace/vscode-agents."
+        ),
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Log scaling decisions without provisioning or closing windows",
+    )
+
+
+def add_reap_parser(subparsers: Any) -> None:
+    """Add the 'reap' subcommand parser."""
+    parser = subparsers.add_parser(
+        "reap",
+        help="Reclaim subagents whose lock outlived its owner",
+        description=(
+            "Release subagents whose lease has expired or whose waiting process "
+            "has exited, archiving any partial response first."
+        ),
+    )
+    parser.add_argument(
+        "--target-root",
+        type=Path,
+        default=None,
+        help=(
+            "Root directory containing subagents. Defaults to "
+            "~/.lmspace/vscode-agents."
+        ),
+    )
+    parser.add_argument(
+        "--lock-name",
+        default=DEFAULT_LOCK_NAME,
+        help=(
+            "File name that marks a subagent as locked. Defaults to "
+            f"{DEFAULT_LOCK_NAME}."
+        ),
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and reap every --interval seconds",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="Seconds between passes with --watch (default: 60)",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print one JSON object per reclaimed subagent",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show which subagents would be reclaimed without releasing them",
+    )
+
+
+def add_metrics_parser(subparsers: Any) -> None:
+    """Add the 'metrics' subcommand parser."""
+    parser = subparsers.add_parser(
+        "metrics",
+        help="Report pool utilization and dispatch latency metrics",
+        description=(
+            "Print subagent pool metrics in Prometheus text exposition format, "
+            "or serve them at /metrics over HTTP."
+        ),
+    )
+    parser.add_argument(
+        "--target-root",
+        type=Path,
+        default=None,
+        help=(
+            "Root directory containing subagents. Defaults to "
+            "~/.lmspace/vscode-agents."
+        ),
+    )
+    parser.add_argument(
+        "--lock-name",
+        default=DEFAULT_LOCK_NAME,
+        help=(
+            "File name that marks a subagent as locked. Defaults to "
+            f"{DEFAULT_LOCK_NAME}."
+        ),
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="[HOST:]PORT",
+        default=None,
+        help="Serve the metrics at http://HOST:PORT/metrics (HOST defaults to 127.0.0.1)",
+    )
+
+
+def add_history_parser(subparsers: Any) -> None:
+    """Add the 'history' subcommand parser."""
+    parser = subparsers.add_parser(
+        "history",
+        help="Show archived requests and responses",
+        description=(
+            "Print the archived response of a past request, or list archived "
+            "requests (newest first) when no request id is given."
+        ),
+    )
+    parser.add_argument(
+        "request_id",
+        nargs="?",
+        default=None,
+        help="Request id whose archived response to print",
+    )
+    parser.add_argument(
+        "--target-root",
+        type=Path,
+        default=None,
+        help=(
+            "Root directory containing subagents. Defaults to "
+            "~/.lmspace/vscode-agents."
+        ),
+    )
+    parser.add_argument(
+        "--subagent",
+        default=None,
+        help="Only list requests handled by this subagent",
+    )
+    parser.add_argument(
+        "--prompt-file",
+        type=Path,
+        default=None,
+        help="Only list requests dispatched with this prompt file",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="Maximum number of requests to list (default: 20)",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Output the listing, or the full archived request, as JSON",
+    )
 
 
 def handle_provision(args: argparse.Namespace) -> int:
     """Handle the 'provision' subcommand."""
+    from .agent_dispatch import get_subagent_root, warmup_subagents
+    from .provision import ProvisionReport, provision_subagents
+
+    target_root = args.target_root if args.target_root else get_subagent_root()
+    report = ProvisionReport()
     try:
         created, skipped_existing, skipped_locked = provision_subagents(
             template=args.template,
-            target_root=args.target_root,
+            target_root=target_root,
             subagents=args.subagents,
             lock_name=args.lock_name,
             force=args.force,
             dry_run=args.dry_run,
+            workers=args.workers,
+            copy_mode=args.copy_mode,
+            progress=_print_provision_progress,
+            report=report,
         )
     except ValueError as error:
         print(f"error: {error}", file=sys.stderr)
         return 1
+    except OSError as error:
+        print(f"error: provisioning failed: {error}", file=sys.stderr)
+        return 1
+
+    if report.copies:
+        print(f"info: {report.summary()}", file=sys.stderr)
 
     # Calculate total unlocked subagents
     total_unlocked = len(created) + len(skipped_existing)
@@ -263,9 +751,10 @@ def handle_provision(args: argparse.Namespace) -> int:
 
     if args.warmup:
         warmup_exit = warmup_subagents(
-            subagent_root=args.target_root,
+            subagent_root=target_root,
             subagents=args.subagents,
             dry_run=False,
+            wait_ready=True,
         )
         if warmup_exit != 0:
             return warmup_exit
@@ -275,45 +764,155 @@ def handle_provision(args: argparse.Namespace) -> int:
 
 def handle_chat(args: argparse.Namespace) -> int:
     """Handle the 'chat' subcommand."""
+    from .agent_dispatch import dispatch_agent
+
     return dispatch_agent(
         args.query,
         args.prompt_file,
         extra_attachments=args.attachment,
         dry_run=args.dry_run,
-        wait=args.wait,
+        wait=args.wait or args.stream,
+        use_daemon=not args.no_daemon,
+        queue=args.queue,
+        max_wait=args.max_wait,
+        stream=args.stream,
+        cache=args.cache,
+        cache_ttl=args.cache_ttl,
+        auto_imports=args.auto_imports,
+        bundle_attachments=args.bundle_attachments,
     )
 
 
+def handle_chat_batch(args: argparse.Namespace) -> int:
+    """Handle the 'chat-batch' subcommand."""
+    from .batch import dispatch_batch
+
+    return dispatch_batch(
+        args.jobs_file,
+        subagent_root=args.target_root,
+        max_concurrency=args.max_concurrency,
+        timeout=args.timeout,
+        dry_run=args.dry_run,
+    )
+
+
+def handle_autoscale(args: argparse.Namespace) -> int:
+    """Handle the 'autoscale' subcommand."""
+    from .agent_dispatch import get_subagent_root
+    from .autoscale import AutoscaleSettings, run_autoscaler
+
+    settings = AutoscaleSettings(
+        min_windows=args.min_windows,
+        max_subagents=args.max_subagents,
+        target_idle=args.target_idle,
+        cooldown=args.cooldown,
+        interval=args.interval,
+    )
+    return run_autoscaler(
+        subagent_root=args.target_root if args.target_root else get_subagent_root(),
+        settings=settings,
+        template=args.template,
+        once=args.once,
+        dry_run=args.dry_run,
+    )
+
+
+def handle_reconcile(args: argparse.Namespace) -> int:
+    """Handle the 'reconcile' subcommand."""
+    from .reconcile import run_reconcile
+
+    return run_reconcile(spec_path=args.spec, dry_run=args.dry_run, json_output=args.json)
+
+
+def handle_reap(args: argparse.Namespace) -> int:
+    """Handle the 'reap' subcommand."""
+    from .reaper import run_reaper
+
+    return run_reaper(
+        subagent_root=args.target_root,
+        lock_name=args.lock_name,
+        dry_run=args.dry_run,
+        watch=args.watch,
+        interval=args.interval,
+        json_output=args.json,
+    )
+
+
+def handle_metrics(args: argparse.Namespace) -> int:
+    """Handle the 'metrics' subcommand."""
+    from .metrics import run_metrics
+
+    return run_metrics(
+        subagent_root=args.target_root,
+        lock_name=args.lock_name,
+        serve=args.serve,
+    )
+
+
+def handle_history(args: argparse.Namespace) -> int:
+    """Handle the 'history' subcommand."""
+    from .agent_dispatch import get_subagent_root
+    from .history import run_history
+
+    return run_history(
+        subagent_root=args.target_root if args.target_root else get_subagent_root(),
+        request_id=args.request_id,
+        subagent=args.subagent,
+        prompt_file=args.prompt_file,
+        limit=args.limit,
+        json_output=args.json,
+    )
+
+
+def handle_serve(args: argparse.Namespace) -> int:
+    """Handle the 'serve' subcommand."""
+    from .daemon import serve_daemon
+
+    return serve_daemon(subagent_root=args.target_root)
+
+
 def handle_warmup(args: argparse.Namespace) -> int:
     """Handle the 'warmup' subcommand."""
+    from .agent_dispatch import get_subagent_root, warmup_subagents
+
     subagent_root = args.target_root if args.target_root else get_subagent_root()
     return warmup_subagents(
         subagent_root=subagent_root,
         subagents=args.subagents,
         dry_run=args.dry_run,
+        wait_ready=args.wait_ready,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        timeout=args.timeout,
     )
 
 
 def handle_list(args: argparse.Namespace) -> int:
     """Handle the 'list' subcommand."""
+    from .agent_dispatch import get_subagent_root, list_subagents
+
     subagent_root = args.target_root if args.target_root else get_subagent_root()
     return list_subagents(
         subagent_root=subagent_root,
         json_output=args.json,
+        rebuild_index=args.rebuild_index,
     )
 
 
 def handle_unlock(args: argparse.Namespace) -> int:
     """Handle the 'unlock' subcommand."""
+    from .agent_dispatch import get_subagent_root
     from .provision import unlock_subagents
     
     try:
         unlocked = unlock_subagents(
-            target_root=args.target_root,
+            target_root=args.target_root if args.target_root else get_subagent_root(),
             lock_name=args.lock_name,
             subagent_name=args.subagent,
             unlock_all=args.unlock_all,
             dry_run=args.dry_run,
+            rebuild_index=args.rebuild_index,
+            request_id=args.request_id,
         )
     except ValueError as error:
         print(f"error: {error}", file=sys.stderr)
@@ -333,3 +932,46 @@ def handle_unlock(args: argparse.Namespace) -> int:
         print("dry run complete; no changes were made")
     
     return 0
+
+
+def add_parsers(parser: argparse.ArgumentParser) -> None:
+    """Add the VS Code agent subcommands to the 'code' backend parser."""
+    code_subparsers = parser.add_subparsers(
+        dest="action",
+        help="VS Code agent actions",
+        required=True,
+    )
+    add_provision_parser(code_subparsers)
+    add_reconcile_parser(code_subparsers)
+    add_chat_parser(code_subparsers)
+    add_chat_batch_parser(code_subparsers)
+    add_warmup_parser(code_subparsers)
+    add_list_parser(code_subparsers)
+    add_unlock_parser(code_subparsers)
+    add_serve_parser(code_subparsers)
+    add_autoscale_parser(code_subparsers)
+    add_reap_parser(code_subparsers)
+    add_metrics_parser(code_subparsers)
+    add_history_parser(code_subparsers)
+
+
+def run(args: argparse.Namespace) -> int:
+    """Route a parsed 'code' command to its handler."""
+    handlers = {
+        "provision": handle_provision,
+        "reconcile": handle_reconcile,
+        "chat": handle_chat,
+        "chat-batch": handle_chat_batch,
+        "warmup": handle_warmup,
+        "list": handle_list,
+        "unlock": handle_unlock,
+        "serve": handle_serve,
+        "autoscale": handle_autoscale,
+        "reap": handle_reap,
+        "metrics": handle_metrics,
+        "history": handle_history,
+    }
+    handler = handlers.get(args.action)
+    if handler is None:
+        return 1
+    return handler(args)
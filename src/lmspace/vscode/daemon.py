@@ -0,0 +1,413 @@
+"""Resident pool daemon serving dispatch requests over a Unix socket.
+
+`lmspace code serve` keeps one process warm for a subagent root: imports,
+the file watcher thread and the VS Code launch lock are shared by every
+request, so a dispatch no longer pays interpreter startup or contends with
+other processes for window focus. `dispatch_agent` hands work to the daemon
+automatically whenever its socket accepts connections.
+
+Protocol: the client writes one JSON object per line and reads one JSON
+object per line in reply. Every reply has an `ok` field; failures carry
+`error` (and `code` where the client needs to tell errors apart).
+
+    {"op": "ping"}
+    {"op": "dispatch", "query": ..., "prompt_file": ..., "attachments": [...],
+     "queue": false, "max_wait": null, "coalesce": true}
+    {"op": "wait", "request_id": ..., "subagent_dir": ..., "response_file": ..., "timeout": null,
+     "owned": true}
+    {"op": "list"}
+    {"op": "unlock", "subagent": ..., "request_id": null}
+
+Requests on one connection are handled in order, so a client typically
+sends `dispatch` and then `wait` on the same connection. If the client
+disconnects during `wait`, the subagent is released as a sync-mode
+interrupt would. A dispatch that joined an identical request already in
+flight replies with `"owned": false`; waiting on it never releases the
+subagent, which belongs to the request that claimed it. If that request
+ends without a response, the wait fails with code `abandoned` and the
+client dispatches again with `"coalesce": false`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import sys
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from .agent_dispatch import (
+    LeaseHeartbeat,
+    _report_dispatch_started,
+    _report_dispatched,
+    _report_no_subagents,
+    get_subagent_root,
+    read_response_file,
+    release_subagent,
+    wait_for_response_file,
+)
+from .pool_state import STATE_DIR_NAME, open_pool_state
+from .tracing import set_attribute, span, trace, trace_file_for
+
+DAEMON_SOCKET_NAME = "daemon.sock"
+CONNECT_TIMEOUT = 0.5
+# Interval at which a `wait` checks whether its client is still connected
+WAIT_SLICE = 1.0
+
+
+def daemon_socket_path(subagent_root: Path) -> Path:
+    """Return the socket path of the daemon serving `subagent_root`."""
+    return subagent_root / STATE_DIR_NAME / DAEMON_SOCKET_NAME
+
+
+class DaemonClient:
+    """Connection to a running pool daemon."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+        self._reader = sock.makefile("r", encoding="utf-8")
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._reader.close()
+        self._sock.close()
+
+    def request(self, op: str, **params: Any) -> dict[str, Any]:
+        """Send one request and return the daemon's reply.
+
+        Raises ConnectionError if the daemon closed the connection.
+        """
+        self._sock.sendall((json.dumps({"op": op, **params}) + "\n").encode("utf-8"))
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("pool daemon closed the connection")
+        return json.loads(line)
+
+
+def connect_daemon(subagent_root: Path) -> Optional[DaemonClient]:
+    """Connect to the daemon serving `subagent_root`, if one is running.
+
+    Returns None when no daemon is listening or the platform has no Unix
+    sockets. Set LMSPACE_NO_DAEMON=1 to never connect.
+    """
+    if os.environ.get("LMSPACE_NO_DAEMON") or not hasattr(socket, "AF_UNIX"):
+        return None
+    socket_path = daemon_socket_path(subagent_root)
+    if not socket_path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return DaemonClient(sock)
+
+
+def dispatch_with_daemon(
+    client: DaemonClient,
+    user_query: str,
+    prompt_file: Path,
+    *,
+    attachment_paths: Sequence[str],
+    wait: bool,
+    queue: bool = False,
+    max_wait: Optional[float] = None,
+    coalesce: bool = True,
+) -> int:
+    """Run a `lmspace code chat` dispatch through the daemon.
+
+    Prints the same output as an in-process dispatch. With `coalesce`
+    False, the daemon does not join an identical request in flight.
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    reply = client.request(
+        "dispatch",
+        query=user_query,
+        prompt_file=str(prompt_file),
+        attachments=list(attachment_paths),
+        queue=queue,
+        max_wait=max_wait,
+        coalesce=coalesce,
+    )
+    if not reply["ok"]:
+        if reply.get("code") == "no_subagents":
+            _report_no_subagents()
+        elif reply.get("code") == "queue_timeout":
+            print(f"error: {reply['error']}", file=sys.stderr)
+        else:
+            print(json.dumps({"success": False, "error": reply["error"]}))
+        return 1
+
+    response_file_final = Path(reply["response_file"])
+    if reply.get("owned", True):
+        print(f"info: Acquired subagent: {reply['subagent_name']} (via pool daemon)", file=sys.stderr)
+    else:
+        print(
+            f"info: Joined identical in-flight request {reply['request_id']} "
+            f"on {reply['subagent_name']} (via pool daemon)",
+            file=sys.stderr,
+        )
+    _report_dispatch_started(reply["subagent_name"], response_file_final)
+
+    if not wait:
+        _report_dispatched(reply["subagent_name"], response_file_final, Path(reply["temp_file"]))
+        return 0
+
+    print(f"waiting for agent to finish: {response_file_final}", file=sys.stderr, flush=True)
+    try:
+        result = client.request(
+            "wait",
+            request_id=reply["request_id"],
+            subagent_dir=reply["subagent_dir"],
+            response_file=reply["response_file"],
+            owned=reply.get("owned", True),
+        )
+    except KeyboardInterrupt:
+        # Closing the connection makes the daemon release the subagent
+        print("\ninfo: interrupted while waiting for agent response.", file=sys.stderr)
+        return 1
+    if not result["ok"]:
+        if result.get("code") == "abandoned":
+            print(f"warning: {result['error']}; dispatching it here", file=sys.stderr)
+            return dispatch_with_daemon(
+                client,
+                user_query,
+                prompt_file,
+                attachment_paths=attachment_paths,
+                wait=wait,
+                queue=queue,
+                max_wait=max_wait,
+                coalesce=False,
+            )
+        print(f"error: failed to read agent response: {result['error']}", file=sys.stderr)
+        return 1
+    print(result["response"])
+    return 0
+
+
+class PoolDaemon:
+    """Serve pool requests for one subagent root over a Unix socket."""
+
+    def __init__(self, subagent_root: Path) -> None:
+        self.subagent_root = subagent_root
+        self.socket_path = daemon_socket_path(subagent_root)
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        reply = daemon.handle_request(json.loads(line), self.connection)
+                    except Exception as error:
+                        reply = {"ok": False, "error": str(error)}
+                    if reply is None:
+                        return
+                    self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_socket()
+        self._server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        self._server.daemon_threads = True
+
+    def _remove_stale_socket(self) -> None:
+        if not self.socket_path.exists():
+            return
+        client = connect_daemon(self.subagent_root)
+        if client is not None:
+            client.close()
+            raise RuntimeError(f"a pool daemon is already serving {self.subagent_root}")
+        self.socket_path.unlink()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stop serving (from another thread) and remove the socket."""
+        self._server.shutdown()
+        self.close()
+
+    def close(self) -> None:
+        self._server.server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+    def handle_request(
+        self, request: dict[str, Any], connection: socket.socket
+    ) -> Optional[dict[str, Any]]:
+        """Handle one request; returns None if the client has gone away."""
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "subagent_root": str(self.subagent_root)}
+        if op == "dispatch":
+            return self._dispatch(request)
+        if op == "wait":
+            return self._wait(request, connection)
+        if op == "list":
+            with open_pool_state(self.subagent_root) as store:
+                return {"ok": True, "subagents": store.list_subagents()}
+        if op == "unlock":
+            released = release_subagent(
+                self.subagent_root / request["subagent"],
+                request_id=request.get("request_id"),
+            )
+            return {"ok": True, "released": released}
+        return {"ok": False, "error": f"unknown op: {op!r}"}
+
+    def _dispatch(self, request: dict[str, Any]) -> dict[str, Any]:
+        from .async_dispatch import DispatchError, _start_dispatch
+
+        try:
+            started = _start_dispatch(
+                request["query"],
+                Path(request["prompt_file"]),
+                [Path(a) for a in request.get("attachments", [])],
+                self.subagent_root,
+                bool(request.get("queue")),
+                request.get("max_wait"),
+                via="daemon",
+                coalesce=bool(request.get("coalesce", True)),
+            )
+            request_id, subagent_dir, response_file_tmp, response_file_final, owned = started
+        except DispatchError as error:
+            message = str(error)
+            if message.startswith("No unlocked subagents"):
+                code = "no_subagents"
+            elif message.startswith("No subagent became available"):
+                code = "queue_timeout"
+            else:
+                code = "dispatch_failed"
+            return {"ok": False, "error": message, "code": code}
+        return {
+            "ok": True,
+            "request_id": request_id,
+            "subagent_name": subagent_dir.name,
+            "subagent_dir": str(subagent_dir),
+            "response_file": str(response_file_final),
+            "temp_file": str(response_file_tmp),
+            "owned": owned,
+        }
+
+    def _wait(self, request: dict[str, Any], connection: socket.socket) -> Optional[dict[str, Any]]:
+        # Spans of the dispatch's trace (same request id) for the half the daemon waits on
+        with trace(
+            "dispatch.wait",
+            request_id=request["request_id"],
+            trace_file=trace_file_for(self.subagent_root),
+            **{"lmspace.via": "daemon", "lmspace.owned": bool(request.get("owned", True))},
+        ):
+            reply = (
+                self._wait_owned(request, connection)
+                if request.get("owned", True)
+                else self._wait_shared(request, connection)
+            )
+            set_attribute("lmspace.outcome", "disconnected" if reply is None else reply.get("code", "ok"))
+            return reply
+
+    def _wait_owned(
+        self, request: dict[str, Any], connection: socket.socket
+    ) -> Optional[dict[str, Any]]:
+        subagent_dir = Path(request["subagent_dir"])
+        response_file = Path(request["response_file"])
+        timeout = request.get("timeout")
+        waited = 0.0
+        try:
+            with LeaseHeartbeat(subagent_dir, request["request_id"]), span("agent.answer"):
+                while not wait_for_response_file(response_file, timeout=WAIT_SLICE):
+                    waited += WAIT_SLICE
+                    if _client_disconnected(connection):
+                        return None
+                    if timeout is not None and waited >= timeout:
+                        return {"ok": False, "error": f"timed out after {timeout}s", "code": "timeout"}
+            with span("response.read"):
+                return {"ok": True, "response": read_response_file(response_file)}
+        finally:
+            release_subagent(subagent_dir, request_id=request["request_id"])
+
+    def _wait_shared(
+        self, request: dict[str, Any], connection: socket.socket
+    ) -> Optional[dict[str, Any]]:
+        with span("agent.answer"):
+            return self._poll_shared(request, connection, request.get("timeout"))
+
+    def _poll_shared(
+        self, request: dict[str, Any], connection: socket.socket, timeout: Optional[float]
+    ) -> Optional[dict[str, Any]]:
+        from .singleflight import leader_in_flight, shared_response, wait_for_shared_response
+
+        waited = 0.0
+        while True:
+            response = wait_for_shared_response(self.subagent_root, request, timeout=WAIT_SLICE)
+            if response is not None:
+                return {"ok": True, "response": response}
+            if not leader_in_flight(self.subagent_root, request):
+                response = shared_response(self.subagent_root, request)
+                if response is not None:
+                    return {"ok": True, "response": response}
+                return {
+                    "ok": False,
+                    "error": f"request {request['request_id']} ended without a response",
+                    "code": "abandoned",
+                }
+            waited += WAIT_SLICE
+            if _client_disconnected(connection):
+                return None
+            if timeout is not None and waited >= timeout:
+                return {"ok": False, "error": f"timed out after {timeout}s", "code": "timeout"}
+
+
+def _client_disconnected(connection: socket.socket) -> bool:
+    readable, _, _ = select.select([connection], [], [], 0)
+    if not readable:
+        return False
+    try:
+        return connection.recv(1, socket.MSG_PEEK) == b""
+    except OSError:
+        return True
+
+
+def serve_daemon(*, subagent_root: Optional[Path] = None) -> int:
+    """Run the pool daemon in the foreground until interrupted.
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print("error: the pool daemon requires Unix domain sockets", file=sys.stderr)
+        return 1
+    if subagent_root is None:
+        subagent_root = get_subagent_root()
+    if not subagent_root.exists():
+        print(f"error: Subagent root not found: {subagent_root}", file=sys.stderr)
+        return 1
+
+    try:
+        daemon = PoolDaemon(subagent_root)
+    except (OSError, RuntimeError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    # Treat SIGTERM like Ctrl-C so the socket is removed on shutdown
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"info: Pool daemon listening on {daemon.socket_path}", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\ninfo: Pool daemon stopped", file=sys.stderr)
+    finally:
+        daemon.close()
+    return 0
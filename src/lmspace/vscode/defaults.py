@@ -0,0 +1,21 @@
+"""Defaults shared by the `lmspace code` parsers and the modules they drive.
+
+The parsers are built for every `lmspace code` command, so their defaults
+live here, free of imports, rather than in the modules implementing the
+commands, which load SQLite, tracing and the launcher.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+DEFAULT_LOCK_NAME = "subagent.lock"
+DEFAULT_TEMPLATE_DIR = Path(__file__).resolve().parent / "subagent_template"
+DEFAULT_PROVISION_WORKERS = 8
+COPY_MODES = ("auto", "copy", "reflink", "hardlink")
+DEFAULT_COPY_MODE = "auto"
+BUNDLE_MODES = ("auto", "always", "never")
+DEFAULT_WARMUP_CONCURRENCY = 4
+DEFAULT_WARMUP_RETRIES = 1
+DEFAULT_WARMUP_TIMEOUT = 60.0
+DEFAULT_MAX_CONCURRENCY = 4
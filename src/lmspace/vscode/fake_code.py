@@ -0,0 +1,293 @@
+"""Stand-in for the VS Code `code` CLI, for tests and benchmarks.
+
+`install_fake_code(directory)` writes an executable `code` script that runs
+this module; point the launcher at it (LMSPACE_CODE_EXECUTABLE, or
+`use_launcher(CodeLauncher(path))`) and dispatches run end to end without
+VS Code. It understands the invocations lmspace makes:
+
+- `code <workspace>` opens a window for the workspace (a background process
+  whose PID is reported by `--status`) or focuses it if already open;
+- `code --status` lists the open windows like the real CLI;
+- `code -r chat -m <mode> [-a <file>]... <prompt>` hands a chat to the
+  focused window and exits, like the real CLI. The window then runs it as
+  the real agent is instructed to: the wakeup chat writes `.alive` once the
+  window has started, and a dispatch chat writes its answer to the
+  request's `*_res.tmp.md`, moves it to `*_res.md` and runs the request's
+  `lmspace code unlock` command. Like a VS Code terminal, that command does
+  not see the dispatcher's LMSPACE_SUBAGENT_ROOT.
+
+Latencies come from the environment, so one setting covers every spawned
+process:
+
+- LMSPACE_FAKE_CODE_STATE: directory holding window state (required)
+- LMSPACE_FAKE_CODE_STARTUP: seconds a new window takes to start (default 0.5)
+- LMSPACE_FAKE_CODE_LATENCY: seconds the agent takes to answer (default 1.0)
+- LMSPACE_FAKE_CODE_JITTER: +/- fraction applied to both (default 0)
+
+Every chat is appended to `chats.jsonl` in the state directory with the
+window it landed in, so callers can spot chats sent to the wrong window.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+STATE_ENV = "LMSPACE_FAKE_CODE_STATE"
+STARTUP_ENV = "LMSPACE_FAKE_CODE_STARTUP"
+LATENCY_ENV = "LMSPACE_FAKE_CODE_LATENCY"
+JITTER_ENV = "LMSPACE_FAKE_CODE_JITTER"
+# Windows exit on their own after this long so a crashed run cannot leak them
+WINDOW_LIFETIME = 3600.0
+_MODULE = "lmspace.vscode.fake_code"
+_PACKAGE_ROOT = Path(__file__).resolve().parents[2]
+
+_MOVE_LINE = re.compile(r"Move-Item -LiteralPath '(?P<tmp>.+?)' -Destination '(?P<final>.+?)'")
+_UNLOCK_LINE = re.compile(r"^lmspace (?P<args>code unlock .*)$", re.MULTILINE)
+# PowerShell words: single-quoted strings (quotes doubled inside) or bare words
+_POWERSHELL_WORD = re.compile(r"'((?:[^']|'')*)'|(\S+)")
+# The dispatcher's pool root, which the agent's terminal does not inherit
+_SUBAGENT_ROOT_ENV = "LMSPACE_SUBAGENT_ROOT"
+
+
+def _delay(env: str, default: float) -> float:
+    base = float(os.environ.get(env, default))
+    jitter = float(os.environ.get(JITTER_ENV, 0.0))
+    return max(0.0, base * (1 + random.uniform(-jitter, jitter)))
+
+
+def _state_dir() -> Path:
+    state = os.environ.get(STATE_ENV)
+    if not state:
+        raise SystemExit(f"fake code: {STATE_ENV} is not set")
+    path = Path(state)
+    (path / "windows").mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_window(state: Path, name: str) -> Optional[dict[str, Any]]:
+    try:
+        window = json.loads((state / "windows" / f"{name}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return window if _pid_alive(window["pid"]) else None
+
+
+def _open_windows(state: Path) -> list[dict[str, Any]]:
+    windows = []
+    for path in sorted((state / "windows").glob("*.json")):
+        window = _read_window(state, path.stem)
+        if window is not None:
+            windows.append(window)
+    return windows
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # Concurrent invocations read these files, so never expose a partial write
+    staged = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    staged.write_text(text, encoding="utf-8")
+    os.replace(staged, path)
+
+
+def _package_env() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(_PACKAGE_ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def _start_background(*args: str) -> subprocess.Popen:
+    env = _package_env()
+    return subprocess.Popen(
+        [sys.executable, "-m", _MODULE, *args],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _open_workspace(state: Path, workspace: Path) -> None:
+    name = workspace.name.removesuffix(".code-workspace")
+    if _read_window(state, name) is None:
+        window = _start_background("--fake-window")
+        _write_atomic(
+            state / "windows" / f"{name}.json",
+            json.dumps({
+                "name": name,
+                "pid": window.pid,
+                "folder": str(workspace.resolve().parent),
+                "ready_at": time.time() + _delay(STARTUP_ENV, 0.5),
+            }),
+        )
+    _write_atomic(state / "focused", name)
+
+
+def _print_status(state: Path) -> None:
+    print("Version:          Code (lmspace fake)")
+    print("CPU %\tMem MB\t   PID\tProcess")
+    for index, window in enumerate(_open_windows(state), 1):
+        print(
+            f"    0\t    98\t{window['pid']:>6}\twindow [{index}] "
+            f"({window['name']} (Workspace) - Visual Studio Code)"
+        )
+
+
+def _run_chat(state: Path, mode: str, attachments: list[str], prompt: str) -> None:
+    focused = (state / "focused").read_text(encoding="utf-8").strip() if (state / "focused").exists() else None
+    window = _read_window(state, focused) if focused else None
+    requests = [Path(a) for a in attachments if a.endswith("_req.md")]
+    with (state / "chats.jsonl").open("a", encoding="utf-8") as log:
+        log.write(json.dumps({
+            "mode": mode,
+            "window": focused,
+            "subagent": requests[-1].parent.parent.name if requests else None,
+            "at": time.time(),
+        }) + "\n")
+    if window is None:
+        return
+    # The chat now belongs to this window; it is answered after the CLI exits
+    request = str(requests[-1]) if requests else ""
+    _start_background("--fake-agent", mode, window["folder"], str(window["ready_at"]), request)
+
+
+def _answer_chat(mode: str, folder: str, ready_at: str, request: str) -> None:
+    time.sleep(max(0.0, float(ready_at) - time.time()))
+
+    if mode == "wakeup":
+        (Path(folder) / ".alive").write_text("ok", encoding="utf-8")
+        return
+    if not request:
+        return
+
+    request_file = Path(request)
+    instructions = request_file.read_text(encoding="utf-8")
+    move = _MOVE_LINE.search(instructions)
+    if move is None:
+        return
+    time.sleep(_delay(LATENCY_ENV, 1.0))
+    Path(move["tmp"]).write_text(f"fake answer to {mode}\n", encoding="utf-8")
+    os.replace(move["tmp"], move["final"])
+
+    unlock = _UNLOCK_LINE.search(instructions)
+    if unlock is not None:
+        _run_lmspace(unlock["args"])
+
+
+def _run_lmspace(command: str) -> None:
+    """Run an `lmspace` command line from the agent's instructions."""
+    args = [
+        bare if bare is not None else quoted.replace("''", "'")
+        for quoted, bare in (match.groups() for match in _POWERSHELL_WORD.finditer(command))
+    ]
+    env = _package_env()
+    env.pop(_SUBAGENT_ROOT_ENV, None)
+    subprocess.run(
+        [sys.executable, "-c", "import sys; from lmspace import main; sys.exit(main())", *args],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _run_window() -> None:
+    # A window only needs to exist: its PID is what `--status` reports
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    time.sleep(WINDOW_LIFETIME)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Handle one `code` invocation."""
+    args = list(sys.argv[1:] if argv is None else argv)
+    if args == ["--fake-window"]:
+        _run_window()
+        return 0
+    if args[:1] == ["--fake-agent"] and len(args) == 5:
+        _answer_chat(*args[1:])
+        return 0
+
+    state = _state_dir()
+    if args == ["--status"]:
+        _print_status(state)
+        return 0
+
+    if "-r" in args:
+        args.remove("-r")
+    if args[:1] == ["chat"]:
+        mode, attachments, prompt = "", [], ""
+        rest = iter(args[1:])
+        for arg in rest:
+            if arg == "-m":
+                mode = next(rest)
+            elif arg == "-a":
+                attachments.append(next(rest))
+            else:
+                prompt = arg
+        _run_chat(state, mode, attachments, prompt)
+        return 0
+
+    if len(args) == 1:
+        _open_workspace(state, Path(args[0]))
+        return 0
+
+    print(f"fake code: unsupported arguments: {args}", file=sys.stderr)
+    return 2
+
+
+def install_fake_code(directory: Path) -> Path:
+    """Write an executable `code` stand-in into `directory` and return its path."""
+    directory.mkdir(parents=True, exist_ok=True)
+    if os.name == "nt":
+        script = directory / "code.cmd"
+        script.write_text(
+            f'@set "PYTHONPATH={_PACKAGE_ROOT};%PYTHONPATH%"\r\n'
+            f'@"{sys.executable}" -m {_MODULE} %*\r\n',
+            encoding="utf-8",
+        )
+        return script
+    script = directory / "code"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"sys.path.insert(0, {str(_PACKAGE_ROOT)!r})\n"
+        f"from {_MODULE} import main\n"
+        "sys.exit(main())\n",
+        encoding="utf-8",
+    )
+    script.chmod(0o755)
+    return script
+
+
+def close_fake_windows(state: Path) -> int:
+    """Terminate every window process started under `state`; returns how many."""
+    closed = 0
+    for window in _open_windows(state):
+        try:
+            os.kill(window["pid"], signal.SIGTERM)
+            closed += 1
+        except ProcessLookupError:
+            pass
+    return closed
+
+
+if __name__ == "__main__":
+    sys.exit(main())
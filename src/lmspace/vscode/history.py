@@ -0,0 +1,276 @@
+"""Compressed archive of past requests and responses.
+
+Claiming a subagent clears its `messages/` directory. Before the files are
+removed, they are archived as one record per request: a JSON document
+holding every message file, gzip-compressed and appended to the pool's
+current segment file in `.lmspace-pool/history/`. Segments are append-only
+and roll over at SEGMENT_MAX_BYTES.
+
+Every record is indexed in the pool state store by request id, subagent,
+prompt file and creation time, along with its segment and byte range, so
+looking up a past request is one indexed query and one read.
+
+Retention is by size: once the segments together exceed the limit
+(LMSPACE_HISTORY_MAX_BYTES, default 256 MiB), the oldest segments are
+deleted with their index entries. The request id and prompt file come from
+the `request.json` that dispatch writes into `messages/`; for older runs
+the request id is taken from `req.md` when it can be found there.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from .pool_state import STATE_DIR_NAME, PoolStateStore, open_pool_state
+
+HISTORY_DIR_NAME = "history"
+REQUEST_INFO_NAME = "request.json"
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_HISTORY_MAX_BYTES = 256 * 1024 * 1024
+HISTORY_MAX_BYTES_ENV = "LMSPACE_HISTORY_MAX_BYTES"
+
+_REQUEST_ID_COMMENT = re.compile(r"<!-- lmspace-request-id: (\w+) -->")
+_REQUEST_ID_UNLOCK = re.compile(r"lmspace code unlock --subagent \S+ --request-id (\w+)")
+
+
+def history_dir(subagent_root: Path) -> Path:
+    """Return the directory holding the pool's archive segments."""
+    return subagent_root / STATE_DIR_NAME / HISTORY_DIR_NAME
+
+
+def _segment_path(subagent_root: Path, segment: int) -> Path:
+    return history_dir(subagent_root) / f"segment-{segment:06d}.gz"
+
+
+def _segment_numbers(subagent_root: Path) -> list[int]:
+    paths = history_dir(subagent_root).glob("segment-*.gz")
+    return sorted(int(path.name[len("segment-"):-len(".gz")]) for path in paths)
+
+
+def _max_bytes() -> int:
+    try:
+        return int(os.environ.get(HISTORY_MAX_BYTES_ENV, DEFAULT_HISTORY_MAX_BYTES))
+    except ValueError:
+        return DEFAULT_HISTORY_MAX_BYTES
+
+
+def write_request_info(
+    messages_dir: Path,
+    *,
+    request_id: str,
+    prompt_file: Path,
+) -> None:
+    """Record which request the files in `messages_dir` belong to."""
+    info = {
+        "request_id": request_id,
+        "prompt_file": str(prompt_file),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    (messages_dir / REQUEST_INFO_NAME).write_text(json.dumps(info), encoding="utf-8")
+
+
+def _request_info(files: dict[str, str], messages: list[Path]) -> dict[str, Any]:
+    try:
+        info = json.loads(files.pop(REQUEST_INFO_NAME))
+    except (KeyError, ValueError):
+        info = {}
+    if not isinstance(info, dict):
+        info = {}
+    if not info.get("request_id"):
+        for name, text in files.items():
+            if name.endswith("_req.md"):
+                match = _REQUEST_ID_COMMENT.search(text) or _REQUEST_ID_UNLOCK.search(text)
+                if match:
+                    info["request_id"] = match.group(1)
+                    break
+    if not info.get("created_at"):
+        oldest = min(path.stat().st_mtime for path in messages)
+        info["created_at"] = datetime.fromtimestamp(oldest, timezone.utc).isoformat()
+    return info
+
+
+def archive_messages(subagent_dir: Path) -> Optional[str]:
+    """Archive the files in a subagent's `messages/` directory.
+
+    The files are left in place; the caller removes them. Returns the
+    archived request id, or None if there was nothing to archive.
+    """
+    messages_dir = subagent_dir / "messages"
+    if not messages_dir.is_dir():
+        return None
+    messages = sorted(path for path in messages_dir.iterdir() if path.is_file())
+    if not messages:
+        return None
+
+    files = {path.name: path.read_text(encoding="utf-8", errors="replace") for path in messages}
+    info = _request_info(files, messages)
+    if not files:
+        return None
+    # Runs that predate request ids are keyed by subagent and time
+    request_id = info.get("request_id") or f"{subagent_dir.name}-{info['created_at']}"
+    record = {
+        "request_id": request_id,
+        "subagent": subagent_dir.name,
+        "prompt_file": info.get("prompt_file"),
+        "created_at": info["created_at"],
+        "archived_at": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+    }
+    payload = gzip.compress(json.dumps(record).encode("utf-8"), compresslevel=6)
+
+    with open_pool_state(subagent_dir.parent) as store:
+        _append(store, record, payload)
+    return request_id
+
+
+def _append(store: PoolStateStore, record: dict[str, Any], payload: bytes) -> None:
+    root = store.subagent_root
+    history_dir(root).mkdir(parents=True, exist_ok=True)
+    # The write transaction serializes appends from every process
+    with store.transaction() as conn:
+        segment = max(_segment_numbers(root), default=1)
+        path = _segment_path(root, segment)
+        if path.exists() and path.stat().st_size + len(payload) > SEGMENT_MAX_BYTES:
+            segment += 1
+            path = _segment_path(root, segment)
+        with path.open("ab") as handle:
+            position = handle.seek(0, os.SEEK_END)
+            handle.write(payload)
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO history
+                (request_id, subagent, prompt_file, created_at, archived_at, segment, position, length)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record["request_id"],
+                record["subagent"],
+                record["prompt_file"],
+                record["created_at"],
+                record["archived_at"],
+                segment,
+                position,
+                len(payload),
+            ),
+        )
+        _enforce_retention(store, conn, current=segment)
+
+
+def _enforce_retention(store: PoolStateStore, conn: sqlite3.Connection, *, current: int) -> None:
+    limit = _max_bytes()
+    root = store.subagent_root
+    segments = [(segment, _segment_path(root, segment)) for segment in _segment_numbers(root)]
+    total = sum(path.stat().st_size for _, path in segments)
+    for segment, path in segments:
+        if total <= limit or segment == current:
+            break
+        total -= path.stat().st_size
+        conn.execute("DELETE FROM history WHERE segment = ?", (segment,))
+        path.unlink()
+
+
+def get_record(subagent_root: Path, request_id: str) -> Optional[dict[str, Any]]:
+    """Return an archived request with its files, or None if it is not archived."""
+    with open_pool_state(subagent_root) as store:
+        rows = store.query(
+            "SELECT segment, position, length FROM history WHERE request_id = ?", (request_id,)
+        )
+    if not rows:
+        return None
+    row = rows[0]
+    try:
+        with _segment_path(subagent_root, row["segment"]).open("rb") as handle:
+            handle.seek(row["position"])
+            payload = handle.read(row["length"])
+    except FileNotFoundError:
+        # Removed by retention since the query
+        return None
+    return json.loads(gzip.decompress(payload))
+
+
+def list_records(
+    subagent_root: Path,
+    *,
+    subagent: Optional[str] = None,
+    prompt_file: Optional[str] = None,
+    limit: int = 20,
+) -> list[dict[str, Any]]:
+    """Return index entries for archived requests, newest first."""
+    clauses, params = [], []
+    if subagent is not None:
+        clauses.append("subagent = ?")
+        params.append(subagent)
+    if prompt_file is not None:
+        clauses.append("prompt_file = ?")
+        params.append(prompt_file)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with open_pool_state(subagent_root) as store:
+        rows = store.query(
+            f"SELECT request_id, subagent, prompt_file, created_at, archived_at FROM history "
+            f"{where} ORDER BY created_at DESC LIMIT ?",
+            (*params, limit),
+        )
+    return [dict(row) for row in rows]
+
+
+def response_text(record: dict[str, Any]) -> Optional[str]:
+    """Return the final response of an archived request, if it has one."""
+    responses = sorted(
+        name for name in record["files"] if name.endswith("_res.md") and not name.endswith(".tmp.md")
+    )
+    return record["files"][responses[-1]] if responses else None
+
+
+def run_history(
+    *,
+    subagent_root: Path,
+    request_id: Optional[str] = None,
+    subagent: Optional[str] = None,
+    prompt_file: Optional[Path] = None,
+    limit: int = 20,
+    json_output: bool = False,
+) -> int:
+    """Print one archived response, or list archived requests.
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    if not subagent_root.exists():
+        print(f"error: Subagent root not found: {subagent_root}", file=sys.stderr)
+        return 1
+
+    if request_id is not None:
+        record = get_record(subagent_root, request_id)
+        if record is None:
+            print(f"error: No archived request with id {request_id}", file=sys.stderr)
+            return 1
+        if json_output:
+            print(json.dumps(record))
+            return 0
+        response = response_text(record)
+        if response is None:
+            print(f"error: Request {request_id} has no final response", file=sys.stderr)
+            return 1
+        print(response)
+        return 0
+
+    prompt = str(prompt_file.expanduser().resolve()) if prompt_file is not None else None
+    records = list_records(subagent_root, subagent=subagent, prompt_file=prompt, limit=limit)
+    if json_output:
+        print(json.dumps(records))
+        return 0
+    if not records:
+        print("no archived requests found")
+        return 0
+    for entry in records:
+        prompt_name = Path(entry["prompt_file"]).name if entry["prompt_file"] else "-"
+        print(f"{entry['request_id']}  {entry['created_at']}  {entry['subagent']}  {prompt_name}")
+    return 0
@@ -0,0 +1,149 @@
+"""Resolve the import graph of prompt files.
+
+Dispatch copies a prompt file into the subagent as a chat mode, so the
+files it imports must be attached explicitly. `resolve_imports` walks the
+imports of a prompt file transitively, the way `import-parser.prompt.md`
+asks an agent to, and returns the closure as absolute paths.
+
+Two forms are recognised:
+
+- VS Code file references: `#file:context.md`, `#file:"a b.md"`
+- SudoLang imports: `import "x.md"`, `import * from "x.md"`,
+  `import { a, b } from "x.md"` (and `from #file:x.md`)
+
+Paths are relative to the importing file. Only imports that name existing
+files are followed, only Markdown files are parsed for further imports,
+and each file is visited once, so cycles terminate.
+
+Parsed imports are cached per file, keyed by path and validated by mtime,
+size and content hash: an unchanged mtime skips reading the file, and a
+touched file whose content hash is unchanged is not re-parsed. The cache
+lives in the pool state store when a subagent root is given, so it
+survives across `lmspace code chat` runs; otherwise it is per process.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Optional
+
+from .pool_state import PoolStateStore, open_pool_state
+
+PARSED_SUFFIXES = (".md",)
+
+_FILE_REFERENCE = re.compile(r"""#file:(?:"([^"]+)"|'([^']+)'|`([^`]+)`|([^\s"'`()\[\]<>,;]+))""")
+_SUDOLANG_IMPORT = re.compile(
+    r"""^\s*import\s+(?:(?:\{[^}]*\}|\*(?:\s+as\s+\w+)?|\w+)\s+from\s+)?["']([^"']+)["']""",
+    re.MULTILINE,
+)
+
+# Parsed imports by path: (mtime_ns, size, sha256, targets)
+_PROCESS_CACHE: dict[str, tuple[int, int, str, list[str]]] = {}
+
+
+def parse_imports(text: str) -> list[str]:
+    """Return the import targets in `text` in order of appearance, without duplicates."""
+    found: list[tuple[int, str]] = []
+    for match in _FILE_REFERENCE.finditer(text):
+        target = next(group for group in match.groups() if group is not None)
+        if match.group(4) is not None:
+            # An unquoted reference can end a sentence
+            target = target.rstrip(".:")
+        found.append((match.start(), target))
+    for match in _SUDOLANG_IMPORT.finditer(text):
+        found.append((match.start(1), match.group(1)))
+    targets: list[str] = []
+    for _, target in sorted(found):
+        if target and "://" not in target and target not in targets:
+            targets.append(target)
+    return targets
+
+
+class _ImportCache:
+    """Parsed imports of files, validated by mtime, size and content hash."""
+
+    def __init__(self, store: Optional[PoolStateStore]) -> None:
+        self.store = store
+
+    def _load(self, key: str) -> Optional[tuple[int, int, str, list[str]]]:
+        if self.store is None:
+            return _PROCESS_CACHE.get(key)
+        rows = self.store.query(
+            "SELECT mtime_ns, size, sha256, imports FROM prompt_imports WHERE path = ?", (key,)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return row["mtime_ns"], row["size"], row["sha256"], json.loads(row["imports"])
+
+    def _save(self, key: str, entry: tuple[int, int, str, list[str]]) -> None:
+        if self.store is None:
+            _PROCESS_CACHE[key] = entry
+            return
+        mtime_ns, size, digest, targets = entry
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prompt_imports (path, mtime_ns, size, sha256, imports) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, mtime_ns, size, digest, json.dumps(targets)),
+            )
+
+    def targets(self, path: Path) -> list[str]:
+        key = str(path)
+        stat = path.stat()
+        cached = self._load(key)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[3]
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if cached is not None and cached[2] == digest:
+            targets = cached[3]
+        else:
+            targets = parse_imports(data.decode("utf-8", errors="replace"))
+        self._save(key, (stat.st_mtime_ns, stat.st_size, digest, targets))
+        return targets
+
+
+def _resolve_target(importer: Path, target: str) -> Optional[Path]:
+    path = Path(target).expanduser()
+    if not path.is_absolute():
+        path = importer.parent / path
+    path = path.resolve()
+    return path if path.is_file() else None
+
+
+def resolve_imports(prompt_file: Path, *, subagent_root: Optional[Path] = None) -> list[Path]:
+    """Return every file `prompt_file` imports, directly or transitively.
+
+    Files are returned once each, as absolute paths, in depth-first order of
+    first appearance. The prompt file itself is never included.
+    """
+    root = prompt_file.expanduser().resolve()
+    if subagent_root is not None and subagent_root.exists():
+        with open_pool_state(subagent_root) as store:
+            return _walk(root, _ImportCache(store))
+    return _walk(root, _ImportCache(None))
+
+
+def _walk(root: Path, cache: _ImportCache) -> list[Path]:
+    visited = {root}
+    closure: list[Path] = []
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        if current != root:
+            closure.append(current)
+        if current.suffix.lower() not in PARSED_SUFFIXES:
+            continue
+        children = []
+        for target in cache.targets(current):
+            child = _resolve_target(current, target)
+            if child is not None and child not in visited:
+                visited.add(child)
+                children.append(child)
+        # Reversed so the first import is visited first
+        stack.extend(reversed(children))
+    return closure
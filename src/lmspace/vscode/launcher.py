@@ -0,0 +1,195 @@
+"""Run the VS Code command line without a shell.
+
+Every `code` invocation goes through the active CodeLauncher, which passes
+an argv list straight to the executable: no shell is spawned and paths need
+no quoting.
+
+On Windows the `code` found on PATH is `code.cmd`, a batch file that
+cmd.exe would run, with its 8191-character command line limit and its own
+quoting rules. The launcher reads the batch file instead and runs what it
+would: the Code executable with the bundled `cli.js` under
+ELECTRON_RUN_AS_NODE. If the batch file does not have the expected layout
+it is run through cmd.exe after all; then every argument is quoted for
+cmd.exe, arguments it would expand (`%`, `"`, line breaks) are rejected,
+and a command line over the limit fails with E2BIG instead of being cut.
+
+`code -r chat` goes to whichever window has focus, so focusing a window and
+sending it a chat wait for each `code` process to exit: the CLI exits once
+the running VS Code instance has taken the request, so the next command
+cannot overtake it.
+
+The executable is resolved once per launcher, from LMSPACE_CODE_EXECUTABLE
+or the `code` found on PATH. Tests and tools can install a different
+launcher with `set_launcher` (or the `use_launcher` context manager), e.g.
+one that answers chats in-process instead of starting VS Code.
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+import re
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Union
+
+CODE_EXECUTABLE_ENV = "LMSPACE_CODE_EXECUTABLE"
+# Seconds to wait for a `code` invocation that hands a request to VS Code
+CLI_TIMEOUT = 30.0
+# Longest command line cmd.exe accepts
+CMD_MAX_LENGTH = 8191
+# code.cmd runs `"%~dp0..\Code.exe" "%~dp0..\resources\app\out\cli.js" [options] %*`
+# code.cmd runs `"%~dp0..\\Code.exe" "%~dp0..\\resources\\app\\out\\cli.js" [options] %*`
+_BATCH_LAUNCH = re.compile(
+    r'^"%~dp0\.\.\\([^"%]+\.exe)"\s+"%~dp0\.\.\\([^"%]+cli\.js)"([^%\r\n]*)%\*',
+    re.IGNORECASE | re.MULTILINE,
+)
+_CMD_EXPANDED = re.compile(r'[%"\r\n]')
+
+
+def resolve_batch_launcher(batch_file: Path) -> Optional[list[str]]:
+    """Return the argv prefix `code.cmd` runs, or None if it cannot be found.
+
+    The prefix is the Code executable, its `cli.js` and any options the
+    batch file adds, to be run with ELECTRON_RUN_AS_NODE=1.
+    """
+    try:
+        text = batch_file.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    match = _BATCH_LAUNCH.search(text)
+    if match is None:
+        return None
+    install_dir = batch_file.resolve().parent.parent
+    paths = [install_dir / Path(*match.group(group).split("\\")) for group in (1, 2)]
+    if not all(path.is_file() for path in paths):
+        return None
+    return [str(path) for path in paths] + match.group(3).split()
+
+
+def cmd_command_line(argv: Sequence[str]) -> str:
+    """Quote `argv` for cmd.exe, which runs batch files.
+
+    Raises OSError (EINVAL) for arguments cmd.exe would expand even when
+    quoted, and (E2BIG) if the line exceeds cmd.exe's limit.
+    """
+    for arg in argv:
+        if _CMD_EXPANDED.search(arg):
+            raise OSError(errno.EINVAL, f"argument cannot be passed through cmd.exe: {arg!r}")
+    line = " ".join(f'"{arg}"' for arg in argv)
+    if len(line) > CMD_MAX_LENGTH:
+        raise OSError(errno.E2BIG, f"command line of {len(line)} characters exceeds cmd.exe's limit")
+    return line
+
+
+class CodeLauncher:
+    """Invoke the VS Code CLI with argv lists."""
+
+    def __init__(self, executable: Optional[str] = None) -> None:
+        self._executable = executable
+        self._prefix: Optional[list[str]] = None
+        self._env: Optional[dict[str, str]] = None
+
+    @property
+    def executable(self) -> str:
+        """Path of the `code` executable, resolved on first use."""
+        if self._executable is None:
+            configured = os.environ.get(CODE_EXECUTABLE_ENV)
+            # Keep the bare name if it is not on PATH so the error names it
+            self._executable = configured or shutil.which("code") or "code"
+        return self._executable
+
+    def _command(self, args: Sequence[str]) -> Union[list[str], str]:
+        """Return what to run for `code args`: an argv list, or a cmd.exe line."""
+        if self._prefix is None:
+            executable = self.executable
+            self._prefix = [executable]
+            if executable.lower().endswith((".cmd", ".bat")):
+                resolved = resolve_batch_launcher(Path(executable))
+                if resolved is not None:
+                    self._prefix = resolved
+                    self._env = {**os.environ, "ELECTRON_RUN_AS_NODE": "1"}
+                    self._env.pop("VSCODE_DEV", None)
+        argv = [*self._prefix, *args]
+        if self._prefix[0].lower().endswith((".cmd", ".bat")):
+            return cmd_command_line(argv)
+        return argv
+
+    def call(self, args: Sequence[str], *, timeout: float = CLI_TIMEOUT) -> None:
+        """Run `code` with the given arguments and wait for it to exit.
+
+        Raises CalledProcessError if it fails, TimeoutExpired if it does not
+        exit within `timeout` seconds, and OSError if it cannot be started.
+        """
+        subprocess.run(
+            self._command(args),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=self._env,
+            timeout=timeout,
+            check=True,
+        )
+
+    def run(self, args: Sequence[str], *, timeout: float) -> str:
+        """Run `code` to completion and return its standard output."""
+        result = subprocess.run(
+            self._command(args),
+            capture_output=True,
+            text=True,
+            env=self._env,
+            timeout=timeout,
+        )
+        return result.stdout
+
+    def open_workspace(self, workspace: Path) -> None:
+        """Open (or focus) a workspace window, returning once VS Code has done so."""
+        self.call([str(workspace)])
+
+    def chat(
+        self,
+        mode: str,
+        prompt: str,
+        *,
+        attachments: Sequence[str] = (),
+    ) -> None:
+        """Start a chat in the focused window, returning once VS Code has received it."""
+        args = ["-r", "chat", "-m", mode]
+        for attachment in attachments:
+            args += ["-a", str(attachment)]
+        args.append(prompt)
+        self.call(args)
+
+    def status(self, *, timeout: float) -> str:
+        """Return the output of `code --status`."""
+        return self.run(["--status"], timeout=timeout)
+
+
+_launcher: Optional[CodeLauncher] = None
+
+
+def get_launcher() -> CodeLauncher:
+    """Return the launcher used for every `code` invocation."""
+    global _launcher
+    if _launcher is None:
+        _launcher = CodeLauncher()
+    return _launcher
+
+
+def set_launcher(launcher: Optional[CodeLauncher]) -> None:
+    """Replace the active launcher; None restores the default on next use."""
+    global _launcher
+    _launcher = launcher
+
+
+@contextmanager
+def use_launcher(launcher: CodeLauncher) -> Iterator[CodeLauncher]:
+    """Temporarily install a launcher."""
+    previous = _launcher
+    set_launcher(launcher)
+    try:
+        yield launcher
+    finally:
+        set_launcher(previous)
@@ -0,0 +1,258 @@
+"""End-to-end load benchmark for dispatches, driven by the fake `code` CLI.
+
+    python -m lmspace.vscode.loadtest --dispatches 50 --concurrency 8 --subagents 4
+
+A throwaway pool is provisioned in a temporary directory and every `code`
+invocation goes to the stand-in from fake_code.py, so the run exercises the
+real claim, queue, window and response paths without VS Code. Each dispatch
+is a sync `dispatch_agent` call (wait=True, queue=True) made in its own
+thread; the daemon is bypassed so the numbers reflect this process only.
+
+The report covers throughput, p50/p95/p99/max dispatch latency, how often a
+claim lost its lock file to a concurrent claimer (lock collisions), claims
+that found the pool exhausted, and chats that landed in the wrong window.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from .agent_dispatch import SUBAGENT_ROOT_ENV, dispatch_agent
+from .fake_code import (
+    JITTER_ENV,
+    LATENCY_ENV,
+    STARTUP_ENV,
+    STATE_ENV,
+    close_fake_windows,
+    install_fake_code,
+)
+from .launcher import CodeLauncher, use_launcher
+from .pool_state import open_pool_state
+from .provision import DEFAULT_LOCK_NAME, DEFAULT_TEMPLATE_DIR, provision_subagents
+
+DEFAULT_DISPATCHES = 20
+DEFAULT_CONCURRENCY = 4
+DEFAULT_SUBAGENTS = 4
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Return the nearest-rank percentile of `values` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LoadReport:
+    """Results of one load run."""
+
+    def __init__(self) -> None:
+        self.dispatches = 0
+        self.concurrency = 0
+        self.subagents = 0
+        self.elapsed = 0.0
+        self.latencies: list[float] = []
+        self.failures = 0
+        self.lock_collisions = 0
+        self.claim_failures = 0
+        self.misrouted_chats = 0
+
+    @property
+    def throughput(self) -> float:
+        """Completed dispatches per second."""
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "dispatches": self.dispatches,
+            "concurrency": self.concurrency,
+            "subagents": self.subagents,
+            "elapsed": round(self.elapsed, 3),
+            "completed": len(self.latencies),
+            "failures": self.failures,
+            "throughput": round(self.throughput, 3),
+            "latency": {
+                "p50": round(percentile(self.latencies, 50), 3),
+                "p95": round(percentile(self.latencies, 95), 3),
+                "p99": round(percentile(self.latencies, 99), 3),
+                "max": round(max(self.latencies, default=0.0), 3),
+            },
+            "lock_collisions": self.lock_collisions,
+            "claim_failures": self.claim_failures,
+            "misrouted_chats": self.misrouted_chats,
+        }
+
+    def summary(self) -> str:
+        data = self.to_dict()
+        latency = data["latency"]
+        return "\n".join(
+            [
+                f"{data['completed']}/{self.dispatches} dispatch(es) completed in {self.elapsed:.2f}s "
+                f"({self.throughput:.2f}/s) with concurrency {self.concurrency} "
+                f"over {self.subagents} subagent(s)",
+                f"latency: p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  "
+                f"p99 {latency['p99']:.3f}s  max {latency['max']:.3f}s",
+                f"failures: {self.failures}  lock collisions: {self.lock_collisions}  "
+                f"claim failures: {self.claim_failures}  misrouted chats: {self.misrouted_chats}",
+            ]
+        )
+
+
+def _count_misrouted(chats_log: Path) -> int:
+    """Count dispatch chats that landed in a window other than their subagent's."""
+    if not chats_log.exists():
+        return 0
+    misrouted = 0
+    for line in chats_log.read_text(encoding="utf-8").splitlines():
+        chat = json.loads(line)
+        if chat["subagent"] is not None and chat["window"] != chat["subagent"]:
+            misrouted += 1
+    return misrouted
+
+
+@contextlib.contextmanager
+def _environment(values: dict[str, str]):
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def run_load_test(
+    *,
+    dispatches: int = DEFAULT_DISPATCHES,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    subagents: int = DEFAULT_SUBAGENTS,
+    startup: float = 0.5,
+    latency: float = 1.0,
+    jitter: float = 0.0,
+    workdir: Optional[Path] = None,
+) -> LoadReport:
+    """Run `dispatches` sync dispatches against a fresh fake pool.
+
+    The pool, fake `code` and its window state live under `workdir` (a
+    temporary directory that is removed afterwards when not given).
+    """
+    report = LoadReport()
+    report.dispatches = dispatches
+    report.concurrency = concurrency
+    report.subagents = subagents
+
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="lmspace-load-")))
+        root = workdir / "agents"
+        state = workdir / "fake-code"
+        code = install_fake_code(workdir / "bin")
+        prompt_file = workdir / "load.prompt.md"
+        prompt_file.write_text("Answer the task.\n", encoding="utf-8")
+
+        provision_subagents(
+            template=DEFAULT_TEMPLATE_DIR,
+            target_root=root,
+            subagents=subagents,
+            lock_name=DEFAULT_LOCK_NAME,
+            force=False,
+            dry_run=False,
+        )
+
+        stack.enter_context(
+            _environment(
+                {
+                    SUBAGENT_ROOT_ENV: str(root),
+                    "LMSPACE_NO_DAEMON": "1",
+                    STATE_ENV: str(state),
+                    STARTUP_ENV: str(startup),
+                    LATENCY_ENV: str(latency),
+                    JITTER_ENV: str(jitter),
+                }
+            )
+        )
+        stack.enter_context(use_launcher(CodeLauncher(str(code))))
+        stack.callback(close_fake_windows, state)
+        # Dispatch progress and responses would drown the report
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+
+        results_lock = threading.Lock()
+
+        def one_dispatch(index: int) -> None:
+            started = time.perf_counter()
+            exit_code = dispatch_agent(
+                f"load test request {index}",
+                prompt_file,
+                wait=True,
+                use_daemon=False,
+                queue=True,
+            )
+            elapsed = time.perf_counter() - started
+            with results_lock:
+                if exit_code == 0:
+                    report.latencies.append(elapsed)
+                else:
+                    report.failures += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for future in [executor.submit(one_dispatch, i) for i in range(dispatches)]:
+                future.result()
+        report.elapsed = time.perf_counter() - started
+
+        with open_pool_state(root) as store:
+            report.lock_collisions = store.lock_collisions()
+            report.claim_failures = store.claim_failures()
+        report.misrouted_chats = _count_misrouted(state / "chats.jsonl")
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m lmspace.vscode.loadtest",
+        description="Benchmark concurrent dispatches against a simulated VS Code.",
+    )
+    parser.add_argument("--dispatches", type=int, default=DEFAULT_DISPATCHES, help="Number of dispatches to run")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Dispatches in flight at once")
+    parser.add_argument("--subagents", type=int, default=DEFAULT_SUBAGENTS, help="Size of the pool")
+    parser.add_argument("--startup", type=float, default=0.5, help="Seconds a fake window takes to start")
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds the fake agent takes to answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- fraction applied to startup and latency")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.dispatches < 1 or args.concurrency < 1 or args.subagents < 1:
+        print("error: --dispatches, --concurrency and --subagents must be positive", file=sys.stderr)
+        return 1
+
+    report = run_load_test(
+        dispatches=args.dispatches,
+        concurrency=args.concurrency,
+        subagents=args.subagents,
+        startup=args.startup,
+        latency=args.latency,
+        jitter=args.jitter,
+    )
+    print(json.dumps(report.to_dict()) if args.json else report.summary())
+    return 0 if report.failures == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Per-subagent manifest of the template a subagent was provisioned from.
+
+Every time a subagent's workspace file is written from a template, the
+template directory and a content hash of its managed files are recorded in
+`.lmspace-manifest.json` inside the subagent directory. `lmspace code
+reconcile` compares manifests against the desired template to find
+subagents that are out of date without reading their workspace files.
+
+A manifest may also carry a `pending` update, recorded for subagents that
+were locked when the pool was reconciled; the update is applied the next
+time the subagent is claimed (see copy_agent_config).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+MANIFEST_NAME = ".lmspace-manifest.json"
+WORKSPACE_TEMPLATE_NAME = "subagent.code-workspace"
+# Template files copied into every subagent, in hashing order
+MANAGED_FILES = (WORKSPACE_TEMPLATE_NAME,)
+
+
+def template_hash(template_dir: Path) -> str:
+    """Return a content hash of the template's managed files."""
+    digest = hashlib.sha256()
+    for name in MANAGED_FILES:
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update((template_dir / name).read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def workspace_hash(subagent_dir: Path) -> Optional[str]:
+    """Hash a subagent's workspace file as template_hash would, if it exists."""
+    workspace = subagent_dir / f"{subagent_dir.name}.code-workspace"
+    if not workspace.is_file():
+        return None
+    digest = hashlib.sha256()
+    digest.update(WORKSPACE_TEMPLATE_NAME.encode("utf-8") + b"\0")
+    digest.update(workspace.read_bytes())
+    digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def read_manifest(subagent_dir: Path) -> Optional[dict[str, Any]]:
+    """Return a subagent's manifest, or None if it has none (or it is unreadable)."""
+    try:
+        manifest = json.loads((subagent_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def _write(subagent_dir: Path, manifest: dict[str, Any]) -> None:
+    path = subagent_dir / MANIFEST_NAME
+    staged = path.with_name(f"{MANIFEST_NAME}.tmp")
+    staged.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    os.replace(staged, path)
+
+
+def write_manifest(subagent_dir: Path, template_dir: Path, digest: str) -> None:
+    """Record that a subagent's files were just written from `template_dir`."""
+    _write(
+        subagent_dir,
+        {
+            "template": str(template_dir),
+            "template_hash": digest,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        },
+    )
+
+
+def mark_pending(subagent_dir: Path, template_dir: Path, digest: str) -> None:
+    """Record an update to apply the next time the subagent is claimed."""
+    manifest = read_manifest(subagent_dir) or {}
+    manifest["pending"] = {"template": str(template_dir), "template_hash": digest}
+    _write(subagent_dir, manifest)
+
+
+def is_current(manifest: Optional[dict[str, Any]], template_dir: Path, digest: str) -> bool:
+    """Return whether a manifest records `template_dir` at content hash `digest`."""
+    return (
+        manifest is not None
+        and "pending" not in manifest
+        and manifest.get("template") == str(template_dir)
+        and manifest.get("template_hash") == digest
+    )
@@ -0,0 +1,355 @@
+"""Pool utilization and dispatch latency in Prometheus text format.
+
+`lmspace code metrics` prints the metrics once; with `--serve` it answers
+`GET /metrics` over HTTP instead, collecting afresh on every scrape.
+Everything is read from what the pool already keeps:
+
+- membership and the queue come from the pool state store;
+- locked/available status and lock ages come from the lock files;
+- in-flight requests are `req.md` files in `messages/` without an answer;
+- dispatch and readiness latencies come from the dispatch traces
+  (see tracing.py), so they cover traced dispatches only. The trace file is
+  read incrementally: the store keeps the histograms and how far into the
+  file they go, so a scrape only parses traces appended since the last one
+  (and the rest of the file rotated away in between);
+- readiness timeouts, launch failures, failed claims and lock collisions
+  are counters in the pool state store.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Optional, Sequence
+
+from .agent_dispatch import DEFAULT_LOCK_NAME, get_subagent_root
+from .pool_state import PoolStateStore, open_pool_state, read_lock_file
+from .tracing import rotated_trace_file, trace_file_for
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LOCK_AGE_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+DISPATCH_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+READINESS_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Traced spans kept as histograms, with their buckets
+TRACE_HISTOGRAMS = {"dispatch": DISPATCH_BUCKETS, "window.ready": READINESS_BUCKETS}
+# Meta key of the trace histograms and the trace file position they cover
+TRACE_STATE_KEY = "trace_histograms"
+# Times a scrape parses new traces before giving way to concurrent scrapes
+TRACE_UPDATE_ATTEMPTS = 3
+# Counters in the pool state store, with the metric each is exported as
+STORE_COUNTERS = (
+    ("readiness_timeouts", "lmspace_readiness_timeouts_total", "Windows that did not answer the readiness check in time."),
+    ("launch_failures", "lmspace_launch_failures_total", "Dispatches whose VS Code launch failed."),
+    ("claim_failures", "lmspace_claim_failures_total", "Claims that found every subagent locked."),
+    ("lock_collisions", "lmspace_lock_collisions_total", "Claims that lost a subagent's lock file to another claimer."),
+)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _metric(lines: list[str], name: str, kind: str, help_text: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _empty_histogram(buckets: Sequence[float]) -> dict[str, Any]:
+    return {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+
+
+def _observe(histogram: dict[str, Any], buckets: Sequence[float], value: float) -> None:
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            histogram["buckets"][index] += 1
+    histogram["sum"] += value
+    histogram["count"] += 1
+
+
+def _histogram(
+    lines: list[str],
+    name: str,
+    help_text: str,
+    histogram: dict[str, Any],
+    buckets: Sequence[float],
+) -> None:
+    _metric(lines, name, "histogram", help_text)
+    for bound, count in zip(buckets, histogram["buckets"]):
+        lines.append(f'{name}_bucket{{le="{_format_value(bound)}"}} {count}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+    lines.append(f"{name}_sum {_format_value(round(histogram['sum'], 6))}")
+    lines.append(f"{name}_count {histogram['count']}")
+
+
+def _lock_age(lock_file: Path, lease: dict[str, Any], now: float) -> Optional[float]:
+    try:
+        acquired = datetime.fromisoformat(lease["acquired_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        # Lock files from older versions carry no lease; use their mtime
+        try:
+            acquired = lock_file.stat().st_mtime
+        except OSError:
+            return None
+    return max(0.0, now - acquired)
+
+
+def _in_flight(subagent_dir: Path) -> bool:
+    messages = subagent_dir / "messages"
+    if not messages.is_dir():
+        return False
+    for request in messages.glob("*_req.md"):
+        stem = request.name[: -len("_req.md")]
+        if not (messages / f"{stem}_res.md").exists():
+            return True
+    return False
+
+
+def _span_durations(line: str) -> Iterator[tuple[str, float]]:
+    """Yield (span name, seconds) for the histogram spans of one trace line.
+
+    `window.ready` spans count only when the window became ready.
+    """
+    try:
+        record = json.loads(line)
+        spans = [
+            s
+            for resource in record["resourceSpans"]
+            for scope in resource["scopeSpans"]
+            for s in scope["spans"]
+        ]
+    except (ValueError, KeyError, TypeError):
+        return
+    for span in spans:
+        name = span.get("name")
+        if name not in TRACE_HISTOGRAMS:
+            continue
+        if name == "window.ready":
+            attributes = {a["key"]: a["value"] for a in span.get("attributes", [])}
+            if attributes.get("lmspace.ready") != {"boolValue": True}:
+                continue
+        try:
+            elapsed = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9
+        except (KeyError, ValueError):
+            continue
+        yield name, elapsed
+
+
+def _read_from(handle: BinaryIO, offset: int, histograms: dict[str, Any]) -> int:
+    """Add the complete trace lines after `offset` to `histograms`; return the new offset."""
+    handle.seek(offset)
+    data = handle.read()
+    # A line still being appended is read on the next scrape
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].decode("utf-8", errors="replace").splitlines():
+        for name, elapsed in _span_durations(line):
+            _observe(histograms[name], TRACE_HISTOGRAMS[name], elapsed)
+    return offset + end
+
+
+def _load_trace_state(raw: Optional[str]) -> dict[str, Any]:
+    fresh = {
+        "inode": None,
+        "offset": 0,
+        "histograms": {name: _empty_histogram(b) for name, b in TRACE_HISTOGRAMS.items()},
+    }
+    try:
+        state = json.loads(raw) if raw is not None else fresh
+        if set(state["histograms"]) != set(TRACE_HISTOGRAMS) or any(
+            len(state["histograms"][name]["buckets"]) != len(b) for name, b in TRACE_HISTOGRAMS.items()
+        ):
+            # Buckets changed since the state was saved
+            return fresh
+    except (ValueError, KeyError, TypeError):
+        return fresh
+    return state
+
+
+def _advance_trace_state(state: dict[str, Any], trace_file: Path) -> None:
+    """Fold the traces after the state's position into it, in place."""
+    histograms = state["histograms"]
+    try:
+        handle: Optional[BinaryIO] = trace_file.open("rb")
+    except OSError:
+        handle = None
+    try:
+        opened = os.fstat(handle.fileno()) if handle is not None else None
+        if state["inode"] is not None and (opened is None or opened.st_ino != state["inode"]):
+            rotated = rotated_trace_file(trace_file)
+            try:
+                with rotated.open("rb") as previous:
+                    if os.fstat(previous.fileno()).st_ino == state["inode"]:
+                        _read_from(previous, state["offset"], histograms)
+            except OSError:
+                pass
+            state["inode"], state["offset"] = None, 0
+        if opened is not None:
+            if opened.st_size < state["offset"]:
+                # Truncated in place: start over
+                state["offset"] = 0
+            state["offset"] = _read_from(handle, state["offset"], histograms)
+            state["inode"] = opened.st_ino
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+def update_trace_histograms(store: PoolStateStore, trace_file: Path) -> dict[str, Any]:
+    """Fold traces appended since the last call into the stored histograms.
+
+    Returns the histograms by span name. If the file was rotated since the
+    last call, the rest of the rotated file is read first; a file rotated
+    more than once in between loses the traces of the middle files.
+
+    The traces are parsed without holding the store's write lock. The result
+    is stored only if no other scrape moved the stored position meanwhile;
+    otherwise the new traces are parsed again from the position it stored.
+    """
+    for _ in range(TRACE_UPDATE_ATTEMPTS):
+        state = _load_trace_state(store.meta_value(TRACE_STATE_KEY))
+        position = (state["inode"], state["offset"])
+        _advance_trace_state(state, trace_file)
+        with store.transaction() as conn:
+            current = _load_trace_state(store.meta_value(TRACE_STATE_KEY, conn))
+            if (current["inode"], current["offset"]) == position:
+                store.set_meta_value(TRACE_STATE_KEY, json.dumps(state), conn)
+                return state["histograms"]
+    # Other scrapes kept winning; theirs are as recent as this one's
+    return _load_trace_state(store.meta_value(TRACE_STATE_KEY))["histograms"]
+
+
+def collect_metrics(subagent_root: Path, *, lock_name: str = DEFAULT_LOCK_NAME) -> str:
+    """Return the pool's metrics in Prometheus text exposition format."""
+    now = time.time()
+    with open_pool_state(subagent_root, lock_name=lock_name) as store:
+        records = store.list_subagents()
+        queue_depth = len(store.queue_entries())
+        counters = {key: store.counter(key) for key, _, _ in STORE_COUNTERS}
+        histograms = update_trace_histograms(store, trace_file_for(subagent_root))
+
+    locked = 0
+    in_flight = 0
+    lock_ages = _empty_histogram(LOCK_AGE_BUCKETS)
+    for record in records:
+        subagent_dir = Path(record["path"])
+        lock_file = subagent_dir / lock_name
+        lease = read_lock_file(lock_file)
+        if lease is None:
+            continue
+        locked += 1
+        age = _lock_age(lock_file, lease, now)
+        if age is not None:
+            _observe(lock_ages, LOCK_AGE_BUCKETS, age)
+        if _in_flight(subagent_dir):
+            in_flight += 1
+
+    lines: list[str] = []
+    _metric(lines, "lmspace_pool_subagents", "gauge", "Provisioned subagents.")
+    lines.append(f"lmspace_pool_subagents {len(records)}")
+    _metric(lines, "lmspace_pool_subagents_by_status", "gauge", "Subagents by lock status.")
+    lines.append(f'lmspace_pool_subagents_by_status{{status="locked"}} {locked}')
+    lines.append(f'lmspace_pool_subagents_by_status{{status="available"}} {len(records) - locked}')
+    _histogram(
+        lines,
+        "lmspace_lock_age_seconds",
+        "Age of the locks currently held.",
+        lock_ages,
+        LOCK_AGE_BUCKETS,
+    )
+    _metric(lines, "lmspace_queue_depth", "gauge", "Dispatches waiting in the queue for a subagent.")
+    lines.append(f"lmspace_queue_depth {queue_depth}")
+    _metric(lines, "lmspace_requests_in_flight", "gauge", "Locked subagents whose request has no response yet.")
+    lines.append(f"lmspace_requests_in_flight {in_flight}")
+    _histogram(
+        lines,
+        "lmspace_dispatch_duration_seconds",
+        "Duration of traced dispatches, from claim to response (or to chat launch for async dispatches).",
+        histograms["dispatch"],
+        DISPATCH_BUCKETS,
+    )
+    _histogram(
+        lines,
+        "lmspace_window_ready_duration_seconds",
+        "Time from opening a window until it answered the readiness check.",
+        histograms["window.ready"],
+        READINESS_BUCKETS,
+    )
+    for key, name, help_text in STORE_COUNTERS:
+        _metric(lines, name, "counter", help_text)
+        lines.append(f"{name} {counters[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(subagent_root: Path, *, lock_name: str, host: str, port: int) -> None:
+    """Serve `GET /metrics` until interrupted."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = collect_metrics(subagent_root, lock_name=lock_name).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    with ThreadingHTTPServer((host, port), Handler) as server:
+        print(
+            f"info: Serving metrics on http://{host}:{server.server_address[1]}/metrics",
+            file=sys.stderr,
+            flush=True,
+        )
+        server.serve_forever()
+
+
+def parse_listen_address(value: str) -> tuple[str, int]:
+    """Parse `[HOST:]PORT` (HOST defaults to 127.0.0.1)."""
+    host, _, port = value.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise ValueError(f"invalid listen address {value!r}; expected [HOST:]PORT") from None
+
+
+def run_metrics(
+    *,
+    subagent_root: Optional[Path] = None,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    serve: Optional[str] = None,
+) -> int:
+    """Print the pool's metrics, or serve them over HTTP.
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    if subagent_root is None:
+        subagent_root = get_subagent_root()
+    if not subagent_root.exists():
+        print(f"error: Subagent root not found: {subagent_root}", file=sys.stderr)
+        return 1
+
+    if serve is None:
+        sys.stdout.write(collect_metrics(subagent_root, lock_name=lock_name))
+        return 0
+
+    try:
+        host, port = parse_listen_address(serve)
+        serve_metrics(subagent_root, lock_name=lock_name, host=host, port=port)
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    except OSError as error:
+        print(f"error: cannot serve metrics on {serve}: {error}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\ninfo: Metrics server stopped", file=sys.stderr)
+    return 0
@@ -0,0 +1,490 @@
+"""Persistent state store for the subagent pool.
+
+The store is a small SQLite database kept under the pool root that indexes
+every subagent with its status, current request, lock owner and timestamps.
+Lock files remain the source of truth for ownership; the store lets pool
+commands answer "which subagents exist and which are free" without walking
+and stat-ing the whole pool.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .defaults import DEFAULT_LOCK_NAME
+
+STATE_DIR_NAME = ".lmspace-pool"
+STATE_DB_NAME = "state.sqlite3"
+QUEUE_DIR_NAME = "queue"
+
+STATUS_AVAILABLE = "available"
+STATUS_LOCKED = "locked"
+
+# Each feature that keeps state in the store appends its own migration; the
+# store's version (meta `schema_version`) is the number of migrations applied.
+# Statements are idempotent so databases created before versioning upgrade
+# cleanly.
+_MIGRATIONS: tuple[tuple[str, ...], ...] = (
+    # Subagent index
+    (
+        """
+        CREATE TABLE IF NOT EXISTS subagents (
+            name TEXT PRIMARY KEY,
+            number INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            workspace TEXT,
+            status TEXT NOT NULL,
+            request_id TEXT,
+            lock_owner TEXT,
+            locked_at TEXT,
+            updated_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS subagents_status_number ON subagents (status, number)",
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+    ),
+    # Claim queue
+    (
+        """
+        CREATE TABLE IF NOT EXISTS queue (
+            ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id TEXT,
+            pid INTEGER NOT NULL,
+            host TEXT NOT NULL,
+            enqueued_at TEXT NOT NULL
+        )
+        """,
+    ),
+    # Window registry
+    (
+        """
+        CREATE TABLE IF NOT EXISTS windows (
+            name TEXT PRIMARY KEY,
+            pid INTEGER,
+            pid_start TEXT,
+            seen_at REAL,
+            ready_at REAL
+        )
+        """,
+    ),
+    # Message history archive
+    (
+        """
+        CREATE TABLE IF NOT EXISTS history (
+            request_id TEXT PRIMARY KEY,
+            subagent TEXT NOT NULL,
+            prompt_file TEXT,
+            created_at TEXT NOT NULL,
+            archived_at TEXT NOT NULL,
+            segment INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS history_subagent_created ON history (subagent, created_at)",
+        "CREATE INDEX IF NOT EXISTS history_prompt_created ON history (prompt_file, created_at)",
+        "CREATE INDEX IF NOT EXISTS history_created ON history (created_at)",
+    ),
+    # Response cache
+    (
+        """
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS response_cache_last_used ON response_cache (last_used_at)",
+    ),
+    # Single-flight registry
+    (
+        """
+        CREATE TABLE IF NOT EXISTS inflight (
+            fingerprint TEXT PRIMARY KEY,
+            request_id TEXT NOT NULL,
+            subagent TEXT,
+            response_file TEXT,
+            pid INTEGER NOT NULL,
+            host TEXT NOT NULL,
+            started_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS inflight_request ON inflight (request_id)",
+        "CREATE INDEX IF NOT EXISTS inflight_subagent ON inflight (subagent)",
+    ),
+    # Prompt import cache
+    (
+        """
+        CREATE TABLE IF NOT EXISTS prompt_imports (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            imports TEXT NOT NULL
+        )
+        """,
+    ),
+)
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+
+def read_lock_file(lock_file: Path) -> Optional[dict[str, Any]]:
+    """Read the lease metadata stored in a lock file.
+
+    Returns None if the lock file does not exist. Lock files without readable
+    metadata (e.g., created by older versions) yield an empty dict.
+    """
+    try:
+        content = lock_file.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    except OSError:
+        return {}
+
+    try:
+        metadata = json.loads(content)
+    except ValueError:
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def parse_subagent_number(name: str) -> Optional[int]:
+    """Return N for a `subagent-N` directory name, or None if it doesn't match."""
+    if not name.startswith("subagent-"):
+        return None
+    try:
+        return int(name.split("-")[1])
+    except (ValueError, IndexError):
+        return None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _lock_owner(lease: dict[str, Any]) -> Optional[str]:
+    if "pid" not in lease:
+        return None
+    return f"{lease['pid']}@{lease.get('host', '')}"
+
+
+class PoolStateStore:
+    """Transactional index of the subagents under a pool root.
+
+    Use `open_pool_state` rather than constructing this directly.
+    """
+
+    def __init__(self, subagent_root: Path, *, lock_name: str = DEFAULT_LOCK_NAME) -> None:
+        self.subagent_root = subagent_root
+        self.lock_name = lock_name
+        self.state_dir = subagent_root / STATE_DIR_NAME
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            self.state_dir / STATE_DB_NAME,
+            timeout=30.0,
+            isolation_level=None,
+        )
+        self._conn.row_factory = sqlite3.Row
+        if self._schema_version() != SCHEMA_VERSION:
+            self._migrate()
+        self._sync_membership()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block inside a write transaction that excludes other writers."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple[Any, ...] = ()) -> list[sqlite3.Row]:
+        """Run a read-only query against the store."""
+        return self._conn.execute(sql, params).fetchall()
+
+    def _schema_version(self) -> int:
+        try:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'schema_version'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            # No meta table yet: a new database
+            return 0
+        return 0 if row is None else int(row["value"])
+
+    def _migrate(self) -> None:
+        """Apply the migrations this database has not seen yet."""
+        with self.transaction() as conn:
+            # Another process may have migrated while this one waited for the lock
+            current = self._schema_version()
+            for statements in _MIGRATIONS[current:]:
+                for statement in statements:
+                    conn.execute(statement)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),),
+            )
+
+    def _root_mtime(self) -> str:
+        return str(self.subagent_root.stat().st_mtime_ns)
+
+    def _scan_subagent_dirs(self) -> dict[str, Path]:
+        return {
+            d.name: d
+            for d in self.subagent_root.iterdir()
+            if d.is_dir() and parse_subagent_number(d.name) is not None
+        }
+
+    def _observe(self, conn: sqlite3.Connection, subagent_dir: Path) -> None:
+        """Insert or refresh a subagent row from its on-disk state."""
+        lease = read_lock_file(subagent_dir / self.lock_name)
+        workspace_file = subagent_dir / f"{subagent_dir.name}.code-workspace"
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO subagents
+                (name, number, path, workspace, status, request_id, lock_owner, locked_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                subagent_dir.name,
+                parse_subagent_number(subagent_dir.name),
+                str(subagent_dir),
+                str(workspace_file) if workspace_file.exists() else None,
+                STATUS_AVAILABLE if lease is None else STATUS_LOCKED,
+                None if lease is None else lease.get("request_id"),
+                None if lease is None else _lock_owner(lease),
+                None if lease is None else lease.get("acquired_at"),
+                _now(),
+            ),
+        )
+
+    def _sync_membership(self) -> None:
+        """Pick up subagent directories created or removed outside the store.
+
+        Only runs when the pool root's mtime changed since the last sync, so
+        the common case costs a single stat.
+        """
+        mtime = self._root_mtime()
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'root_mtime_ns'"
+        ).fetchone()
+        if row is not None and row["value"] == mtime:
+            return
+
+        with self.transaction() as conn:
+            on_disk = self._scan_subagent_dirs()
+            known = {r["name"] for r in conn.execute("SELECT name FROM subagents")}
+            for name in known - on_disk.keys():
+                conn.execute("DELETE FROM subagents WHERE name = ?", (name,))
+            for name in on_disk.keys() - known:
+                self._observe(conn, on_disk[name])
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('root_mtime_ns', ?)",
+                (mtime,),
+            )
+
+    def rebuild(self, conn: Optional[sqlite3.Connection] = None) -> dict[str, int]:
+        """Reconcile every row with the filesystem.
+
+        Runs in its own transaction unless `conn` is one already open.
+        Returns counts of added, removed and refreshed subagents.
+        """
+        if conn is None:
+            with self.transaction() as opened:
+                return self.rebuild(opened)
+
+        on_disk = self._scan_subagent_dirs()
+        known = {r["name"] for r in conn.execute("SELECT name FROM subagents")}
+        removed = known - on_disk.keys()
+        for name in removed:
+            conn.execute("DELETE FROM subagents WHERE name = ?", (name,))
+        for subagent_dir in on_disk.values():
+            self._observe(conn, subagent_dir)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('root_mtime_ns', ?)",
+            (self._root_mtime(),),
+        )
+        return {
+            "added": len(on_disk.keys() - known),
+            "removed": len(removed),
+            "refreshed": len(on_disk.keys() & known),
+        }
+
+    def list_subagents(self, *, status: Optional[str] = None) -> list[dict[str, Any]]:
+        """Return subagent rows ordered by subagent number."""
+        if status is None:
+            rows = self._conn.execute("SELECT * FROM subagents ORDER BY number")
+        else:
+            rows = self._conn.execute(
+                "SELECT * FROM subagents WHERE status = ? ORDER BY number", (status,)
+            )
+        return [dict(row) for row in rows]
+
+    def first_available(self) -> Optional[Path]:
+        """Return the lowest-numbered subagent recorded as available."""
+        row = self._conn.execute(
+            "SELECT path FROM subagents WHERE status = ? ORDER BY number LIMIT 1",
+            (STATUS_AVAILABLE,),
+        ).fetchone()
+        return None if row is None else Path(row["path"])
+
+    def observe(self, subagent_dir: Path, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Refresh a single subagent row from its on-disk state.
+
+        Rows for directories that no longer exist are removed.
+        """
+        target = conn or self._conn
+        if subagent_dir.is_dir():
+            self._observe(target, subagent_dir)
+        else:
+            target.execute("DELETE FROM subagents WHERE name = ?", (subagent_dir.name,))
+
+    def record_locked(
+        self,
+        subagent_dir: Path,
+        lease: dict[str, Any],
+        conn: Optional[sqlite3.Connection] = None,
+    ) -> None:
+        """Record that a subagent is locked by the given lease."""
+        (conn or self._conn).execute(
+            """
+            UPDATE subagents
+            SET status = ?, request_id = ?, lock_owner = ?, locked_at = ?, updated_at = ?
+            WHERE name = ?
+            """,
+            (
+                STATUS_LOCKED,
+                lease.get("request_id"),
+                _lock_owner(lease),
+                lease.get("acquired_at"),
+                _now(),
+                subagent_dir.name,
+            ),
+        )
+
+    def record_released(self, subagent_dir: Path) -> None:
+        """Record that a subagent is available again and wake the first queued waiter.
+
+        The request it ran is no longer in flight, so duplicates stop attaching to it.
+        """
+        self._conn.execute(
+            """
+            UPDATE subagents
+            SET status = ?, request_id = NULL, lock_owner = NULL, locked_at = NULL, updated_at = ?
+            WHERE name = ?
+            """,
+            (STATUS_AVAILABLE, _now(), subagent_dir.name),
+        )
+        self._conn.execute("DELETE FROM inflight WHERE subagent = ?", (subagent_dir.name,))
+        self.wake_queue_head()
+
+    def increment_counter(self, key: str, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Add one to a counter kept in the meta table."""
+        (conn or self._conn).execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+            (key,),
+        )
+
+    def counter(self, key: str) -> int:
+        """Return a counter kept in the meta table (0 if never incremented)."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return 0 if row is None else int(row["value"])
+
+    def meta_value(self, key: str, conn: Optional[sqlite3.Connection] = None) -> Optional[str]:
+        """Return a value kept in the meta table, or None if it was never set."""
+        row = (conn or self._conn).execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row["value"]
+
+    def set_meta_value(self, key: str, value: str, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Set a value kept in the meta table."""
+        (conn or self._conn).execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def record_claim_failure(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Count a claim that failed because every subagent was locked."""
+        self.increment_counter("claim_failures", conn)
+
+    def claim_failures(self) -> int:
+        """Return the number of failed claims recorded since the store was created."""
+        return self.counter("claim_failures")
+
+    def record_lock_collision(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Count a claim that lost its candidate's lock file to another claimer."""
+        self.increment_counter("lock_collisions", conn)
+
+    def lock_collisions(self) -> int:
+        """Return the number of lock collisions recorded since the store was created."""
+        return self.counter("lock_collisions")
+
+    def queue_wake_path(self, ticket: int) -> Path:
+        """Return the file whose creation wakes the waiter holding `ticket`."""
+        return self.state_dir / QUEUE_DIR_NAME / f"{ticket}.wake"
+
+    def enqueue(self, request_id: Optional[str], conn: Optional[sqlite3.Connection] = None) -> int:
+        """Append a waiter for this process to the claim queue and return its ticket."""
+        (self.state_dir / QUEUE_DIR_NAME).mkdir(exist_ok=True)
+        cursor = (conn or self._conn).execute(
+            "INSERT INTO queue (request_id, pid, host, enqueued_at) VALUES (?, ?, ?, ?)",
+            (request_id, os.getpid(), socket.gethostname(), _now()),
+        )
+        return int(cursor.lastrowid)
+
+    def dequeue(self, ticket: int, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Remove a waiter from the claim queue."""
+        (conn or self._conn).execute("DELETE FROM queue WHERE ticket = ?", (ticket,))
+        self.queue_wake_path(ticket).unlink(missing_ok=True)
+
+    def queue_entries(self, conn: Optional[sqlite3.Connection] = None) -> list[dict[str, Any]]:
+        """Return queued waiters in FIFO order."""
+        rows = (conn or self._conn).execute("SELECT * FROM queue ORDER BY ticket")
+        return [dict(row) for row in rows]
+
+    def queue_head(self, conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+        """Return the ticket at the front of the claim queue, if any."""
+        row = (conn or self._conn).execute("SELECT MIN(ticket) AS ticket FROM queue").fetchone()
+        return row["ticket"]
+
+    def wake_queue_head(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Signal the waiter at the front of the claim queue to retry its claim."""
+        ticket = self.queue_head(conn)
+        if ticket is not None:
+            self.queue_wake_path(ticket).write_text("", encoding="utf-8")
+
+
+@contextmanager
+def open_pool_state(
+    subagent_root: Path,
+    *,
+    lock_name: str = DEFAULT_LOCK_NAME,
+) -> Iterator[PoolStateStore]:
+    """Open the state store for a pool root, creating it on first use.
+
+    The caller must ensure the pool root exists.
+    """
+    store = PoolStateStore(subagent_root, lock_name=lock_name)
+    try:
+        yield store
+    finally:
+        store.close()
@@ -3,20 +3,45 @@
 from __future__ import annotations
 
 import argparse
+import errno
+import os
 import shutil
 import sys
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
 try:
-    from .agent_dispatch import warmup_subagents  # type: ignore
+    from .agent_dispatch import (  # type: ignore
+        release_subagent,
+        try_lock_subagent,
+        warmup_subagents,
+    )
+    from .defaults import (
+        COPY_MODES,
+        DEFAULT_COPY_MODE,
+        DEFAULT_LOCK_NAME,
+        DEFAULT_PROVISION_WORKERS,
+        DEFAULT_TEMPLATE_DIR,
+    )
+    from .pool_state import STATUS_LOCKED, PoolStateStore, open_pool_state
 except ImportError:  # pragma: no cover - fallback when executed as a script
-    from lmspace.vscode.agent_dispatch import warmup_subagents
+    from lmspace.vscode.agent_dispatch import (
+        release_subagent,
+        try_lock_subagent,
+        warmup_subagents,
+    )
+    from lmspace.vscode.defaults import (
+        COPY_MODES,
+        DEFAULT_COPY_MODE,
+        DEFAULT_LOCK_NAME,
+        DEFAULT_PROVISION_WORKERS,
+        DEFAULT_TEMPLATE_DIR,
+    )
+    from lmspace.vscode.pool_state import STATUS_LOCKED, PoolStateStore, open_pool_state
 
-DEFAULT_LOCK_NAME = "subagent.lock"
-DEFAULT_TEMPLATE_DIR = (
-    Path(__file__).resolve().parent / "subagent_template"
-)
+_FICLONE = 0x40049409  # Linux ioctl that clones one file's extents into another
 
 
 def parse_args() -> argparse.Namespace:
@@ -73,13 +98,164 @@ def parse_args() -> argparse.Namespace:
         "--warmup",
         action="store_true",
         help=(
-            "Warm up provisioned subagents after provisioning completes. "
-            "Ignored during dry runs."
+            "Warm up provisioned subagents after provisioning completes, "
+            "waiting for each window to be ready. Ignored during dry runs."
         ),
     )
     return parser.parse_args()
 
 
+def _reflink(src: Path, dst: Path) -> None:
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink copies are only supported on Linux", str(dst))
+    import fcntl
+
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+    shutil.copystat(src, dst)
+
+
+def copy_template_file(src: Path, dst: Path, mode: str = DEFAULT_COPY_MODE) -> str:
+    """Copy a template file and return the method used.
+
+    Every method leaves `dst` with the content and timestamps `shutil.copy2`
+    would. "auto" clones the file (reflink) where the filesystem supports it
+    and otherwise copies it; "reflink" and "hardlink" raise OSError when the
+    filesystem cannot do them. Hard links share the template's inode, so
+    they are only safe for templates nobody edits in place.
+
+    The file is written under a staging name and renamed over `dst`, so a
+    `dst` hard-linked to the template (or to an older one) is replaced, never
+    written through.
+
+    Returns:
+        "reflink", "hardlink" or "copy"
+    """
+    staged = dst.with_name(f"{dst.name}.provision")
+    staged.unlink(missing_ok=True)
+    used = None
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(src, staged)
+            used = "reflink"
+        except OSError:
+            staged.unlink(missing_ok=True)
+            if mode == "reflink":
+                raise
+    elif mode == "hardlink":
+        os.link(src, staged)
+        used = "hardlink"
+    if used is None:
+        shutil.copy2(src, staged)
+        used = "copy"
+    os.replace(staged, dst)
+    return used
+
+
+class ProvisionReport:
+    """Timing and copy statistics of one provisioning run."""
+
+    def __init__(self) -> None:
+        self.workers = 0
+        self.elapsed = 0.0
+        self.copies: dict[str, int] = {}
+
+    def summary(self) -> str:
+        written = sum(self.copies.values())
+        methods = ", ".join(f"{count} {method}" for method, count in sorted(self.copies.items()))
+        return (
+            f"Wrote {written} workspace file(s) in {self.elapsed:.2f}s "
+            f"with {self.workers} worker(s) ({methods})"
+        )
+
+
+def _write_workspace_files(
+    store: PoolStateStore,
+    template_path: Path,
+    jobs: List[Tuple[Path, bool]],
+    *,
+    lock_name: str,
+    workers: int,
+    copy_mode: str,
+    progress: Optional[Callable[[int, int], None]],
+    report: ProvisionReport,
+) -> List[Path]:
+    """Copy the template workspace file into each job's subagent directory.
+
+    Each job is a subagent directory and whether its lock must be released
+    first (`--force`). Every subagent is held locked while its file is
+    rewritten so that a concurrent dispatch cannot claim a half-written
+    workspace, and its manifest records the template it now matches. The
+    pool state store is refreshed once the files are in place.
+
+    Directory creation and copies run on `workers` threads; locking and the
+    store stay on this thread, which owns the SQLite connection.
+
+    In "auto" mode the first file is written before the others to find out
+    whether the filesystem can clone, and the rest use the method it found.
+
+    Returns the subagents that were skipped because another process locked
+    them first.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+    from .manifest import template_hash, write_manifest
+
+    started = time.perf_counter()
+    workspace_src = template_path / "subagent.code-workspace"
+    digest = template_hash(template_path)
+
+    def copy(subagent_dir: Path, method: str) -> str:
+        used = copy_template_file(
+            workspace_src, subagent_dir / f"{subagent_dir.name}.code-workspace", method
+        )
+        write_manifest(subagent_dir, template_path, digest)
+        return used
+
+    def record(used: str) -> None:
+        report.copies[used] = report.copies.get(used, 0) + 1
+        if progress is not None:
+            progress(sum(report.copies.values()), len(locked))
+
+    report.workers = min(workers, len(jobs))
+    with ThreadPoolExecutor(max_workers=report.workers) as executor:
+        list(executor.map(lambda d: d.mkdir(parents=True, exist_ok=True), (d for d, _ in jobs)))
+
+        locked = []
+        skipped = []
+        for subagent_dir, release_first in jobs:
+            if release_first:
+                release_subagent(subagent_dir, lock_name=lock_name, store=store)
+            if try_lock_subagent(
+                subagent_dir, request_id="provision", lock_name=lock_name, store=store
+            ):
+                locked.append(subagent_dir)
+            else:
+                skipped.append(subagent_dir)
+
+        futures = []
+        try:
+            method = copy_mode
+            if locked:
+                # Probe with the first file so every worker uses the same method
+                used = copy(locked[0], method)
+                record(used)
+                if method == "auto" and used == "copy":
+                    # The target filesystem cannot clone; stop trying for the rest of the run
+                    method = "copy"
+            futures = [executor.submit(copy, subagent_dir, method) for subagent_dir in locked[1:]]
+            for future in as_completed(futures):
+                record(future.result())
+        finally:
+            wait(futures)
+            for subagent_dir in locked:
+                release_subagent(subagent_dir, lock_name=lock_name, store=store)
+            for subagent_dir, _ in jobs:
+                store.observe(subagent_dir)
+    report.elapsed = time.perf_counter() - started
+    return skipped
+
+
 def provision_subagents(
     *,
     template: Path,
@@ -88,6 +264,10 @@ def provision_subagents(
     lock_name: str,
     force: bool,
     dry_run: bool,
+    workers: int = DEFAULT_PROVISION_WORKERS,
+    copy_mode: str = DEFAULT_COPY_MODE,
+    progress: Optional[Callable[[int, int], None]] = None,
+    report: Optional[ProvisionReport] = None,
 ) -> Tuple[List[Path], List[Path], List[Path]]:
     """Provision subagent directories and return summary lists.
 
@@ -95,11 +275,20 @@ def provision_subagents(
     If there are fewer unlocked subagents than requested, it provisions additional ones
     with higher numbers.
 
+    Workspace files are written by up to `workers` threads using `copy_mode`
+    (see copy_template_file); the outcome does not depend on either.
+    `progress` is called with (done, total) as each file is written, and
+    `report`, if given, receives the timing and copy statistics.
+
     Returns three lists: created subagents, subagents skipped because they already
     existed, and subagents skipped because they were locked.
     """
     if subagents < 1:
         raise ValueError("subagents must be a positive integer")
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    if copy_mode not in COPY_MODES:
+        raise ValueError(f"copy mode must be one of: {', '.join(COPY_MODES)}")
 
     template_path = template.expanduser().resolve()
     target_path = target_root.expanduser().resolve()
@@ -110,29 +299,64 @@ def provision_subagents(
     if not dry_run:
         target_path.mkdir(parents=True, exist_ok=True)
 
-    # First, scan existing subagents to count unlocked ones and find the highest number
-    # Filter out directories that don't have a valid integer after "subagent-"
-    existing_subagents = []
-    if target_path.exists():
-        for d in target_path.iterdir():
-            if d.is_dir() and d.name.startswith("subagent-"):
-                try:
-                    int(d.name.split("-")[1])
-                    existing_subagents.append(d)
-                except (ValueError, IndexError):
-                    # Skip directories that don't follow the subagent-N pattern
-                    continue
-        existing_subagents.sort(key=lambda d: int(d.name.split("-")[1]))
+    state = (
+        open_pool_state(target_path, lock_name=lock_name)
+        if target_path.exists()
+        else nullcontext(None)
+    )
+    with state as store:
+        return _provision_with_store(
+            store,
+            template_path=template_path,
+            target_path=target_path,
+            subagents=subagents,
+            lock_name=lock_name,
+            force=force,
+            dry_run=dry_run,
+            workers=workers,
+            copy_mode=copy_mode,
+            progress=progress,
+            report=report if report is not None else ProvisionReport(),
+        )
+
+
+def _provision_with_store(
+    store: Optional[PoolStateStore],
+    *,
+    template_path: Path,
+    target_path: Path,
+    subagents: int,
+    lock_name: str,
+    force: bool,
+    dry_run: bool,
+    workers: int,
+    copy_mode: str,
+    progress: Optional[Callable[[int, int], None]],
+    report: ProvisionReport,
+) -> Tuple[List[Path], List[Path], List[Path]]:
+    """Provision subagents using the pool state store for membership.
+
+    `store` is None only for dry runs against a root that does not exist yet.
+    Lock files are still checked directly for the subagents being touched,
+    since overwriting a locked workspace must never rely on a stale index.
+    """
+    # First, read existing subagents from the store to count unlocked ones
+    # and find the highest number
+    records = store.list_subagents() if store is not None else []
 
     unlocked_count = 0
     highest_number = 0
     locked_subagents = []
 
-    for subagent_dir in existing_subagents:
-        subagent_number = int(subagent_dir.name.split("-")[1])
-        highest_number = max(highest_number, subagent_number)
+    for record in records:
+        subagent_dir = Path(record["path"])
+        highest_number = max(highest_number, record["number"])
         lock_file = subagent_dir / lock_name
-        if not lock_file.exists():
+        lock_exists = lock_file.exists()
+        # Correct the index if the lock changed behind its back
+        if store is not None and not dry_run and lock_exists != (record["status"] == STATUS_LOCKED):
+            store.observe(subagent_dir)
+        if not lock_exists:
             unlocked_count += 1
         else:
             locked_subagents.append(subagent_dir)
@@ -140,6 +364,9 @@ def provision_subagents(
     created: List[Path] = []
     skipped_existing: List[Path] = []
     skipped_locked: List[Path] = locked_subagents
+    # Subagents whose workspace file is (re)written, and whether they must be
+    # unlocked first; the files are written together once the plan is known
+    jobs: List[Tuple[Path, bool]] = []
 
     # Provision subagents starting from 1 up to the number needed
     # When force is enabled, overwrite existing subagents up to the count needed
@@ -159,17 +386,9 @@ def provision_subagents(
             
             # When force is enabled, unlock and overwrite all existing subagents
             if force:
-                if not dry_run:
-                    # Remove lock file if it exists
-                    if lock_file.exists():
-                        lock_file.unlink()
-                    # Copy only the workspace file
-                    workspace_src = template_path / "subagent.code-workspace"
-                    workspace_dst = subagent_dir / f"{subagent_dir.name}.code-workspace"
-                    shutil.copy2(workspace_src, workspace_dst)
-                    created.append(subagent_dir)
-                else:
-                    created.append(subagent_dir)
+                # Remove the lock file if it exists, then copy only the workspace file
+                jobs.append((subagent_dir, True))
+                created.append(subagent_dir)
                 # Remove from locked list since we're processing it
                 if subagent_dir in locked_subagents:
                     locked_subagents.remove(subagent_dir)
@@ -179,16 +398,9 @@ def provision_subagents(
                 skipped_existing.append(subagent_dir)
                 subagents_provisioned += 1
         else:
-            # Subagent doesn't exist, create it
-            if dry_run:
-                created.append(subagent_dir)
-            else:
-                subagent_dir.mkdir(parents=True, exist_ok=True)
-                # Copy only the workspace file
-                workspace_src = template_path / "subagent.code-workspace"
-                workspace_dst = subagent_dir / f"{subagent_dir.name}.code-workspace"
-                shutil.copy2(workspace_src, workspace_dst)
-                created.append(subagent_dir)
+            # Subagent doesn't exist, create it with only the workspace file
+            jobs.append((subagent_dir, False))
+            created.append(subagent_dir)
             subagents_provisioned += 1
 
     # Provision additional subagents beyond the highest existing number if needed
@@ -196,18 +408,26 @@ def provision_subagents(
         index = highest_number + 1
         highest_number = index
         subagent_dir = target_path / f"subagent-{index}"
-
-        if dry_run:
-            created.append(subagent_dir)
-        else:
-            subagent_dir.mkdir(parents=True, exist_ok=True)
-            # Copy only the workspace file
-            workspace_src = template_path / "subagent.code-workspace"
-            workspace_dst = subagent_dir / f"{subagent_dir.name}.code-workspace"
-            shutil.copy2(workspace_src, workspace_dst)
-            created.append(subagent_dir)
+        jobs.append((subagent_dir, False))
+        created.append(subagent_dir)
         subagents_provisioned += 1
 
+    if jobs and not dry_run:
+        skipped = _write_workspace_files(
+            store,
+            template_path,
+            jobs,
+            lock_name=lock_name,
+            workers=workers,
+            copy_mode=copy_mode,
+            progress=progress,
+            report=report,
+        )
+        # Claimed by someone else between planning and writing; left untouched
+        for subagent_dir in skipped:
+            created.remove(subagent_dir)
+            skipped_locked.append(subagent_dir)
+
     return created, skipped_existing, skipped_locked
 
 
@@ -218,6 +438,8 @@ def unlock_subagents(
     subagent_name: str | None = None,
     unlock_all: bool = False,
     dry_run: bool = False,
+    rebuild_index: bool = False,
+    request_id: str | None = None,
 ) -> List[Path]:
     """Unlock subagent(s) by removing their lock files.
     
@@ -227,6 +449,10 @@ def unlock_subagents(
         subagent_name: Specific subagent folder name to unlock (e.g., subagent-1)
         unlock_all: If True, unlock all subagents
         dry_run: If True, show what would be done without making changes
+        rebuild_index: If True, reconcile the pool state store with the
+            filesystem before unlocking
+        request_id: If given, only unlock the subagent while it is still held
+            by this request
     
     Returns:
         List of paths to subagent directories that were unlocked
@@ -245,31 +471,36 @@ def unlock_subagents(
     
     unlocked: List[Path] = []
     
-    if unlock_all:
-        # Find all subagent directories and unlock them
-        subagents = sorted(
-            (d for d in target_path.iterdir() if d.is_dir() and d.name.startswith("subagent-")),
-            key=lambda d: int(d.name.split("-")[1])
-        )
+    with open_pool_state(target_path, lock_name=lock_name) as store:
+        if rebuild_index:
+            store.rebuild()
         
-        for subagent_dir in subagents:
+        if unlock_all:
+            # Unlock every subagent known to the store; releasing an unlocked
+            # subagent is a no-op so stale index rows cannot hide a lock
+            for record in store.list_subagents():
+                subagent_dir = Path(record["path"])
+                lock_file = subagent_dir / lock_name
+                if dry_run:
+                    if lock_file.exists():
+                        unlocked.append(subagent_dir)
+                elif release_subagent(subagent_dir, lock_name=lock_name, store=store):
+                    unlocked.append(subagent_dir)
+        else:
+            # Unlock specific subagent
+            subagent_dir = target_path / subagent_name
+            
+            if not subagent_dir.exists():
+                raise ValueError(f"{subagent_name} does not exist in {target_path}")
+            
             lock_file = subagent_dir / lock_name
-            if lock_file.exists():
-                if not dry_run:
-                    lock_file.unlink()
+            if dry_run:
+                if lock_file.exists():
+                    unlocked.append(subagent_dir)
+            elif release_subagent(
+                subagent_dir, lock_name=lock_name, store=store, request_id=request_id
+            ):
                 unlocked.append(subagent_dir)
-    else:
-        # Unlock specific subagent
-        subagent_dir = target_path / subagent_name
-        
-        if not subagent_dir.exists():
-            raise ValueError(f"{subagent_name} does not exist in {target_path}")
-        
-        lock_file = subagent_dir / lock_name
-        if lock_file.exists():
-            if not dry_run:
-                lock_file.unlink()
-            unlocked.append(subagent_dir)
     
     return unlocked
 
@@ -326,6 +557,7 @@ def main() -> int:
             subagent_root=args.target_root,
             subagents=args.subagents,
             dry_run=False,
+            wait_ready=True,
         )
         if warmup_exit != 0:
             return warmup_exit
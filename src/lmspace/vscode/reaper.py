@@ -0,0 +1,210 @@
+"""Reclaim subagents whose lock outlived its owner.
+
+A lease is reclaimable when:
+
+- it has expired: async dispatches get the lease TTL (LMSPACE_LEASE_TTL,
+  one hour by default) for the agent to run `lmspace code unlock`, and
+  heartbeat leases expire HEARTBEAT_TTL after their last renewal;
+- its owner exited: a heartbeat lease whose renewing process no longer
+  runs on this host (e.g., a killed `chat --wait`);
+- it is a legacy empty lock file (or one with an unreadable expiry) older
+  than the lease TTL.
+
+A stale subagent's messages, including the partial `*_res.tmp.md`
+responses its agent left, are first copied to the history archive (see
+history.py), so `lmspace code history` shows the reaped run. The lease is
+then checked again and released inside a store transaction, so a lease
+renewed or replaced since the scan is left alone. Archiving does not
+remove anything; the next claim clears the messages as usual.
+"""
+
+from __future__ import annotations
+
+import json
+import socket
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from .agent_dispatch import DEFAULT_LOCK_NAME, get_subagent_root, lease_ttl
+from .pool_state import PoolStateStore, open_pool_state, read_lock_file
+from .windows import process_alive
+
+DEFAULT_REAP_INTERVAL = 60.0
+
+
+def lease_stale_reason(
+    lease: dict[str, Any],
+    lock_file: Path,
+    *,
+    now: Optional[datetime] = None,
+) -> Optional[str]:
+    """Return why a lease may be reclaimed, or None if it is still valid."""
+    now = now or datetime.now(timezone.utc)
+    if lease.get("heartbeat") and lease.get("host") == socket.gethostname():
+        if process_alive(int(lease["pid"])) is False:
+            return f"owner process {lease['pid']} exited"
+
+    expiry = None
+    expires_at = lease.get("expires_at")
+    if expires_at:
+        try:
+            expiry = datetime.fromisoformat(expires_at)
+        except (TypeError, ValueError):
+            expiry = None
+        else:
+            if expiry.tzinfo is None:
+                expiry = expiry.replace(tzinfo=timezone.utc)
+    if expiry is None:
+        # Legacy, hand-made or corrupt lock files carry no usable expiry; age them by mtime
+        try:
+            mtime = lock_file.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        expiry = datetime.fromtimestamp(mtime + lease_ttl(), timezone.utc)
+    if expiry <= now:
+        return f"lease expired at {expiry.isoformat()}"
+    return None
+
+
+def _release_if_stale(
+    store: PoolStateStore,
+    subagent_dir: Path,
+    *,
+    lock_name: str,
+    request_id: Optional[str],
+) -> bool:
+    """Release a lease that is still held by `request_id` and still stale.
+
+    Returns False if the lease was renewed, replaced or already released
+    since it was found stale.
+    """
+    lock_file = subagent_dir / lock_name
+    with store.transaction():
+        lease = read_lock_file(lock_file)
+        if lease is None or lease.get("request_id") != request_id:
+            return False
+        if lease_stale_reason(lease, lock_file) is None:
+            return False
+        try:
+            lock_file.unlink()
+        except FileNotFoundError:
+            return False
+        store.record_released(subagent_dir)
+    return True
+
+
+def _archive_partial_responses(subagent_dir: Path) -> list[str]:
+    """Archive a stale run's messages; return the partial responses it included."""
+    from .history import archive_messages
+
+    partials = sorted((subagent_dir / "messages").glob("*_res.tmp.md"))
+    if not partials:
+        return []
+    try:
+        archive_messages(subagent_dir)
+    except (OSError, ValueError, sqlite3.Error) as error:
+        print(f"warning: Failed to archive partial responses of {subagent_dir.name}: {error}", file=sys.stderr)
+        return []
+    return [partial.name for partial in partials]
+
+
+def find_stale_subagents(
+    subagent_root: Path,
+    *,
+    lock_name: str = DEFAULT_LOCK_NAME,
+) -> list[dict[str, Any]]:
+    """Return the locked subagents whose leases may be reclaimed."""
+    stale = []
+    with open_pool_state(subagent_root, lock_name=lock_name) as store:
+        records = store.list_subagents()
+    for record in records:
+        subagent_dir = Path(record["path"])
+        lock_file = subagent_dir / lock_name
+        lease = read_lock_file(lock_file)
+        if lease is None:
+            continue
+        reason = lease_stale_reason(lease, lock_file)
+        if reason is not None:
+            stale.append(
+                {
+                    "subagent": subagent_dir.name,
+                    "path": str(subagent_dir),
+                    "request_id": lease.get("request_id"),
+                    "reason": reason,
+                }
+            )
+    return stale
+
+
+def reap_subagents(
+    subagent_root: Path,
+    *,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    dry_run: bool = False,
+) -> list[dict[str, Any]]:
+    """Reclaim stale subagents and return what was (or would be) reclaimed.
+
+    Each release is scoped to the stale lease's request id, so a subagent
+    claimed again (or a lease renewed) in the meantime is left alone.
+    """
+    stale = find_stale_subagents(subagent_root, lock_name=lock_name)
+    if dry_run:
+        return [dict(entry, archived=[]) for entry in stale]
+    reaped = []
+    with open_pool_state(subagent_root, lock_name=lock_name) as store:
+        for entry in stale:
+            subagent_dir = Path(entry["path"])
+            # While the stale lease is held no claim can clear these messages
+            archived = _archive_partial_responses(subagent_dir)
+            if not _release_if_stale(
+                store, subagent_dir, lock_name=lock_name, request_id=entry["request_id"]
+            ):
+                continue
+            entry["archived"] = archived
+            reaped.append(entry)
+    return reaped
+
+
+def run_reaper(
+    *,
+    subagent_root: Optional[Path] = None,
+    lock_name: str = DEFAULT_LOCK_NAME,
+    dry_run: bool = False,
+    watch: bool = False,
+    interval: float = DEFAULT_REAP_INTERVAL,
+    json_output: bool = False,
+) -> int:
+    """Reap stale subagents once, or repeatedly with watch=True.
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    if subagent_root is None:
+        subagent_root = get_subagent_root()
+    if not subagent_root.exists():
+        print(f"error: Subagent root not found: {subagent_root}", file=sys.stderr)
+        return 1
+
+    try:
+        while True:
+            reaped = reap_subagents(subagent_root, lock_name=lock_name, dry_run=dry_run)
+            for entry in reaped:
+                if json_output:
+                    print(json.dumps(entry), flush=True)
+                else:
+                    verb = "would reclaim" if dry_run else "reclaimed"
+                    print(f"{verb} {entry['subagent']}: {entry['reason']}", flush=True)
+                    for path in entry["archived"]:
+                        print(f"  archived partial response to history: {path}", flush=True)
+            if not watch:
+                if not reaped and not json_output:
+                    print("no stale subagents found")
+                return 0
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\ninfo: Reaper stopped", file=sys.stderr)
+        return 0
@@ -0,0 +1,213 @@
+"""Reconcile a subagent pool with a declarative `pool.yaml` spec.
+
+    count: 4                          # unlocked subagents to provide
+    template: ./my-template           # default: built-in template
+    lock_name: subagent.lock          # default: subagent.lock
+    root: ~/.lmspace/vscode-agents    # default: ~/.lmspace/vscode-agents
+
+Relative paths are resolved against the directory holding the spec.
+
+Missing subagents are created with `provision_subagents`. Existing subagents
+are compared with the template through their manifests (see manifest.py),
+and only out-of-date ones are rewritten:
+
+- an unlocked subagent is locked, rewritten and released;
+- a locked subagent is left alone and a pending update is recorded in its
+  manifest, which is applied the next time it is claimed;
+- a subagent without a manifest whose workspace file already matches the
+  template only gets a manifest.
+
+Free subagents beyond `count` are reported but never removed.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+
+from .agent_dispatch import get_subagent_root, release_subagent, try_lock_subagent
+from .manifest import (
+    WORKSPACE_TEMPLATE_NAME,
+    is_current,
+    mark_pending,
+    read_manifest,
+    template_hash,
+    workspace_hash,
+    write_manifest,
+)
+from .pool_state import open_pool_state
+from .provision import DEFAULT_LOCK_NAME, DEFAULT_TEMPLATE_DIR, copy_template_file, provision_subagents
+
+DEFAULT_SPEC_NAME = "pool.yaml"
+
+
+@dataclass(frozen=True)
+class PoolSpec:
+    """Desired state of a subagent pool."""
+
+    count: int
+    template: Path = DEFAULT_TEMPLATE_DIR
+    lock_name: str = DEFAULT_LOCK_NAME
+    root: Optional[Path] = None
+
+
+@dataclass
+class ReconcileResult:
+    """What reconciling a pool did (or would do, in a dry run)."""
+
+    created: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    deferred: list[str] = field(default_factory=list)
+    adopted: list[str] = field(default_factory=list)
+    current: list[str] = field(default_factory=list)
+    extra: list[str] = field(default_factory=list)
+
+
+def load_pool_spec(path: Path) -> PoolSpec:
+    """Read a pool spec from a YAML file.
+
+    Raises:
+        ValueError: If the file is missing or malformed.
+    """
+    try:
+        data = yaml.safe_load(path.read_text(encoding="utf-8"))
+    except OSError as error:
+        raise ValueError(f"cannot read pool spec {path}: {error}") from error
+    except yaml.YAMLError as error:
+        raise ValueError(f"invalid YAML in pool spec {path}: {error}") from error
+    if not isinstance(data, dict):
+        raise ValueError(f"pool spec {path} must be a mapping")
+
+    unknown = set(data) - {"count", "template", "lock_name", "root"}
+    if unknown:
+        raise ValueError(f"unknown keys in pool spec {path}: {', '.join(sorted(unknown))}")
+    count = data.get("count")
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        raise ValueError(f"pool spec {path}: 'count' must be a positive integer")
+
+    base = path.resolve().parent
+
+    def resolve(value: Any) -> Path:
+        resolved = Path(str(value)).expanduser()
+        return resolved if resolved.is_absolute() else base / resolved
+
+    return PoolSpec(
+        count=count,
+        template=resolve(data["template"]) if data.get("template") else DEFAULT_TEMPLATE_DIR,
+        lock_name=str(data.get("lock_name") or DEFAULT_LOCK_NAME),
+        root=resolve(data["root"]) if data.get("root") else None,
+    )
+
+
+def reconcile_pool(spec: PoolSpec, *, dry_run: bool = False) -> ReconcileResult:
+    """Bring a pool in line with its spec, touching only out-of-date subagents."""
+    template = spec.template.expanduser().resolve()
+    root = (spec.root or get_subagent_root()).expanduser().resolve()
+    if not (template / WORKSPACE_TEMPLATE_NAME).is_file():
+        raise ValueError(f"template {template} has no {WORKSPACE_TEMPLATE_NAME}")
+    digest = template_hash(template)
+
+    created, _, _ = provision_subagents(
+        template=template,
+        target_root=root,
+        subagents=spec.count,
+        lock_name=spec.lock_name,
+        force=False,
+        dry_run=dry_run,
+    )
+    result = ReconcileResult(created=[path.name for path in created])
+    if not root.exists():
+        return result
+
+    with open_pool_state(root, lock_name=spec.lock_name) as store:
+        records = store.list_subagents()
+        for record in records:
+            subagent_dir = Path(record["path"])
+            name = subagent_dir.name
+            if name in result.created:
+                continue
+            manifest = read_manifest(subagent_dir)
+            if is_current(manifest, template, digest):
+                result.current.append(name)
+            elif manifest is None and workspace_hash(subagent_dir) == digest:
+                # Provisioned before manifests existed, but already up to date
+                if not dry_run:
+                    write_manifest(subagent_dir, template, digest)
+                result.adopted.append(name)
+            elif dry_run:
+                is_locked = (subagent_dir / spec.lock_name).exists()
+                (result.deferred if is_locked else result.updated).append(name)
+            elif try_lock_subagent(
+                subagent_dir, request_id="reconcile", lock_name=spec.lock_name, store=store
+            ):
+                try:
+                    copy_template_file(
+                        template / WORKSPACE_TEMPLATE_NAME,
+                        subagent_dir / f"{name}.code-workspace",
+                    )
+                    write_manifest(subagent_dir, template, digest)
+                finally:
+                    release_subagent(subagent_dir, lock_name=spec.lock_name, store=store)
+                result.updated.append(name)
+            else:
+                mark_pending(subagent_dir, template, digest)
+                result.deferred.append(name)
+
+        free = sorted(
+            (r for r in records if not (Path(r["path"]) / spec.lock_name).exists()),
+            key=lambda r: r["number"],
+        )
+        result.extra = [r["name"] for r in free[spec.count:]]
+    return result
+
+
+def run_reconcile(
+    *,
+    spec_path: Path,
+    dry_run: bool = False,
+    json_output: bool = False,
+) -> int:
+    """Reconcile the pool described by a spec file and print what changed.
+
+    Returns:
+        Exit code (0 for success, non-zero for failure)
+    """
+    try:
+        spec = load_pool_spec(spec_path)
+        result = reconcile_pool(spec, dry_run=dry_run)
+    except ValueError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    except OSError as error:
+        print(f"error: reconcile failed: {error}", file=sys.stderr)
+        return 1
+
+    if json_output:
+        print(json.dumps({"dry_run": dry_run, **asdict(result)}))
+        return 0
+
+    labels = (
+        ("created", "created subagents"),
+        ("updated", "updated subagents"),
+        ("deferred", "locked subagents to update when next claimed"),
+        ("adopted", "recorded manifests for up-to-date subagents"),
+        ("extra", "subagents beyond the spec's count (left in place)"),
+    )
+    for key, label in labels:
+        names = getattr(result, key)
+        if names:
+            print(f"{label}:")
+            for name in names:
+                print(f"  {name}")
+    if not any(getattr(result, key) for key, _ in labels):
+        print("pool is up to date")
+    elif result.current:
+        print(f"\n{len(result.current)} subagent(s) already up to date")
+    if dry_run:
+        print("dry run complete; no changes were made")
+    return 0
@@ -0,0 +1,191 @@
+"""Content-addressed cache of agent responses for repeated queries.
+
+A sync dispatch (`chat --wait`) with caching enabled looks up the SHA-256 of
+its prompt file contents, attachment contents and query, and of the agent
+templates the pool's subagents were provisioned from; a hit is printed
+straight away without claiming a subagent, and a miss stores the agent's
+final response once it arrives. Caching is opt-in: pass `--cache` (or set
+LMSPACE_RESPONSE_CACHE=1), and `--no-cache` turns it off for one call.
+
+Responses are stored as files under `.lmspace-pool/cache/`, named by their
+key, and indexed in the pool state store with their size, creation time and
+last use. Entries expire after a TTL (LMSPACE_RESPONSE_CACHE_TTL seconds,
+default one day), and the least recently used entries are evicted once the
+cache exceeds LMSPACE_RESPONSE_CACHE_MAX_BYTES (default 64 MiB).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .pool_state import STATE_DIR_NAME, open_pool_state
+
+CACHE_ENV = "LMSPACE_RESPONSE_CACHE"
+CACHE_TTL_ENV = "LMSPACE_RESPONSE_CACHE_TTL"
+CACHE_MAX_BYTES_ENV = "LMSPACE_RESPONSE_CACHE_MAX_BYTES"
+CACHE_DIR_NAME = "cache"
+DEFAULT_CACHE_TTL = 24 * 3600.0
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Bump when the key derivation changes so stale entries are never served
+_KEY_VERSION = b"lmspace-response-cache-v2"
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def cache_enabled(requested: Optional[bool] = None) -> bool:
+    """Resolve whether to cache: an explicit request wins over LMSPACE_RESPONSE_CACHE."""
+    if requested is not None:
+        return requested
+    return os.environ.get(CACHE_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def default_ttl() -> float:
+    """Return the TTL of new lookups in seconds (LMSPACE_RESPONSE_CACHE_TTL)."""
+    return _env_number(CACHE_TTL_ENV, DEFAULT_CACHE_TTL)
+
+
+def _hash_file(digest: "hashlib._Hash", path: Path) -> None:
+    with path.open("rb") as handle:
+        while chunk := handle.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+
+def _hash_part(digest: "hashlib._Hash", label: bytes, path: Path) -> None:
+    # Directories hash every file under them, by relative path
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        digest.update(label + b"\0")
+        if file != path:
+            digest.update(file.relative_to(path).as_posix().encode("utf-8") + b"\0")
+        part = hashlib.sha256()
+        _hash_file(part, file)
+        digest.update(part.digest())
+
+
+def pool_template_digest(subagent_root: Path) -> str:
+    """Return a digest of the agent templates a pool's subagents are set up from.
+
+    Each subagent's manifest records the hash of its template (or of the
+    template it switches to on its next claim); subagents without one use
+    the default template.
+    """
+    from .agent_dispatch import get_default_template_dir
+    from .manifest import read_manifest, template_hash
+
+    with open_pool_state(subagent_root) as store:
+        records = store.list_subagents()
+    hashes = set()
+    default_hash = None
+    for record in records:
+        manifest = read_manifest(Path(record["path"])) or {}
+        recorded = (manifest.get("pending") or manifest).get("template_hash")
+        if recorded is None and default_hash is None:
+            try:
+                default_hash = template_hash(get_default_template_dir())
+            except OSError:
+                default_hash = ""
+        hashes.add(recorded if recorded is not None else default_hash)
+    return hashlib.sha256("\0".join(sorted(hashes)).encode("utf-8")).hexdigest()
+
+
+def cache_key(
+    prompt_file: Path,
+    attachments: Sequence[Path],
+    query: str,
+    *,
+    template_digest: str = "",
+) -> str:
+    """Return the cache key of a dispatch: a hash of what the agent is given.
+
+    `template_digest` (see pool_template_digest) scopes the key to the agent
+    templates that answer it.
+    """
+    digest = hashlib.sha256(_KEY_VERSION + b"\0")
+    _hash_part(digest, b"prompt", prompt_file)
+    for attachment in attachments:
+        _hash_part(digest, b"attachment", attachment)
+    digest.update(b"query\0" + query.encode("utf-8"))
+    digest.update(b"template\0" + template_digest.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Response cache of one subagent pool."""
+
+    def __init__(
+        self,
+        subagent_root: Path,
+        *,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.subagent_root = subagent_root
+        self.directory = subagent_root / STATE_DIR_NAME / CACHE_DIR_NAME
+        self.ttl = default_ttl() if ttl is None else ttl
+        if max_bytes is None:
+            max_bytes = int(_env_number(CACHE_MAX_BYTES_ENV, DEFAULT_CACHE_MAX_BYTES))
+        self.max_bytes = max_bytes
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.md"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached response file for `key`, or None on a miss.
+
+        Expired entries are dropped; a hit becomes the most recently used.
+        """
+        now = time.time()
+        with open_pool_state(self.subagent_root) as store:
+            with store.transaction() as conn:
+                row = conn.execute(
+                    "SELECT created_at FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                path = self.path_for(key)
+                if now - row["created_at"] > self.ttl or not path.is_file():
+                    conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                    path.unlink(missing_ok=True)
+                    return None
+                conn.execute("UPDATE response_cache SET last_used_at = ? WHERE key = ?", (now, key))
+        return path
+
+    def put(self, key: str, response_file: Path) -> None:
+        """Store a copy of `response_file` under `key`, then evict down to max_bytes."""
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staged = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(response_file, staged)
+        size = staged.stat().st_size
+        now = time.time()
+        with open_pool_state(self.subagent_root) as store:
+            with store.transaction() as conn:
+                os.replace(staged, path)
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, size, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, size, now, now),
+                )
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) AS total FROM response_cache"
+                ).fetchone()["total"]
+                if total > self.max_bytes:
+                    for row in conn.execute(
+                        "SELECT key, size FROM response_cache ORDER BY last_used_at"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM response_cache WHERE key = ?", (row["key"],))
+                        self.path_for(row["key"]).unlink(missing_ok=True)
+                        total -= row["size"]
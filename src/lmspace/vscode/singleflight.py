@@ -0,0 +1,258 @@
+"""Single-flight coalescing of identical in-flight dispatches.
+
+When several callers submit the same prompt file, attachments and query at
+once (a batch with repeated jobs, or fan-outs from several processes), only
+the first claims a subagent. Later duplicates attach to its response file
+and return the same answer.
+
+The registry of in-flight requests is a table in the pool state store,
+keyed on the same content hash as the response cache. A leader registers
+itself before claiming, publishes its subagent and response file once the
+chat has been launched, and is removed when the subagent is released (sync
+finish, `lmspace code unlock`, the reaper) or when the dispatch fails.
+Duplicates that arrive before the leader has published wait for it, for up
+to JOIN_TIMEOUT seconds; if the leader fails instead, one of them takes
+over. A duplicate attached to a published leader gives up when the leader
+leaves the registry without a response (or when its own wait times out)
+and dispatches the request itself.
+
+Coalescing hashes the prompt file and every attachment before the claim, so
+it is opt-in like the response cache: set LMSPACE_SINGLE_FLIGHT=1 to turn
+it on. Without it every request gets its own subagent.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from .pool_state import DEFAULT_LOCK_NAME, open_pool_state, read_lock_file
+from .tracing import set_attribute
+
+SINGLE_FLIGHT_ENV = "LMSPACE_SINGLE_FLIGHT"
+JOIN_POLL_MIN_INTERVAL = 0.02
+JOIN_POLL_MAX_INTERVAL = 0.5
+# Seconds a duplicate waits for an unpublished leader before dispatching on its own
+JOIN_TIMEOUT = 60.0
+SHARED_WAIT_SLICE = 1.0
+
+T = TypeVar("T")
+
+
+def single_flight_enabled() -> bool:
+    """Return True if LMSPACE_SINGLE_FLIGHT turns coalescing on."""
+    return os.environ.get(SINGLE_FLIGHT_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class SingleFlight:
+    """Membership of one dispatch in the pool's in-flight registry.
+
+    `fingerprint` is the dispatch's `response_cache.cache_key`. Use as a
+    context manager around claiming and launching. On entry the
+    dispatch either becomes the leader for its fingerprint (`leader` stays
+    None) or attaches to the request already in flight, whose registry
+    entry is then available as `leader`. A leader that exits without
+    calling `keep` is removed from the registry. If the request in flight
+    has not published within `join_timeout` seconds, `leader` stays None
+    without registering, and the dispatch runs on its own.
+    """
+
+    def __init__(
+        self,
+        subagent_root: Path,
+        fingerprint: str,
+        *,
+        request_id: str,
+        lock_name: str = DEFAULT_LOCK_NAME,
+        join_timeout: float = JOIN_TIMEOUT,
+    ) -> None:
+        self.subagent_root = subagent_root
+        self.fingerprint = fingerprint
+        self.request_id = request_id
+        self.lock_name = lock_name
+        self.join_timeout = join_timeout
+        self.leader: Optional[dict[str, Any]] = None
+        self._kept = False
+
+    def __enter__(self) -> "SingleFlight":
+        interval = JOIN_POLL_MIN_INTERVAL
+        deadline = time.monotonic() + self.join_timeout
+        with open_pool_state(self.subagent_root, lock_name=self.lock_name) as store:
+            while True:
+                with store.transaction() as conn:
+                    entry = conn.execute(
+                        "SELECT * FROM inflight WHERE fingerprint = ?", (self.fingerprint,)
+                    ).fetchone()
+                    if entry is not None and self._leader_gone(entry):
+                        conn.execute("DELETE FROM inflight WHERE fingerprint = ?", (self.fingerprint,))
+                        entry = None
+                    if entry is None:
+                        conn.execute(
+                            "INSERT INTO inflight (fingerprint, request_id, pid, host, started_at) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (
+                                self.fingerprint,
+                                self.request_id,
+                                os.getpid(),
+                                socket.gethostname(),
+                                datetime.now(timezone.utc).isoformat(),
+                            ),
+                        )
+                        return self
+                    if entry["response_file"] is not None:
+                        self.leader = dict(entry)
+                        return self
+                if time.monotonic() >= deadline:
+                    # Still queued or launching; publish and exit only touch this request's entry
+                    return self
+                # The leader is still claiming; it publishes or fails shortly
+                time.sleep(interval)
+                interval = min(interval * 2, JOIN_POLL_MAX_INTERVAL)
+
+    def _leader_gone(self, entry: sqlite3.Row) -> bool:
+        if entry["subagent"] is not None:
+            lease = read_lock_file(self.subagent_root / entry["subagent"] / self.lock_name)
+            return lease is None or lease.get("request_id") != entry["request_id"]
+        # Not yet published: the leader is gone only if its process exited
+        if entry["host"] != socket.gethostname():
+            return False
+        from .windows import process_alive
+
+        return process_alive(entry["pid"]) is False
+
+    def publish(self, subagent_dir: Path, response_file: Path) -> None:
+        """Let duplicates attach to the leader's subagent and response file.
+
+        Call once the chat has been launched, so duplicates only attach to
+        a request that can answer.
+        """
+        with open_pool_state(self.subagent_root, lock_name=self.lock_name) as store:
+            with store.transaction() as conn:
+                conn.execute(
+                    "UPDATE inflight SET subagent = ?, response_file = ? WHERE request_id = ?",
+                    (subagent_dir.name, str(response_file), self.request_id),
+                )
+
+    def keep(self) -> None:
+        """Leave the entry registered after exit; releasing the subagent removes it."""
+        self._kept = True
+
+    def __exit__(self, *exc_info: object) -> None:
+        if self.leader is not None or self._kept:
+            return
+        with open_pool_state(self.subagent_root, lock_name=self.lock_name) as store:
+            with store.transaction() as conn:
+                conn.execute("DELETE FROM inflight WHERE request_id = ?", (self.request_id,))
+
+
+def leader_in_flight(subagent_root: Path, leader: dict[str, Any]) -> bool:
+    """Return True while the request `leader` describes is in the registry."""
+    with open_pool_state(subagent_root) as store:
+        rows = store.query("SELECT 1 FROM inflight WHERE request_id = ?", (leader["request_id"],))
+    return bool(rows)
+
+
+def shared_response(subagent_root: Path, leader: dict[str, Any]) -> Optional[str]:
+    """Return the response of the request `leader` describes, if it has one yet.
+
+    Once the leader releases its subagent, the next claim archives and
+    clears the response file, so the archive is consulted when the file is
+    gone.
+    """
+    from .agent_dispatch import read_response_file
+    from .history import get_record, response_text
+
+    response_file = Path(leader["response_file"])
+    if response_file.exists():
+        try:
+            return read_response_file(response_file, max_attempts=1)
+        except FileNotFoundError:
+            pass
+    record = get_record(subagent_root, leader["request_id"])
+    return response_text(record) if record is not None else None
+
+
+def wait_for_shared_response(
+    subagent_root: Path,
+    leader: dict[str, Any],
+    *,
+    timeout: Optional[float] = None,
+) -> Optional[str]:
+    """Wait for the response of the request `leader` describes and return it.
+
+    Returns None on timeout, or once the leader has left the registry
+    without a response (its dispatch failed or was abandoned).
+    """
+    from .agent_dispatch import wait_for_response_file
+
+    response_file = Path(leader["response_file"])
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        # Checked first: a leader that leaves with a response has written it by then
+        in_flight = leader_in_flight(subagent_root, leader)
+        wait = SHARED_WAIT_SLICE if in_flight else 0.0
+        if deadline is not None:
+            wait = min(wait, max(deadline - time.monotonic(), 0.0))
+        wait_for_response_file(response_file, timeout=wait)
+        response = shared_response(subagent_root, leader)
+        if response is not None or not in_flight:
+            return response
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+
+
+def dispatch_fingerprint(
+    subagent_root: Path, prompt_file: Path, attachments: Sequence[Path], query: str
+) -> str:
+    """Return the registry key of a dispatch (its response cache key)."""
+    from .response_cache import cache_key, pool_template_digest
+
+    return cache_key(
+        prompt_file,
+        attachments,
+        query,
+        template_digest=pool_template_digest(subagent_root),
+    )
+
+
+def run_single_flight(
+    subagent_root: Path,
+    fingerprint: Callable[[], str],
+    *,
+    request_id: str,
+    lead: Callable[..., T],
+    follow: Callable[[dict[str, Any]], Optional[T]],
+    keep: Callable[[T], bool] = lambda result: False,
+) -> T:
+    """Run a dispatch, coalescing it with an identical one in flight.
+
+    `lead(on_launched=...)` claims a subagent and runs the dispatch, calling
+    `on_launched(subagent_dir, response_file)` (if not None) once the chat
+    has been launched. If the request is already in flight, `follow(leader)`
+    attaches to it instead; when it returns None (the leader failed, or the
+    wait timed out), the dispatch runs on its own, unregistered. A
+    leader stays registered after `lead` returns if `keep(result)` is true,
+    until its subagent is released.
+
+    Without LMSPACE_SINGLE_FLIGHT this is `lead(on_launched=None)`, and
+    the `fingerprint` callable is never called.
+    """
+    if not single_flight_enabled():
+        return lead(on_launched=None)
+    with SingleFlight(subagent_root, fingerprint(), request_id=request_id) as flight:
+        if flight.leader is None:
+            result = lead(on_launched=flight.publish)
+            if keep(result):
+                flight.keep()
+            return result
+    set_attribute("lmspace.coalesced_with", flight.leader["request_id"])
+    result = follow(flight.leader)
+    if result is not None:
+        return result
+    set_attribute("lmspace.coalesce_abandoned", True)
+    return lead(on_launched=None)
@@ -0,0 +1,237 @@
+"""Per-phase latency tracing for dispatches.
+
+Each dispatch is one trace, keyed by its request id (also written into the
+request's `req.md`), made of nested spans for the phases of the dispatch:
+claiming a subagent, preparing its directory, probing VS Code windows,
+opening the window, waiting for readiness, launching the chat and waiting
+for the agent's answer.
+
+Spans are buffered in memory and written when the dispatch finishes, as one
+line of OTLP/JSON (an ExportTraceServiceRequest, the format of the
+OpenTelemetry collector's file exporter) appended to
+`<subagent root>/.lmspace-pool/traces.jsonl`. That is a single small append
+per dispatch, so tracing stays on by default. Set LMSPACE_TRACE_FILE to
+write elsewhere, or LMSPACE_TRACE=0 to turn tracing off.
+
+Once the file would grow past LMSPACE_TRACE_MAX_BYTES (default 32 MiB) it
+is renamed to `traces.jsonl.1`, replacing the previous one, and a new file
+is started; 0 never rotates.
+
+Code outside a trace can call `span` freely: without an active trace on the
+current thread it does nothing.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+TRACE_ENV = "LMSPACE_TRACE"
+TRACE_FILE_ENV = "LMSPACE_TRACE_FILE"
+TRACE_FILE_NAME = "traces.jsonl"
+TRACE_MAX_BYTES_ENV = "LMSPACE_TRACE_MAX_BYTES"
+DEFAULT_TRACE_MAX_BYTES = 32 * 1024 * 1024
+SERVICE_NAME = "lmspace"
+SCOPE_NAME = "lmspace.vscode"
+
+# OTLP enum values
+_SPAN_KIND_INTERNAL = 1
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+_local = threading.local()
+
+
+class Span:
+    """One timed phase of a traced dispatch."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: dict[str, Any]) -> None:
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self, trace_id: str) -> dict[str, Any]:
+        span: dict[str, Any] = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": (
+                {"code": _STATUS_ERROR, "message": self.error}
+                if self.error is not None
+                else {"code": _STATUS_OK}
+            ),
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _Trace:
+    def __init__(self, trace_id: str, trace_file: Path) -> None:
+        self.trace_id = trace_id
+        self.trace_file = trace_file
+        self.spans: list[Span] = []
+        self.stack: list[Span] = []
+
+
+def _otlp_attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def tracing_enabled() -> bool:
+    """Return whether dispatches are traced (LMSPACE_TRACE=0 turns it off)."""
+    return os.environ.get(TRACE_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def trace_file_for(subagent_root: Path) -> Path:
+    """Return the trace file dispatches in `subagent_root` append to."""
+    configured = os.environ.get(TRACE_FILE_ENV)
+    if configured:
+        return Path(configured).expanduser()
+    return subagent_root / ".lmspace-pool" / TRACE_FILE_NAME
+
+
+def trace_max_bytes() -> int:
+    """Return the size at which the trace file is rotated (0 never rotates)."""
+    try:
+        return int(os.environ.get(TRACE_MAX_BYTES_ENV, DEFAULT_TRACE_MAX_BYTES))
+    except ValueError:
+        return DEFAULT_TRACE_MAX_BYTES
+
+
+def rotated_trace_file(trace_file: Path) -> Path:
+    """Return where `trace_file` is moved when it is rotated."""
+    return trace_file.with_name(f"{trace_file.name}.1")
+
+
+def _current() -> Optional[_Trace]:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace(name: str, *, request_id: str, trace_file: Path, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Trace a dispatch: open its root span and write every span on exit.
+
+    `request_id` (a 32-digit hex uuid) becomes the OTLP trace id. Yields the
+    root span, or None when tracing is disabled or a trace is already active
+    on this thread (its spans then join the outer trace).
+    """
+    if not tracing_enabled() or _current() is not None:
+        with span(name, **attributes) as root:
+            yield root
+        return
+
+    active = _Trace(request_id, trace_file)
+    _local.trace = active
+    try:
+        with span(name, **{"lmspace.request_id": request_id, **attributes}) as root:
+            yield root
+    finally:
+        _local.trace = None
+        _export(active)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a phase as a child of the current span; a no-op outside a trace."""
+    active = _current()
+    if active is None:
+        yield None
+        return
+
+    current = Span(name, active.stack[-1].span_id if active.stack else None, attributes)
+    active.stack.append(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        active.stack.pop()
+        active.spans.append(current)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute on the innermost active span, if any."""
+    active = _current()
+    if active is not None and active.stack:
+        active.stack[-1].set_attribute(key, value)
+
+
+def _export(active: _Trace) -> None:
+    record = {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        _otlp_attribute("service.name", SERVICE_NAME),
+                        _otlp_attribute("process.pid", os.getpid()),
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": SCOPE_NAME},
+                        "spans": [s.to_otlp(active.trace_id) for s in active.spans],
+                    }
+                ],
+            }
+        ]
+    }
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+    try:
+        active.trace_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = _open_for_append(active.trace_file, len(line))
+        try:
+            # One O_APPEND write per trace keeps concurrent writers' lines whole
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        # Tracing must never fail a dispatch
+        pass
+
+
+def _open_for_append(trace_file: Path, size: int) -> int:
+    """Open the trace file for appending `size` bytes, rotating it first if full."""
+    fd = os.open(trace_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    limit = trace_max_bytes()
+    if limit <= 0:
+        return fd
+    opened = os.fstat(fd)
+    if opened.st_size == 0 or opened.st_size + size <= limit:
+        return fd
+    os.close(fd)
+    try:
+        # Another writer may have rotated it already; only move the file that was full
+        if os.stat(trace_file).st_ino == opened.st_ino:
+            os.replace(trace_file, rotated_trace_file(trace_file))
+    except FileNotFoundError:
+        pass
+    return os.open(trace_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
@@ -0,0 +1,301 @@
+"""Wait for files to appear without per-waiter polling loops.
+
+A single `FileWatcher` serves every waiter in the process. On Linux it uses
+inotify on the parent directories of the watched files, so an agent's rename
+of `*_res.tmp.md` to `*_res.md` is noticed within milliseconds. Elsewhere, or
+when inotify is unavailable, one background thread polls all watched paths
+with an adaptive interval that resets whenever a waiter is added and backs
+off while nothing changes.
+
+Set `LMSPACE_WATCHER=poll` to force the polling backend.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import os
+import select
+import struct
+import sys
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+POLL_MIN_INTERVAL = 0.005
+POLL_MAX_INTERVAL = 0.5
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+# IN_CREATE is deliberately not watched: a file is only complete once it has
+# been closed after writing or renamed into place
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Waiter:
+    """A single pending wait on a path."""
+
+    __slots__ = ("path", "callback")
+
+    def __init__(self, path: Path, callback: Callable[[], None]) -> None:
+        self.path = path
+        self.callback = callback
+
+
+class FileWatcher(ABC):
+    """Process-wide service that wakes waiters when files appear."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: dict[Path, list[_Waiter]] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name=f"lmspace-{type(self).__name__}", daemon=True
+            )
+            self._thread.start()
+
+    @abstractmethod
+    def _run(self) -> None:
+        """Body of the watcher thread: wake waiters as their files appear."""
+
+    def _on_register(self, path: Path) -> None:
+        """Hook called (under the lock) for each waiter added on `path`."""
+
+    def _on_unregister(self, path: Path) -> None:
+        """Hook called (under the lock) for each waiter removed from `path`."""
+
+    def _register(self, path: Path, callback: Callable[[], None]) -> _Waiter:
+        waiter = _Waiter(path, callback)
+        with self._lock:
+            self._on_register(path)
+            self._waiters.setdefault(path, []).append(waiter)
+            self._ensure_thread()
+        # Checked after the watch is in place so a file created in between is not missed
+        if path.exists():
+            self._fire(path)
+        return waiter
+
+    def _unregister(self, waiter: _Waiter) -> None:
+        with self._lock:
+            waiters = self._waiters.get(waiter.path)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[waiter.path]
+                self._on_unregister(waiter.path)
+
+    def _fire(self, path: Path) -> None:
+        with self._lock:
+            waiters = self._waiters.pop(path, [])
+            for _ in waiters:
+                self._on_unregister(path)
+        for waiter in waiters:
+            waiter.callback()
+
+    def _recheck_all(self) -> None:
+        with self._lock:
+            paths = list(self._waiters)
+        for path in paths:
+            if path.exists():
+                self._fire(path)
+
+    @contextmanager
+    def watch(self, path: Path) -> Iterator[threading.Event]:
+        """Watch `path` for the duration of the block.
+
+        The yielded event is set once the file exists. Useful when the file
+        is produced by something started inside the block, so it cannot be
+        created before the watch is in place.
+        """
+        event = threading.Event()
+        waiter = self._register(path, event.set)
+        try:
+            yield event
+        finally:
+            self._unregister(waiter)
+
+    def wait_for(self, path: Path, timeout: Optional[float] = None) -> bool:
+        """Block until `path` exists.
+
+        Returns True once it exists, False if the timeout expires first.
+        """
+        with self.watch(path) as event:
+            return event.wait(timeout)
+
+    async def wait_for_async(self, path: Path, timeout: Optional[float] = None) -> bool:
+        """Await until `path` exists without blocking the event loop.
+
+        Returns True once it exists, False if the timeout expires first.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._register(path, wake)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._unregister(waiter)
+
+
+class PollingWatcher(FileWatcher):
+    """Portable backend: one thread polls every watched path.
+
+    The interval starts at POLL_MIN_INTERVAL whenever a waiter is added and
+    doubles up to POLL_MAX_INTERVAL while nothing appears.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_interval: float = POLL_MIN_INTERVAL,
+        max_interval: float = POLL_MAX_INTERVAL,
+    ) -> None:
+        super().__init__()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._wakeup = threading.Event()
+
+    def _on_register(self, path: Path) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        interval = self.min_interval
+        while True:
+            with self._lock:
+                paths = list(self._waiters)
+            fired = [path for path in paths if path.exists()]
+            for path in fired:
+                self._fire(path)
+            interval = self.min_interval if fired else min(interval * 2, self.max_interval)
+            if self._wakeup.wait(interval):
+                self._wakeup.clear()
+                interval = self.min_interval
+
+
+class InotifyWatcher(FileWatcher):
+    """Linux backend: inotify watches on the parent directory of each path.
+
+    Directories that cannot be watched (for example because they do not
+    exist yet) are re-checked every POLL_MAX_INTERVAL seconds instead.
+    """
+
+    _UNWATCHED = -1
+
+    def __init__(self) -> None:
+        super().__init__()
+        # libc is already loaded into the interpreter; find_library would spawn a subprocess
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wake_read, self._wake_write = os.pipe()
+        self._dir_watches: dict[Path, int] = {}
+        self._dir_refs: dict[Path, int] = {}
+        self._wd_dirs: dict[int, Path] = {}
+
+    def _on_register(self, path: Path) -> None:
+        directory = path.parent
+        if directory not in self._dir_watches:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                wd = self._UNWATCHED
+                os.write(self._wake_write, b"\0")
+            else:
+                self._wd_dirs[wd] = directory
+            self._dir_watches[directory] = wd
+        self._dir_refs[directory] = self._dir_refs.get(directory, 0) + 1
+
+    def _on_unregister(self, path: Path) -> None:
+        directory = path.parent
+        refs = self._dir_refs.get(directory, 0) - 1
+        if refs > 0:
+            self._dir_refs[directory] = refs
+            return
+        self._dir_refs.pop(directory, None)
+        wd = self._dir_watches.pop(directory, self._UNWATCHED)
+        if wd != self._UNWATCHED:
+            self._wd_dirs.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                polling = self._UNWATCHED in self._dir_watches.values()
+            readable, _, _ = select.select(
+                [self._fd, self._wake_read], [], [], POLL_MAX_INTERVAL if polling else None
+            )
+            if self._wake_read in readable:
+                os.read(self._wake_read, 4096)
+            if polling:
+                self._recheck_all()
+            if self._fd in readable:
+                self._read_events()
+
+    def _read_events(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        recheck = False
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & (_IN_Q_OVERFLOW | _IN_IGNORED):
+                recheck = True
+                continue
+            with self._lock:
+                directory = self._wd_dirs.get(wd)
+            if directory is not None and name:
+                self._fire(directory / os.fsdecode(name))
+        if recheck:
+            self._recheck_all()
+
+
+_watcher: Optional[FileWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_file_watcher() -> FileWatcher:
+    """Return the process-wide file watcher, creating it on first use."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = _create_watcher()
+        return _watcher
+
+
+def _create_watcher() -> FileWatcher:
+    if sys.platform.startswith("linux") and os.environ.get("LMSPACE_WATCHER") != "poll":
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher()
+
+
+def wait_for_file(path: Path, timeout: Optional[float] = None) -> bool:
+    """Block until `path` exists using the shared watcher.
+
+    Returns True once it exists, False if the timeout expires first.
+    """
+    return get_file_watcher().wait_for(path, timeout)
+
@@ -0,0 +1,200 @@
+"""Registry of open subagent VS Code windows.
+
+`code --status` can take seconds on a busy host, so its answer is cached in
+the pool state store: one row per subagent window with the PID of its
+renderer process, when a probe last saw it and when it last answered a
+readiness check. A cached window whose process is still alive is trusted
+without probing again; the probe only runs once the snapshot is older than
+the TTL and the cache cannot answer.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from .pool_state import PoolStateStore
+
+DEFAULT_TTL = 60.0
+STATUS_TIMEOUT = 10
+
+# e.g. "    0    98   12346     window [1] (file.md - subagent-1 (Workspace) - Visual Studio Code)"
+_WINDOW_LINE = re.compile(r"^\s*\d+\s+\d+\s+(?P<pid>\d+)\s+window \[\d+\] \((?P<title>.*)\)\s*$")
+_WORKSPACE_SUFFIX = " (Workspace)"
+
+
+@dataclass(frozen=True)
+class WindowRecord:
+    """Cached state of one subagent window."""
+
+    name: str
+    pid: Optional[int]
+    pid_start: Optional[str]
+    seen_at: Optional[float]
+    ready_at: Optional[float]
+
+
+def parse_code_status(output: str) -> dict[str, int]:
+    """Map workspace names to window PIDs from `code --status` output.
+
+    Names are matched exactly, so `subagent-1` never matches `subagent-10`.
+    """
+    windows: dict[str, int] = {}
+    for line in output.splitlines():
+        match = _WINDOW_LINE.match(line)
+        if not match:
+            continue
+        # The title is "[<file> - ]<workspace> (Workspace) - <app name>"
+        for segment in match.group("title").split(" - "):
+            if segment.endswith(_WORKSPACE_SUFFIX):
+                windows[segment[: -len(_WORKSPACE_SUFFIX)]] = int(match.group("pid"))
+                break
+    return windows
+
+
+def probe_open_windows() -> Optional[dict[str, int]]:
+    """Run `code --status` and return the open workspace windows.
+
+    Returns None if VS Code could not be queried.
+    """
+    from .launcher import get_launcher
+    from .tracing import span
+
+    try:
+        with span("window.probe"):
+            output = get_launcher().status(timeout=STATUS_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return parse_code_status(output)
+
+
+def process_start_time(pid: int) -> Optional[str]:
+    """Return the start time of a process from /proc, or None if unavailable.
+
+    Stored alongside a PID so a recycled PID is not mistaken for the window.
+    """
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name start at field 3; starttime is field 22
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+def process_alive(pid: int, start_time: Optional[str] = None) -> Optional[bool]:
+    """Check whether a process is still running.
+
+    Returns None when liveness cannot be determined on this platform.
+    """
+    if sys.platform == "win32":
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows
+        return None
+    if Path("/proc/self/stat").exists():
+        current = process_start_time(pid)
+        return current is not None and (start_time is None or current == start_time)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WindowRegistry:
+    """Cached view of which subagent windows are open and ready."""
+
+    def __init__(
+        self,
+        store: PoolStateStore,
+        *,
+        ttl: float = DEFAULT_TTL,
+        probe: Optional[Callable[[], Optional[dict[str, int]]]] = None,
+    ) -> None:
+        self.store = store
+        self.ttl = ttl
+        self._probe = probe or probe_open_windows
+
+    def _refreshed_at(self) -> float:
+        rows = self.store.query("SELECT value FROM meta WHERE key = 'windows_refreshed_at'")
+        return float(rows[0]["value"]) if rows else 0.0
+
+    def lookup(self, name: str) -> Optional[WindowRecord]:
+        """Return the cached record for a window without probing."""
+        rows = self.store.query("SELECT * FROM windows WHERE name = ?", (name,))
+        return WindowRecord(**dict(rows[0])) if rows else None
+
+    def records(self) -> list[WindowRecord]:
+        """Return all cached window records."""
+        return [WindowRecord(**dict(row)) for row in self.store.query("SELECT * FROM windows")]
+
+    def refresh(self) -> bool:
+        """Replace the cache with a fresh `code --status` snapshot.
+
+        Returns False (leaving the cache untouched) if the probe failed.
+        """
+        windows = self._probe()
+        if windows is None:
+            return False
+        now = time.time()
+        with self.store.transaction() as conn:
+            previous = {row["name"]: row for row in conn.execute("SELECT * FROM windows")}
+            conn.execute("DELETE FROM windows")
+            for name, pid in windows.items():
+                before = previous.get(name)
+                # Readiness only carries over while it is the same window process
+                ready_at = before["ready_at"] if before is not None and before["pid"] in (None, pid) else None
+                conn.execute(
+                    "INSERT INTO windows (name, pid, pid_start, seen_at, ready_at) VALUES (?, ?, ?, ?, ?)",
+                    (name, pid, process_start_time(pid), now, ready_at),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('windows_refreshed_at', ?)",
+                (str(now),),
+            )
+        return True
+
+    def is_open(self, name: str, *, refresh: bool = True) -> bool:
+        """Return True if the named workspace window is open.
+
+        Answers from the cache when possible. With refresh=False the probe
+        is never run and unknown windows are reported as closed.
+        """
+        now = time.time()
+        record = self.lookup(name)
+        if record is not None:
+            alive = process_alive(record.pid, record.pid_start) if record.pid else None
+            if alive:
+                return True
+            if alive is False:
+                self.forget(name)
+                return False
+            last_seen = max(record.seen_at or 0.0, record.ready_at or 0.0)
+            if now - last_seen < self.ttl:
+                return True
+        elif now - self._refreshed_at() < self.ttl:
+            return False
+
+        if not refresh or not self.refresh():
+            return record is not None
+        return self.lookup(name) is not None
+
+    def mark_ready(self, name: str) -> None:
+        """Record that the window answered a readiness check just now."""
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT INTO windows (name, ready_at) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET ready_at = excluded.ready_at",
+                (name, time.time()),
+            )
+
+    def forget(self, name: str) -> None:
+        """Drop a window from the cache (e.g., after it was closed)."""
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM windows WHERE name = ?", (name,))
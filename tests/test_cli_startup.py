@@ -0,0 +1,102 @@
+"""Startup budget for the `lmspace` entry point.
+
+Agents run `lmspace code unlock` inside every request, so its startup sits on
+the critical path. These tests fail when the command starts importing
+modules it does not need or grows past its import or wall-time budget.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+
+import lmspace
+
+# Modules `lmspace code unlock` must never import
+FORBIDDEN_MODULES = (
+    "asyncio",
+    "concurrent.futures",
+    "dataclasses",
+    "importlib.metadata",
+    "openai",
+    "pydantic",
+    "tenacity",
+    "yaml",
+    "lmspace.vscode.daemon",
+    "lmspace.vscode.windows",
+)
+# Modules imported on top of a bare interpreter (81 when the budget was set)
+IMPORT_BUDGET = 100
+WALL_TIME_BUDGET = float(os.environ.get("LMSPACE_STARTUP_BUDGET", "2.0"))
+
+_SCRIPT = textwrap.dedent(
+    """
+    import json, sys
+    before = set(sys.modules)
+    from lmspace.cli import main
+    code = main(["code", "unlock", "--all", "--dry-run", "--target-root", sys.argv[1]])
+    print(json.dumps({"exit": code, "imported": sorted(set(sys.modules) - before)}))
+    """
+)
+
+
+def _run_unlock(tmp_path: Path) -> tuple[dict, float]:
+    env = dict(os.environ, PYTHONPATH=str(Path(lmspace.__file__).parent.parent))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _SCRIPT, str(tmp_path)],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+    return json.loads(result.stdout.splitlines()[-1]), elapsed
+
+
+def test_unlock_imports_stay_within_budget(tmp_path: Path) -> None:
+    """Test that `code unlock` imports no heavy or unrelated modules."""
+    report, _ = _run_unlock(tmp_path)
+
+    assert report["exit"] == 0
+    imported = set(report["imported"])
+    assert not {m for m in FORBIDDEN_MODULES if m in imported}
+    assert len(imported) <= IMPORT_BUDGET, sorted(imported)
+
+
+def test_unlock_wall_time_within_budget(tmp_path: Path) -> None:
+    """Test that `code unlock` runs within the wall-time budget."""
+    # Best of three to keep a cold disk cache from failing the run
+    elapsed = min(_run_unlock(tmp_path)[1] for _ in range(3))
+
+    assert elapsed <= WALL_TIME_BUDGET, f"{elapsed:.3f}s > {WALL_TIME_BUDGET}s"
+
+
+def test_code_parsers_import_no_command_modules() -> None:
+    """Test that building the `lmspace code` parsers leaves the command modules unloaded."""
+    script = textwrap.dedent(
+        """
+        import argparse, json, sys
+        from lmspace.vscode.cli import add_parsers
+        add_parsers(argparse.ArgumentParser())
+        print(json.dumps(sorted(sys.modules)))
+        """
+    )
+    env = dict(os.environ, PYTHONPATH=str(Path(lmspace.__file__).parent.parent))
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, env=env, check=True
+    )
+    imported = set(json.loads(result.stdout))
+
+    assert not imported & {
+        "sqlite3",
+        "lmspace.vscode.agent_dispatch",
+        "lmspace.vscode.launcher",
+        "lmspace.vscode.provision",
+        "lmspace.vscode.tracing",
+    }
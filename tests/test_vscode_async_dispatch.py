@@ -0,0 +1,137 @@
+"""Tests for the asyncio dispatch API."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import read_subagent_lock
+from lmspace.vscode.async_dispatch import (
+    DispatchError,
+    as_completed,
+    dispatch_agent_async,
+)
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path) -> Path:
+    """Create a subagent root with three unlocked subagents."""
+    root = tmp_path / "agents"
+    for i in range(1, 4):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    return root
+
+
+@pytest.fixture
+def prompt_file(tmp_path: Path) -> Path:
+    path = tmp_path / "expert.prompt.md"
+    path.write_text("# Expert\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def answer_delays(monkeypatch: pytest.MonkeyPatch) -> dict[str, float]:
+    """Replace the VS Code launch with an agent answering after a per-query delay."""
+    delays: dict[str, float] = {}
+
+    def fake_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        query = sudolang_prompt.split("\n")[1]
+        final = re.search(r"-Destination '(.+?)'", sudolang_prompt).group(1)
+
+        def answer() -> None:
+            Path(final).write_text(f"answer to {query}", encoding="utf-8")
+
+        threading.Timer(delays.get(query, 0.0), answer).start()
+        return True
+
+    monkeypatch.setattr("lmspace.vscode.async_dispatch._launch_vscode_with_chat", fake_launch)
+    return delays
+
+
+@pytest.mark.asyncio
+async def test_dispatch_agent_async_returns_result(
+    subagent_root: Path,
+    prompt_file: Path,
+    answer_delays: dict[str, float],
+) -> None:
+    """Test that awaiting a handle returns the response and releases the subagent."""
+    handle = await dispatch_agent_async("q1", prompt_file, subagent_root=subagent_root)
+
+    assert handle.subagent_name == "subagent-1"
+    assert read_subagent_lock(handle.subagent_dir)["request_id"] == handle.request_id
+
+    result = await handle.result(timeout=5.0)
+
+    assert result.response == "answer to q1"
+    assert result.subagent_name == "subagent-1"
+    assert result.response_file == handle.response_file
+    assert read_subagent_lock(handle.subagent_dir) is None
+
+
+@pytest.mark.asyncio
+async def test_as_completed_yields_in_completion_order(
+    subagent_root: Path,
+    prompt_file: Path,
+    answer_delays: dict[str, float],
+) -> None:
+    """Test that handles are yielded as their responses arrive."""
+    answer_delays.update({"slow": 0.3, "medium": 0.15, "fast": 0.0})
+    handles = [
+        await dispatch_agent_async(q, prompt_file, subagent_root=subagent_root)
+        for q in ("slow", "medium", "fast")
+    ]
+
+    order = [(await h.result()).response async for h in as_completed(handles)]
+
+    assert order == ["answer to fast", "answer to medium", "answer to slow"]
+
+
+@pytest.mark.asyncio
+async def test_result_timeout_keeps_watching(
+    subagent_root: Path,
+    prompt_file: Path,
+    answer_delays: dict[str, float],
+) -> None:
+    """Test that a result timeout does not abandon the dispatch."""
+    answer_delays["late"] = 0.2
+    handle = await dispatch_agent_async("late", prompt_file, subagent_root=subagent_root)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await handle.result(timeout=0.01)
+
+    assert (await handle.result(timeout=5.0)).response == "answer to late"
+
+
+@pytest.mark.asyncio
+async def test_dispatch_agent_async_pool_exhausted(
+    tmp_path: Path,
+    prompt_file: Path,
+    answer_delays: dict[str, float],
+) -> None:
+    """Test that an exhausted pool raises DispatchError."""
+    with pytest.raises(DispatchError, match="No unlocked subagents"):
+        await dispatch_agent_async("q", prompt_file, subagent_root=tmp_path / "empty")
+
+
+@pytest.mark.asyncio
+async def test_handle_heartbeats_and_hands_lease_back(
+    subagent_root: Path,
+    prompt_file: Path,
+    answer_delays: dict[str, float],
+) -> None:
+    """Test that a handle keeping its subagent heartbeats, then hands the lease back."""
+    answer_delays["q1"] = 0.2
+    handle = await dispatch_agent_async(
+        "q1", prompt_file, subagent_root=subagent_root, release_on_completion=False
+    )
+    assert read_subagent_lock(handle.subagent_dir)["heartbeat"] is True
+
+    await handle.result(timeout=5.0)
+
+    lease = read_subagent_lock(handle.subagent_dir)
+    assert lease["request_id"] == handle.request_id
+    assert lease["heartbeat"] is False
@@ -0,0 +1,113 @@
+"""Tests for the subagent pool autoscaler."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import claim_subagent, read_subagent_lock, try_lock_subagent
+from lmspace.vscode.autoscale import (
+    AutoscaleSettings,
+    Autoscaler,
+    IdleWindow,
+    PoolSnapshot,
+    ScalingDecision,
+    decide,
+)
+
+SETTINGS = AutoscaleSettings(min_windows=1, max_subagents=4, target_idle=1, cooldown=60.0)
+
+
+def _snapshot(**overrides: object) -> PoolSnapshot:
+    values: dict[str, object] = dict(
+        total=2, available=1, locked=1, queue_depth=0, failed_claims=0, open_windows=2, idle_windows=[]
+    )
+    values.update(overrides)
+    return PoolSnapshot(**values)  # type: ignore[arg-type]
+
+
+def test_decide_scales_up_for_demand_within_max() -> None:
+    """Test that queued demand provisions subagents without exceeding the maximum."""
+    decision = decide(_snapshot(available=0, locked=2, queue_depth=5), SETTINGS)
+
+    assert decision.action == "scale_up"
+    # 2 existing + at most 2 new, all of them free
+    assert decision.provision_available == 2
+
+
+def test_decide_closes_long_idle_windows() -> None:
+    """Test that surplus windows idle past the cooldown are closed, highest number first."""
+    idle = [
+        IdleWindow(name="subagent-1", number=1, pid=101, idle_for=600.0),
+        IdleWindow(name="subagent-2", number=2, pid=102, idle_for=600.0),
+        IdleWindow(name="subagent-3", number=3, pid=103, idle_for=10.0),
+    ]
+
+    decision = decide(_snapshot(total=3, available=3, locked=0, open_windows=3, idle_windows=idle), SETTINGS)
+
+    assert decision.action == "scale_down"
+    assert [w.name for w in decision.close] == ["subagent-2", "subagent-1"]
+
+
+def test_decide_holds_after_recent_scale_up() -> None:
+    """Test that windows are not closed within a cooldown of scaling up."""
+    idle = [IdleWindow(name=f"subagent-{i}", number=i, pid=i, idle_for=600.0) for i in (1, 2, 3)]
+    snapshot = _snapshot(total=3, available=3, locked=0, open_windows=3, idle_windows=idle)
+
+    assert decide(snapshot, SETTINGS, since_scale_up=5.0).action == "hold"
+
+
+def test_tick_provisions_on_failed_claims(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that failed claims since the last tick trigger provisioning and are logged."""
+    root = tmp_path / "agents"
+    (root / "subagent-1").mkdir(parents=True)
+    monkeypatch.setattr("lmspace.vscode.windows.probe_open_windows", lambda: {})
+    warmed: list[list[str]] = []
+
+    def fake_warmup(*, subagent_root, subagents, names, dry_run, wait_ready):
+        assert wait_ready and subagents == len(names)
+        warmed.append(names)
+        return 0
+
+    monkeypatch.setattr("lmspace.vscode.autoscale.warmup_subagents", fake_warmup)
+    autoscaler = Autoscaler(root, AutoscaleSettings(max_subagents=3, target_idle=0))
+
+    assert autoscaler.tick().action == "hold"
+    assert claim_subagent(root) is not None
+    assert claim_subagent(root) is None
+
+    decision = autoscaler.tick()
+
+    assert decision.action == "scale_up"
+    assert (root / "subagent-2").is_dir()
+    assert warmed == [["subagent-2"]]
+    entry = json.loads((root / ".lmspace-pool" / "autoscale.jsonl").read_text().splitlines()[-1])
+    assert entry["action"] == "scale_up"
+    assert entry["snapshot"]["failed_claims"] == 1
+
+
+def test_tick_skips_closing_windows_of_claimed_subagents(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that scale-down only closes windows of subagents it could lock."""
+    root = tmp_path / "agents"
+    for i in (1, 2):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    monkeypatch.setattr("lmspace.vscode.windows.probe_open_windows", lambda: {})
+    victims = [IdleWindow(name=f"subagent-{i}", number=i, pid=100 + i, idle_for=600.0) for i in (1, 2)]
+    monkeypatch.setattr(
+        "lmspace.vscode.autoscale.decide",
+        lambda *args, **kwargs: ScalingDecision("scale_down", "idle", close=victims),
+    )
+    closed: list[int] = []
+    monkeypatch.setattr("lmspace.vscode.autoscale.close_window", closed.append)
+    # Claimed by a dispatch after the snapshot listed it as idle
+    assert try_lock_subagent(root / "subagent-2", request_id="dispatch")
+
+    Autoscaler(root, SETTINGS).tick()
+
+    assert closed == [101]
+    assert read_subagent_lock(root / "subagent-1") is None
+    assert read_subagent_lock(root / "subagent-2")["request_id"] == "dispatch"
@@ -0,0 +1,185 @@
+"""Tests for batch dispatch across the subagent pool."""
+
+from __future__ import annotations
+
+import io
+import json
+import re
+import threading
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import (
+    claim_subagent,
+    read_subagent_lock,
+    release_subagent,
+)
+from lmspace.vscode.batch import dispatch_batch, load_batch_jobs
+from lmspace.vscode.pool_state import open_pool_state
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path) -> Path:
+    """Create a subagent root with two unlocked subagents."""
+    root = tmp_path / "agents"
+    for i in range(1, 3):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    return root
+
+
+@pytest.fixture
+def jobs_file(tmp_path: Path) -> Path:
+    """Create a prompt file and a JSONL file with five jobs."""
+    (tmp_path / "expert.prompt.md").write_text("# Expert\n", encoding="utf-8")
+    (tmp_path / "context.md").write_text("context\n", encoding="utf-8")
+    lines = [
+        json.dumps(
+            {
+                "id": f"job-{i}",
+                "prompt_file": "expert.prompt.md",
+                "query": f"question {i}",
+                "attachments": ["context.md"],
+            }
+        )
+        for i in range(5)
+    ]
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("\n".join(lines) + "\n\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def fake_agent(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Replace the VS Code launch with an agent that answers immediately."""
+    launched: list[str] = []
+
+    def fake_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        launched.append(subagent_dir.name)
+        final = re.search(r"-Destination '(.+?)'", sudolang_prompt).group(1)
+
+        def answer() -> None:
+            Path(final).write_text(f"answer from {subagent_dir.name}", encoding="utf-8")
+
+        threading.Timer(0.05, answer).start()
+        return True
+
+    monkeypatch.setattr("lmspace.vscode.batch._launch_vscode_with_chat", fake_launch)
+    return launched
+
+
+def test_load_batch_jobs_resolves_relative_paths(jobs_file: Path) -> None:
+    """Test that job paths are resolved against the jobs file directory."""
+    jobs = load_batch_jobs(jobs_file)
+
+    assert len(jobs) == 5
+    assert jobs[0]["id"] == "job-0"
+    assert jobs[0]["prompt_file"] == jobs_file.parent / "expert.prompt.md"
+    assert jobs[0]["attachments"] == [jobs_file.parent / "context.md"]
+
+
+def test_load_batch_jobs_rejects_missing_query(tmp_path: Path) -> None:
+    """Test that a job without a query is reported with its line number."""
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"prompt_file": "a.md"}\n', encoding="utf-8")
+
+    with pytest.raises(ValueError, match=r"jobs.jsonl:1: missing string field 'query'"):
+        load_batch_jobs(path)
+
+
+def test_dispatch_batch_runs_more_jobs_than_subagents(
+    subagent_root: Path,
+    jobs_file: Path,
+    fake_agent: list[str],
+) -> None:
+    """Test that five jobs complete on a pool of two and emit one line each."""
+    output = io.StringIO()
+
+    result = dispatch_batch(
+        jobs_file,
+        subagent_root=subagent_root,
+        max_concurrency=4,
+        timeout=5.0,
+        output=output,
+    )
+
+    assert result == 0
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(line["id"] for line in lines) == [f"job-{i}" for i in range(5)]
+    assert all(line["success"] for line in lines)
+    assert all(line["response"].startswith("answer from subagent-") for line in lines)
+    assert set(fake_agent) <= {"subagent-1", "subagent-2"}
+    # Every subagent is released once the batch finishes
+    assert claim_subagent(subagent_root) is not None
+    assert claim_subagent(subagent_root) is not None
+
+
+def test_dispatch_batch_traces_each_job(
+    subagent_root: Path,
+    jobs_file: Path,
+    fake_agent: list[str],
+) -> None:
+    """Test that every batch job writes a trace tagged with its job id."""
+    dispatch_batch(jobs_file, subagent_root=subagent_root, max_concurrency=2, timeout=5.0, output=io.StringIO())
+
+    lines = (subagent_root / ".lmspace-pool" / "traces.jsonl").read_text(encoding="utf-8").splitlines()
+    jobs = set()
+    for line in lines:
+        (resource,) = json.loads(line)["resourceSpans"]
+        (scope,) = resource["scopeSpans"]
+        names = {s["name"] for s in scope["spans"]}
+        assert {"dispatch", "pool.claim", "subagent.prepare", "vscode.launch", "agent.answer", "response.read"} <= names
+        (root,) = [s for s in scope["spans"] if s["name"] == "dispatch"]
+        attributes = {a["key"]: a["value"]["stringValue"] for a in root["attributes"]}
+        assert attributes["lmspace.via"] == "batch"
+        jobs.add(attributes["lmspace.batch_job"])
+    assert jobs == {f"job-{i}" for i in range(5)}
+
+
+def test_waiting_jobs_do_not_count_as_failed_claims(
+    subagent_root: Path,
+    jobs_file: Path,
+    fake_agent: list[str],
+) -> None:
+    """Test that jobs waiting for the batch's own subagents record no claim failures."""
+    dispatch_batch(jobs_file, subagent_root=subagent_root, max_concurrency=5, timeout=5.0, output=io.StringIO())
+    with open_pool_state(subagent_root) as store:
+        assert store.claim_failures() == 0
+
+    # With every subagent held elsewhere, each job gives up once
+    held = [claim_subagent(subagent_root, request_id="other") for _ in range(2)]
+    assert all(held)
+    result = dispatch_batch(jobs_file, subagent_root=subagent_root, max_concurrency=5, output=io.StringIO())
+
+    assert result == 1
+    with open_pool_state(subagent_root) as store:
+        assert store.claim_failures() == 5
+
+
+def test_dispatch_batch_reports_missing_prompt(
+    subagent_root: Path,
+    tmp_path: Path,
+    fake_agent: list[str],
+) -> None:
+    """Test that a failing job is reported without stopping the batch."""
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"id": "bad", "prompt_file": "missing.md", "query": "q"}\n', encoding="utf-8")
+    output = io.StringIO()
+
+    result = dispatch_batch(path, subagent_root=subagent_root, output=output)
+
+    assert result == 1
+    line = json.loads(output.getvalue())
+    assert line["id"] == "bad"
+    assert line["success"] is False
+    assert "Prompt file not found" in line["error"]
+    assert fake_agent == []
+
+
+def test_release_with_stale_request_id_keeps_lock(subagent_root: Path) -> None:
+    """Test that a late unlock for a finished request cannot free a new claim."""
+    claimed = claim_subagent(subagent_root, request_id="second")
+
+    assert release_subagent(claimed, request_id="first") is False
+    assert read_subagent_lock(claimed)["request_id"] == "second"
+    assert release_subagent(claimed, request_id="second") is True
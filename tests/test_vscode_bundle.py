@@ -0,0 +1,126 @@
+"""Tests for bundling chat attachments into one manifest."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode import agent_dispatch
+from lmspace.vscode.bundle import BUNDLE_ENV, should_bundle, write_attachment_bundle
+from lmspace.vscode.launcher import CodeLauncher, use_launcher
+
+
+class RecordingLauncher(CodeLauncher):
+    """Launcher that records chat attachments instead of running `code`."""
+
+    def __init__(self) -> None:
+        super().__init__("code")
+        self.attachments: list[str] = []
+
+    def chat(self, mode, prompt, *, attachments=()):
+        self.attachments = list(attachments)
+
+
+def test_bundle_inlines_small_files_and_dedupes(tmp_path: Path) -> None:
+    """Test inlining below the limit, references above it and both kinds of duplicate."""
+    small = tmp_path / "small.py"
+    small.write_text("print('```')\n", encoding="utf-8")
+    copy = tmp_path / "copy.py"
+    copy.write_text("print('```')\n", encoding="utf-8")
+    large = tmp_path / "large.txt"
+    large.write_text("x" * 100, encoding="utf-8")
+    link = tmp_path / "link.py"
+    link.symlink_to(small)
+    bundle = tmp_path / "bundle.md"
+
+    counts = write_attachment_bundle(
+        [str(small), str(link), str(copy), str(large), str(tmp_path)], bundle, inline_limit=50
+    )
+
+    assert counts == {"inlined": 1, "referenced": 2, "duplicates": 2}
+    text = bundle.read_text(encoding="utf-8")
+    assert "````\nprint('```')\n````" in text
+    assert f"`{large}` (100 bytes)" in text
+    assert f"`{tmp_path}` (directory)" in text
+    assert f"same content as `{small}`" in text
+
+
+def test_should_bundle_modes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that bundling is off by default, the auto thresholds and always."""
+    assert not should_bundle(["/a"] * 50)
+    monkeypatch.setenv(BUNDLE_ENV, "auto")
+    assert not should_bundle(["/a"] * 8)
+    assert should_bundle(["/a"] * 9)
+    assert should_bundle(["/" + "a" * 5000])
+    monkeypatch.setenv(BUNDLE_ENV, "always")
+    assert should_bundle(["/a"])
+    assert not should_bundle([])
+    monkeypatch.setenv(BUNDLE_ENV, "never")
+    assert not should_bundle(["/a"] * 50)
+    # An explicit mode wins over the environment
+    assert should_bundle(["/a"], "always")
+    monkeypatch.setenv(BUNDLE_ENV, "always")
+    assert not should_bundle(["/a"], "never")
+
+
+def test_launch_attaches_only_the_manifest(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a chat with many attachments is sent the manifest and req.md."""
+    monkeypatch.setenv(BUNDLE_ENV, "auto")
+    monkeypatch.setattr(agent_dispatch, "ensure_workspace_focused", lambda *args: True)
+    subagent = tmp_path / "subagent-1"
+    (subagent / "messages").mkdir(parents=True)
+    attachments = []
+    for i in range(12):
+        path = tmp_path / f"context-{i}.md"
+        path.write_text(f"context {i}\n", encoding="utf-8")
+        attachments.append(str(path))
+    launcher = RecordingLauncher()
+
+    with use_launcher(launcher):
+        launched = agent_dispatch._launch_vscode_with_chat(
+            subagent, "chat1", attachments, "do it", "20250101"
+        )
+
+    assert launched
+    messages = subagent / "messages"
+    assert launcher.attachments == [
+        str(messages / "20250101_attachments.md"),
+        str(messages / "20250101_req.md"),
+    ]
+    assert "context 11" in (messages / "20250101_attachments.md").read_text(encoding="utf-8")
+
+
+def test_launch_bundle_mode_overrides_environment(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a dispatch's bundling mode applies when LMSPACE_ATTACHMENT_BUNDLE is unset."""
+    monkeypatch.delenv(BUNDLE_ENV, raising=False)
+    monkeypatch.setattr(agent_dispatch, "ensure_workspace_focused", lambda *args: True)
+    subagent = tmp_path / "subagent-1"
+    (subagent / "messages").mkdir(parents=True)
+    context = tmp_path / "context.md"
+    context.write_text("context\n", encoding="utf-8")
+    launcher = RecordingLauncher()
+
+    with use_launcher(launcher):
+        assert agent_dispatch._launch_vscode_with_chat(
+            subagent, "chat1", [str(context)], "do it", "20250101", bundle="always"
+        )
+
+    assert launcher.attachments[0] == str(subagent / "messages" / "20250101_attachments.md")
+
+
+def test_chat_passes_bundle_mode_to_dispatch(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that `chat --bundle-attachments` reaches dispatch_agent, like --cache."""
+    from lmspace.cli import main
+
+    calls: list[dict] = []
+    monkeypatch.setattr(
+        agent_dispatch, "dispatch_agent", lambda *args, **kwargs: calls.append(kwargs) or 0
+    )
+
+    assert main(["code", "chat", "expert.prompt.md", "hi", "--bundle-attachments", "always"]) == 0
+    assert main(["code", "chat", "expert.prompt.md", "hi"]) == 0
+
+    assert [call["bundle_attachments"] for call in calls] == ["always", None]
@@ -0,0 +1,109 @@
+"""Tests for the pool daemon."""
+
+from __future__ import annotations
+
+import json
+import re
+import socket
+import threading
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import dispatch_agent, read_subagent_lock
+from lmspace.vscode.daemon import PoolDaemon, connect_daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="requires Unix domain sockets")
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a pool of two subagents used as the default root."""
+    root = tmp_path / "agents"
+    for i in (1, 2):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.get_subagent_root", lambda: root)
+    monkeypatch.delenv("LMSPACE_NO_DAEMON", raising=False)
+    return root
+
+
+@pytest.fixture
+def prompt_file(tmp_path: Path) -> Path:
+    path = tmp_path / "expert.prompt.md"
+    path.write_text("# Expert\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def daemon(subagent_root: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[PoolDaemon]:
+    """Run a daemon whose launches are answered by a fake agent."""
+
+    def fake_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        final = re.search(r"-Destination '(.+?)'", sudolang_prompt).group(1)
+        threading.Timer(0.05, Path(final).write_text, args=("daemon answer",)).start()
+        return True
+
+    monkeypatch.setattr("lmspace.vscode.async_dispatch._launch_vscode_with_chat", fake_launch)
+    server = PoolDaemon(subagent_root)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def test_chat_wait_goes_through_daemon(
+    daemon: PoolDaemon,
+    subagent_root: Path,
+    prompt_file: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that a sync dispatch is served by the daemon and releases the subagent."""
+    result = dispatch_agent("hello", prompt_file, wait=True)
+
+    captured = capsys.readouterr()
+    assert result == 0
+    assert "via pool daemon" in captured.err
+    first_line = json.loads(captured.out.splitlines()[0])
+    assert first_line["subagent_name"] == "subagent-1"
+    assert captured.out.splitlines()[-1] == "daemon answer"
+    assert read_subagent_lock(subagent_root / "subagent-1") is None
+
+
+def test_chat_async_keeps_lock(
+    daemon: PoolDaemon,
+    subagent_root: Path,
+    prompt_file: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that an async dispatch through the daemon leaves the subagent locked."""
+    assert dispatch_agent("hello", prompt_file) == 0
+
+    status = json.loads(capsys.readouterr().out.splitlines()[1])
+    assert status["status"] == "dispatched"
+    lease = read_subagent_lock(subagent_root / "subagent-1")
+    assert lease is not None
+
+    with connect_daemon(subagent_root) as client:
+        reply = client.request("unlock", subagent="subagent-1", request_id=lease["request_id"])
+    assert reply == {"ok": True, "released": True}
+
+
+def test_daemon_reports_exhausted_pool(
+    daemon: PoolDaemon,
+    subagent_root: Path,
+    prompt_file: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that the daemon's pool-exhausted error is reported like a local one."""
+    assert dispatch_agent("one", prompt_file) == 0
+    assert dispatch_agent("two", prompt_file) == 0
+
+    assert dispatch_agent("three", prompt_file) == 1
+    assert "No unlocked subagents available" in capsys.readouterr().err
+
+
+def test_no_daemon_falls_back_to_local(subagent_root: Path) -> None:
+    """Test that no connection is made when the daemon is not running."""
+    assert connect_daemon(subagent_root) is None
@@ -0,0 +1,70 @@
+"""Tests for the fake VS Code CLI and the load harness built on it."""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.fake_code import STARTUP_ENV, STATE_ENV, close_fake_windows, install_fake_code
+from lmspace.vscode.launcher import CodeLauncher
+from lmspace.vscode.loadtest import percentile, run_load_test
+from lmspace.vscode.windows import parse_code_status
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="fake windows are POSIX processes")
+
+
+def test_fake_code_opens_windows_reported_by_status(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that opened workspaces show up in `--status` as the real CLI reports them."""
+    state = tmp_path / "state"
+    monkeypatch.setenv(STATE_ENV, str(state))
+    monkeypatch.setenv(STARTUP_ENV, "0")
+    launcher = CodeLauncher(str(install_fake_code(tmp_path / "bin")))
+    workspace = tmp_path / "subagent-1" / "subagent-1.code-workspace"
+    workspace.parent.mkdir()
+    workspace.write_text("{}", encoding="utf-8")
+
+    try:
+        launcher.run([str(workspace)], timeout=30)
+        windows = parse_code_status(launcher.status(timeout=30))
+        assert list(windows) == ["subagent-1"]
+
+        launcher.call(["-r", "chat", "-m", "wakeup", "create a file named .alive"])
+        deadline = time.monotonic() + 30
+        while not (workspace.parent / ".alive").exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert (workspace.parent / ".alive").exists()
+    finally:
+        assert close_fake_windows(state) == 1
+
+
+def test_load_harness_reports_latencies(tmp_path: Path) -> None:
+    """Test that the harness drives dispatches end to end and reports on them."""
+    started = time.monotonic()
+    report = run_load_test(
+        dispatches=8,
+        concurrency=4,
+        subagents=2,
+        startup=0.05,
+        latency=0.1,
+        workdir=tmp_path,
+    )
+
+    assert report.failures == 0
+    assert len(report.latencies) == 8
+    assert report.throughput > 0
+    assert report.lock_collisions == 0
+    assert report.misrouted_chats == 0
+    assert time.monotonic() - started < 60
+
+
+def test_percentile_uses_nearest_rank() -> None:
+    """Test the nearest-rank percentile used in the report."""
+    values = [float(v) for v in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
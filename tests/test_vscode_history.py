@@ -0,0 +1,78 @@
+"""Tests for the compressed message archive."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode import history
+from lmspace.vscode.agent_dispatch import _clear_previous_run
+from lmspace.vscode.history import (
+    HISTORY_MAX_BYTES_ENV,
+    archive_messages,
+    get_record,
+    history_dir,
+    list_records,
+    run_history,
+    write_request_info,
+)
+
+
+def _write_run(subagent_dir: Path, request_id: str, answer: str, *, info: bool = True) -> None:
+    messages = subagent_dir / "messages"
+    messages.mkdir(parents=True, exist_ok=True)
+    (messages / f"2025010100000{request_id[-1]}_req.md").write_text(
+        f"[[ ## task ## ]]\nquestion\n\n<!-- lmspace-request-id: {request_id} -->\n", encoding="utf-8"
+    )
+    (messages / f"2025010100000{request_id[-1]}_res.md").write_text(answer, encoding="utf-8")
+    if info:
+        write_request_info(messages, request_id=request_id, prompt_file=Path("/prompts/expert.prompt.md"))
+
+
+def test_clearing_a_run_archives_it(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test that messages cleared at claim time can be looked up by request id."""
+    subagent = tmp_path / "agents" / "subagent-1"
+    _write_run(subagent, "req1", "first answer")
+    _clear_previous_run(subagent)
+    _write_run(subagent, "req2", "second answer")
+    _clear_previous_run(subagent)
+
+    assert list((subagent / "messages").iterdir()) == []
+    record = get_record(tmp_path / "agents", "req1")
+    assert record["subagent"] == "subagent-1"
+    assert record["prompt_file"] == "/prompts/expert.prompt.md"
+    assert "request.json" not in record["files"]
+    assert [r["request_id"] for r in list_records(tmp_path / "agents")] == ["req2", "req1"]
+
+    assert run_history(subagent_root=tmp_path / "agents", request_id="req2") == 0
+    assert capsys.readouterr().out == "second answer\n"
+    assert run_history(subagent_root=tmp_path / "agents", request_id="missing") == 1
+
+
+def test_request_id_falls_back_to_req_md(tmp_path: Path) -> None:
+    """Test that runs without request.json are indexed by the id in req.md."""
+    subagent = tmp_path / "agents" / "subagent-1"
+    _write_run(subagent, "legacy9", "old answer", info=False)
+
+    assert archive_messages(subagent) == "legacy9"
+    assert get_record(tmp_path / "agents", "legacy9")["prompt_file"] is None
+
+
+def test_retention_drops_oldest_segments(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that size-based retention deletes whole old segments and their index rows."""
+    monkeypatch.setattr(history, "SEGMENT_MAX_BYTES", 1)
+    monkeypatch.setenv(HISTORY_MAX_BYTES_ENV, "1")
+    root = tmp_path / "agents"
+    subagent = root / "subagent-1"
+    for request_id in ("req1", "req2", "req3"):
+        _write_run(subagent, request_id, os.urandom(64).hex())
+        archive_messages(subagent)
+        for path in (subagent / "messages").iterdir():
+            path.unlink()
+
+    # Every record lands in its own segment; only the newest is kept
+    assert [p.name for p in history_dir(root).iterdir()] == ["segment-000003.gz"]
+    assert get_record(root, "req1") is None
+    assert get_record(root, "req3") is not None
@@ -0,0 +1,110 @@
+"""Tests for resolving the import graph of prompt files."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode import imports
+from lmspace.vscode.agent_dispatch import dispatch_agent
+from lmspace.vscode.imports import parse_imports, resolve_imports
+
+
+def test_parse_imports_recognises_both_forms() -> None:
+    """Test #file: references and the SudoLang import statements."""
+    text = (
+        "Schema: #file:../contexts/schema.json (for validation).\n"
+        "See #file:\"notes with spaces.md\" and #file:skill.md.\n"
+        "import { resolveAllImports } from #file:import-parser.prompt.md\n"
+        "import \"context.md\"\n"
+        "  import * from 'helpers.md'\n"
+        "import { a, b } from \"context.md\"\n"
+        "import \"https://example.com/remote.md\"\n"
+    )
+
+    assert parse_imports(text) == [
+        "../contexts/schema.json",
+        "notes with spaces.md",
+        "skill.md",
+        "import-parser.prompt.md",
+        "context.md",
+        "helpers.md",
+    ]
+
+
+def test_resolve_imports_is_transitive_and_handles_cycles(tmp_path: Path) -> None:
+    """Test the closure over nested Markdown imports, with a cycle back to the prompt."""
+    prompts = tmp_path / "prompts"
+    contexts = tmp_path / "contexts"
+    prompts.mkdir()
+    contexts.mkdir()
+    prompt = prompts / "main.prompt.md"
+    prompt.write_text('import "../contexts/a.md"\n#file:missing.md #file:b.md\n', encoding="utf-8")
+    (contexts / "a.md").write_text("#file:data.json\n#file:../prompts/main.prompt.md\n", encoding="utf-8")
+    (contexts / "data.json").write_text('{"see": "#file:never-followed.md"}', encoding="utf-8")
+    (prompts / "b.md").write_text("#file:../contexts/a.md\n", encoding="utf-8")
+
+    assert resolve_imports(prompt) == [
+        contexts / "a.md",
+        contexts / "data.json",
+        prompts / "b.md",
+    ]
+
+
+def test_parsed_imports_are_cached_by_mtime_and_hash(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that unchanged and merely touched files are not parsed again."""
+    root = tmp_path / "agents"
+    root.mkdir()
+    prompt = tmp_path / "main.prompt.md"
+    prompt.write_text("#file:a.md\n", encoding="utf-8")
+    (tmp_path / "a.md").write_text("no imports\n", encoding="utf-8")
+    (tmp_path / "b.md").write_text("no imports\n", encoding="utf-8")
+    parsed = []
+    original = imports.parse_imports
+    monkeypatch.setattr(imports, "parse_imports", lambda text: parsed.append(text) or original(text))
+
+    assert resolve_imports(prompt, subagent_root=root) == [tmp_path / "a.md"]
+    assert len(parsed) == 2
+    assert resolve_imports(prompt, subagent_root=root) == [tmp_path / "a.md"]
+    assert len(parsed) == 2
+
+    stat = prompt.stat()
+    os.utime(prompt, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    resolve_imports(prompt, subagent_root=root)
+    assert len(parsed) == 2
+
+    prompt.write_text("#file:b.md\n", encoding="utf-8")
+    assert resolve_imports(prompt, subagent_root=root) == [tmp_path / "b.md"]
+    assert len(parsed) == 4
+
+
+def test_chat_auto_imports_attaches_the_closure(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that dispatch forwards resolved imports once alongside explicit attachments."""
+    root = tmp_path / "agents"
+    (root / "subagent-1").mkdir(parents=True)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.get_subagent_root", lambda: root)
+    monkeypatch.setenv("LMSPACE_NO_DAEMON", "1")
+    launched = []
+
+    def fake_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        launched.append(attachment_paths)
+        return True
+
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch._launch_vscode_with_chat", fake_launch)
+    prompt = tmp_path / "main.prompt.md"
+    prompt.write_text("#file:skill.md\n#file:context.md\n", encoding="utf-8")
+    for name in ("skill.md", "context.md"):
+        (tmp_path / name).write_text(name, encoding="utf-8")
+
+    result = dispatch_agent(
+        "hi", prompt, extra_attachments=[tmp_path / "context.md"], auto_imports=True
+    )
+
+    assert result == 0
+    assert launched == [[str(tmp_path / "context.md"), str(tmp_path / "skill.md")]]
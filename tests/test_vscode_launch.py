@@ -3,18 +3,27 @@
 from __future__ import annotations
 
 import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 
+from lmspace.vscode import agent_dispatch
 from lmspace.vscode.agent_dispatch import (
+    claim_subagent,
     find_unlocked_subagent,
     copy_agent_config,
     create_subagent_lock,
+    read_subagent_lock,
+    release_subagent,
     DEFAULT_LOCK_NAME,
 )
 from lmspace.vscode.cli import handle_chat
+from lmspace.vscode.pool_state import open_pool_state
+from lmspace.vscode.windows import WindowRegistry
 
 
 @pytest.fixture
@@ -121,7 +130,89 @@ def test_create_subagent_lock(tmp_path: Path) -> None:
     assert lock_file.parent == subagent
 
 
+def test_claim_subagent_locks_first_free(subagent_root: Path) -> None:
+    """Test that claiming locks the first free subagent with lease metadata."""
+    claimed = claim_subagent(subagent_root, request_id="req-1")
 
+    assert claimed is not None
+    assert claimed.name == "subagent-2"
+    lease = read_subagent_lock(claimed)
+    assert lease is not None
+    assert lease["pid"] == os.getpid()
+    assert lease["request_id"] == "req-1"
+    assert "host" in lease
+    assert "acquired_at" in lease
 
 
+def test_claim_subagent_exhausted(subagent_root: Path) -> None:
+    """Test that claiming returns None once every subagent is locked."""
+    assert claim_subagent(subagent_root) is not None
+    assert claim_subagent(subagent_root) is not None
+    assert claim_subagent(subagent_root) is None
 
+
+def test_claim_subagent_concurrent_claims_are_distinct(tmp_path: Path) -> None:
+    """Test that concurrent claimers never receive the same subagent."""
+    root = tmp_path / "agents"
+    for i in range(1, 9):
+        (root / f"subagent-{i}").mkdir(parents=True)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda _: claim_subagent(root), range(16)))
+
+    claimed = [r for r in results if r is not None]
+    assert len(claimed) == 8
+    assert len(set(claimed)) == 8
+
+
+def test_release_subagent(subagent_root: Path) -> None:
+    """Test releasing a claimed subagent makes it claimable again."""
+    claimed = claim_subagent(subagent_root)
+    assert claimed is not None
+
+    assert release_subagent(claimed) is True
+    assert read_subagent_lock(claimed) is None
+    assert release_subagent(claimed) is False
+    assert claim_subagent(subagent_root) == claimed
+
+
+def test_read_subagent_lock_legacy_empty_file(subagent_root: Path) -> None:
+    """Test that empty lock files from older versions read as empty leases."""
+    assert read_subagent_lock(subagent_root / "subagent-1") == {}
+
+
+
+def test_ensure_workspace_focused_waits_for_alive_event(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a cold window is ready as soon as .alive is written, then cached."""
+    subagent_dir = tmp_path / "agents" / "subagent-1"
+    subagent_dir.mkdir(parents=True)
+    workspace = subagent_dir / "subagent-1.code-workspace"
+    probe = MagicMock(return_value={})
+    monkeypatch.setattr("lmspace.vscode.windows.probe_open_windows", probe)
+
+    def fake_run(argv, **kwargs):
+        if "chat" in argv:
+            threading.Timer(0.05, (subagent_dir / ".alive").write_text, args=("ok",)).start()
+        return MagicMock()
+
+    with patch("subprocess.run", side_effect=fake_run) as mock_run:
+        assert agent_dispatch.ensure_workspace_focused(workspace, "subagent-1", subagent_dir, timeout=5.0)
+        assert mock_run.call_count == 2
+
+        # A window confirmed ready is only focused, never re-probed
+        assert agent_dispatch.ensure_workspace_focused(workspace, "subagent-1", subagent_dir, timeout=5.0)
+        assert mock_run.call_count == 3
+    assert probe.call_count == 1
+
+
+def test_ensure_workspace_focused_timeout(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that readiness gives up at the deadline and is not recorded."""
+    subagent_dir = tmp_path / "agents" / "subagent-1"
+    subagent_dir.mkdir(parents=True)
+    workspace = subagent_dir / "subagent-1.code-workspace"
+    monkeypatch.setattr("lmspace.vscode.windows.probe_open_windows", MagicMock(return_value={}))
+
+    with patch("subprocess.run"):
+        assert not agent_dispatch.ensure_workspace_focused(workspace, "subagent-1", subagent_dir, timeout=0.2)
+    with open_pool_state(subagent_dir.parent) as store:
+        assert WindowRegistry(store).lookup("subagent-1") is None
@@ -0,0 +1,109 @@
+"""Tests for the shell-free VS Code launcher."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import warmup_subagents
+from lmspace.vscode.launcher import CodeLauncher, get_launcher, use_launcher
+
+
+class RecordingLauncher(CodeLauncher):
+    """Launcher that records argv lists instead of starting VS Code."""
+
+    def __init__(self) -> None:
+        super().__init__("code")
+        self.calls: list[list[str]] = []
+
+    def call(self, args, *, timeout=30.0):
+        self.calls.append(list(args))
+
+
+def test_chat_passes_awkward_paths_verbatim() -> None:
+    """Test that attachments with quotes and spaces reach `code` unquoted."""
+    launcher = CodeLauncher("/opt/code/bin/code")
+    attachment = """/tmp/it's a "file".md"""
+
+    with patch("subprocess.run") as mock_run:
+        launcher.chat("mode-1", "Follow instructions in req.md", attachments=[attachment])
+
+    assert mock_run.call_args.args[0] == [
+        "/opt/code/bin/code", "-r", "chat", "-m", "mode-1", "-a", attachment,
+        "Follow instructions in req.md",
+    ]
+    # The chat has reached VS Code before the next window can be focused
+    assert mock_run.call_args.kwargs["check"] is True
+
+
+def test_executable_is_resolved_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the configured executable is resolved on first use and reused."""
+    monkeypatch.setenv("LMSPACE_CODE_EXECUTABLE", "/custom/code")
+    launcher = CodeLauncher()
+
+    assert launcher.executable == "/custom/code"
+    monkeypatch.setenv("LMSPACE_CODE_EXECUTABLE", "/other/code")
+    assert launcher.executable == "/custom/code"
+
+
+def test_use_launcher_swaps_in_a_fake(tmp_path: Path) -> None:
+    """Test that an installed launcher receives every `code` invocation."""
+    subagent_dir = tmp_path / "subagent-1"
+    subagent_dir.mkdir()
+    workspace = subagent_dir / "subagent-1.code-workspace"
+    workspace.write_text("{}", encoding="utf-8")
+    default = get_launcher()
+
+    with use_launcher(RecordingLauncher()) as fake, patch("subprocess.run") as mock_run:
+        assert warmup_subagents(subagent_root=tmp_path) == 0
+
+    assert fake.calls == [[str(workspace)]]
+    mock_run.assert_not_called()
+    assert get_launcher() is default
+
+
+def test_code_cmd_runs_code_executable_with_cli_js(tmp_path: Path) -> None:
+    """Test that code.cmd is resolved to Code.exe and cli.js instead of going through cmd.exe."""
+    install = tmp_path / "Microsoft VS Code"
+    (install / "bin").mkdir(parents=True)
+    (install / "resources" / "app" / "out").mkdir(parents=True)
+    (install / "Code.exe").write_bytes(b"")
+    (install / "resources" / "app" / "out" / "cli.js").write_text("", encoding="utf-8")
+    batch = install / "bin" / "code.cmd"
+    batch.write_text(
+        "@echo off\r\nsetlocal\r\nset VSCODE_DEV=\r\nset ELECTRON_RUN_AS_NODE=1\r\n"
+        '"%~dp0..\\Code.exe" "%~dp0..\\resources\\app\\out\\cli.js" --ms-enable-electron-run-as-node %*\r\n'
+        "endlocal\r\n",
+        encoding="utf-8",
+    )
+    attachment = "C:\\work\\100% & more.md"
+
+    with patch("subprocess.run") as mock_run:
+        CodeLauncher(str(batch)).chat("mode-1", "prompt", attachments=[attachment])
+
+    assert mock_run.call_args.args[0] == [
+        str(install / "Code.exe"),
+        str(install / "resources" / "app" / "out" / "cli.js"),
+        "--ms-enable-electron-run-as-node",
+        "-r", "chat", "-m", "mode-1", "-a", attachment, "prompt",
+    ]
+    assert mock_run.call_args.kwargs["env"]["ELECTRON_RUN_AS_NODE"] == "1"
+
+
+def test_unresolved_batch_file_is_quoted_for_cmd(tmp_path: Path) -> None:
+    """Test that a batch file of unknown layout gets a quoted, length-checked cmd.exe line."""
+    batch = tmp_path / "code.cmd"
+    batch.write_text("@echo off\r\ncustom-code.exe %*\r\n", encoding="utf-8")
+    launcher = CodeLauncher(str(batch))
+
+    with patch("subprocess.run") as mock_run:
+        launcher.chat("mode-1", "prompt", attachments=["a & b.md"])
+    assert mock_run.call_args.args[0] == f'"{batch}" "-r" "chat" "-m" "mode-1" "-a" "a & b.md" "prompt"'
+
+    with patch("subprocess.run") as mock_run, pytest.raises(OSError):
+        launcher.chat("mode-1", "prompt", attachments=["%PATH%.md"])
+    with patch("subprocess.run") as mock_run, pytest.raises(OSError):
+        launcher.chat("mode-1", "prompt", attachments=["x" * 9000])
+    mock_run.assert_not_called()
@@ -0,0 +1,138 @@
+"""Tests for the Prometheus metrics of the subagent pool."""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import DEFAULT_LOCK_NAME, _count_pool_event
+from lmspace.vscode import metrics
+from lmspace.vscode.metrics import collect_metrics, parse_listen_address, update_trace_histograms
+from lmspace.vscode.pool_state import open_pool_state
+from lmspace.vscode.tracing import TRACE_MAX_BYTES_ENV, set_attribute, span, trace, trace_file_for
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path) -> Path:
+    """Create a pool of three subagents, one locked 90s ago with a request in flight."""
+    root = tmp_path / "agents"
+    for i in range(1, 4):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    locked = root / "subagent-1"
+    acquired = datetime.now(timezone.utc) - timedelta(seconds=90)
+    (locked / DEFAULT_LOCK_NAME).write_text(
+        json.dumps({"request_id": "r1", "acquired_at": acquired.isoformat()}), encoding="utf-8"
+    )
+    (locked / "messages").mkdir()
+    (locked / "messages" / "20250101000000_req.md").write_text("task", encoding="utf-8")
+    return root
+
+
+def _samples(text: str) -> dict[str, float]:
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_collect_metrics_reports_pool_state(subagent_root: Path) -> None:
+    """Test utilization, lock age and in-flight metrics read from the lock files."""
+    samples = _samples(collect_metrics(subagent_root))
+
+    assert samples["lmspace_pool_subagents"] == 3
+    assert samples['lmspace_pool_subagents_by_status{status="locked"}'] == 1
+    assert samples['lmspace_pool_subagents_by_status{status="available"}'] == 2
+    assert samples['lmspace_lock_age_seconds_bucket{le="60"}'] == 0
+    assert samples['lmspace_lock_age_seconds_bucket{le="300"}'] == 1
+    assert samples["lmspace_requests_in_flight"] == 1
+    assert samples["lmspace_queue_depth"] == 0
+
+
+def test_collect_metrics_reads_traces_and_counters(subagent_root: Path) -> None:
+    """Test latency histograms from the trace file and failure counters from the store."""
+    trace_file = trace_file_for(subagent_root)
+    for request_id, ready in (("a" * 32, True), ("b" * 32, False)):
+        with trace("dispatch", request_id=request_id, trace_file=trace_file):
+            with span("window.ready"):
+                set_attribute("lmspace.ready", ready)
+    _count_pool_event(subagent_root, "readiness_timeouts")
+    _count_pool_event(subagent_root, "launch_failures")
+    _count_pool_event(subagent_root, "launch_failures")
+    with open_pool_state(subagent_root) as store:
+        store.enqueue("waiting")
+
+    samples = _samples(collect_metrics(subagent_root))
+
+    assert samples["lmspace_dispatch_duration_seconds_count"] == 2
+    assert samples['lmspace_dispatch_duration_seconds_bucket{le="0.5"}'] == 2
+    # Only windows that became ready count towards readiness latency
+    assert samples["lmspace_window_ready_duration_seconds_count"] == 1
+    assert samples["lmspace_readiness_timeouts_total"] == 1
+    assert samples["lmspace_launch_failures_total"] == 2
+    assert samples["lmspace_queue_depth"] == 1
+
+
+def test_trace_histograms_are_kept_across_scrapes_and_rotation(
+    subagent_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that each scrape reads only new traces, including the rest of a rotated file."""
+    trace_file = trace_file_for(subagent_root)
+
+    def dispatch(request_id: str) -> None:
+        with trace("dispatch", request_id=request_id, trace_file=trace_file, padding="x" * 400):
+            pass
+
+    dispatch("a" * 32)
+    assert _samples(collect_metrics(subagent_root))["lmspace_dispatch_duration_seconds_count"] == 1
+    # Nothing new: the traces already counted are not counted again
+    assert _samples(collect_metrics(subagent_root))["lmspace_dispatch_duration_seconds_count"] == 1
+
+    monkeypatch.setenv(TRACE_MAX_BYTES_ENV, "2000")
+    dispatch("b" * 32)
+    dispatch("c" * 32)
+    assert trace_file.with_name("traces.jsonl.1").exists()
+
+    samples = _samples(collect_metrics(subagent_root))
+    assert samples["lmspace_dispatch_duration_seconds_count"] == 3
+    assert samples['lmspace_dispatch_duration_seconds_bucket{le="+Inf"}'] == 3
+
+
+def test_concurrent_scrape_does_not_count_traces_twice(
+    subagent_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a scrape whose position moved while it parsed parses again from there."""
+    trace_file = trace_file_for(subagent_root)
+    with trace("dispatch", request_id="a" * 32, trace_file=trace_file):
+        pass
+    advance = metrics._advance_trace_state
+    calls: list[int] = []
+
+    def racing_advance(state: dict, path: Path) -> None:
+        calls.append(state["offset"])
+        if len(calls) == 1:
+            # Another scrape stores the same traces while this one parses
+            monkeypatch.setattr(metrics, "_advance_trace_state", advance)
+            with open_pool_state(subagent_root) as other:
+                update_trace_histograms(other, trace_file)
+            monkeypatch.setattr(metrics, "_advance_trace_state", racing_advance)
+        advance(state, path)
+
+    monkeypatch.setattr(metrics, "_advance_trace_state", racing_advance)
+    with open_pool_state(subagent_root) as store:
+        histograms = update_trace_histograms(store, trace_file)
+
+    assert calls[0] == 0 and calls[1] > 0
+    assert histograms["dispatch"]["count"] == 1
+
+
+def test_parse_listen_address() -> None:
+    """Test the [HOST:]PORT syntax of --serve."""
+    assert parse_listen_address("9100") == ("127.0.0.1", 9100)
+    assert parse_listen_address("0.0.0.0:9100") == ("0.0.0.0", 9100)
+    with pytest.raises(ValueError):
+        parse_listen_address("localhost:metrics")
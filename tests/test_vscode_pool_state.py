@@ -0,0 +1,188 @@
+"""Tests for the subagent pool state store."""
+
+from __future__ import annotations
+
+import json
+import shlex
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from lmspace.cli import main
+from lmspace.vscode.agent_dispatch import (
+    SUBAGENT_ROOT_ENV,
+    _create_request_prompt,
+    claim_subagent,
+    find_unlocked_subagent,
+    list_subagents,
+    release_subagent,
+    DEFAULT_LOCK_NAME,
+)
+from lmspace.vscode.pool_state import SCHEMA_VERSION, STATE_DIR_NAME, open_pool_state
+from lmspace.vscode.provision import unlock_subagents
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path) -> Path:
+    """Create a subagent root with three unlocked subagents."""
+    root = tmp_path / "agents"
+    for i in range(1, 4):
+        subagent = root / f"subagent-{i}"
+        subagent.mkdir(parents=True)
+        (subagent / f"subagent-{i}.code-workspace").write_text("{}", encoding="utf-8")
+    return root
+
+
+def test_store_indexes_existing_subagents(subagent_root: Path) -> None:
+    """Test that opening the store indexes subagents already on disk."""
+    (subagent_root / "not-a-subagent").mkdir()
+
+    with open_pool_state(subagent_root) as store:
+        records = store.list_subagents()
+
+    assert [r["name"] for r in records] == ["subagent-1", "subagent-2", "subagent-3"]
+    assert all(r["status"] == "available" for r in records)
+    assert (subagent_root / STATE_DIR_NAME).is_dir()
+
+
+def test_store_picks_up_new_and_removed_directories(subagent_root: Path) -> None:
+    """Test that membership changes on disk are synced on the next open."""
+    with open_pool_state(subagent_root) as store:
+        assert len(store.list_subagents()) == 3
+
+    (subagent_root / "subagent-10").mkdir()
+    (subagent_root / "subagent-2").rename(subagent_root / "retired")
+
+    with open_pool_state(subagent_root) as store:
+        names = [r["name"] for r in store.list_subagents()]
+
+    assert names == ["subagent-1", "subagent-3", "subagent-10"]
+
+
+def test_claim_and_release_update_store(subagent_root: Path) -> None:
+    """Test that claiming and releasing are recorded in the store."""
+    claimed = claim_subagent(subagent_root, request_id="req-42")
+    assert claimed is not None
+
+    with open_pool_state(subagent_root) as store:
+        record = store.list_subagents(status="locked")[0]
+    assert record["name"] == "subagent-1"
+    assert record["request_id"] == "req-42"
+    assert record["lock_owner"] is not None
+    assert find_unlocked_subagent(subagent_root).name == "subagent-2"
+
+    release_subagent(claimed)
+
+    with open_pool_state(subagent_root) as store:
+        assert store.list_subagents(status="locked") == []
+
+
+def test_agent_unlock_command_names_the_pool_root(
+    subagent_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that the agent's unlock command frees its subagent without LMSPACE_SUBAGENT_ROOT."""
+    claimed = claim_subagent(subagent_root, request_id="req42")
+    messages = claimed / "messages"
+    prompt = _create_request_prompt(
+        "query",
+        messages / "req42_res.tmp.md",
+        messages / "req42_res.md",
+        claimed.name,
+        "req42",
+        subagent_root=subagent_root,
+    )
+    unlock_line = next(line for line in prompt.splitlines() if line.startswith("lmspace code unlock"))
+    monkeypatch.delenv(SUBAGENT_ROOT_ENV, raising=False)
+    monkeypatch.setenv("HOME", str(subagent_root.parent / "home"))
+
+    assert main(shlex.split(unlock_line)[1:]) == 0
+
+    with open_pool_state(subagent_root) as store:
+        assert store.list_subagents(status="locked") == []
+
+
+def test_claim_skips_lock_created_behind_store(subagent_root: Path) -> None:
+    """Test that a lock created outside the store is honored and indexed."""
+    with open_pool_state(subagent_root) as store:
+        assert store.first_available().name == "subagent-1"
+
+    (subagent_root / "subagent-1" / DEFAULT_LOCK_NAME).touch()
+
+    claimed = claim_subagent(subagent_root)
+    assert claimed is not None
+    assert claimed.name == "subagent-2"
+
+    with open_pool_state(subagent_root) as store:
+        locked = [r["name"] for r in store.list_subagents(status="locked")]
+    assert locked == ["subagent-1", "subagent-2"]
+
+
+def test_claim_resyncs_rows_whose_lock_was_removed_by_hand(subagent_root: Path) -> None:
+    """Test that a pool that looks exhausted is resynced from the lock files before failing."""
+    claimed = [claim_subagent(subagent_root) for _ in range(3)]
+    assert all(claimed)
+    assert claim_subagent(subagent_root) is None
+
+    (subagent_root / "subagent-2" / DEFAULT_LOCK_NAME).unlink()
+
+    assert claim_subagent(subagent_root).name == "subagent-2"
+
+
+def test_schema_is_migrated_once(subagent_root: Path) -> None:
+    """Test that the schema version is recorded and only missing migrations run."""
+    with open_pool_state(subagent_root) as store:
+        assert store.meta_value("schema_version") == str(SCHEMA_VERSION)
+
+    statements: list[str] = []
+    connect = sqlite3.connect
+
+    def tracing_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(sqlite3, "connect", tracing_connect)
+        with open_pool_state(subagent_root):
+            pass
+
+    assert not any("CREATE TABLE" in statement for statement in statements)
+
+
+def test_rebuild_index_reconciles_locks(
+    subagent_root: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that list --rebuild-index picks up locks changed by hand."""
+    list_subagents(subagent_root=subagent_root, json_output=True)
+    capsys.readouterr()
+
+    (subagent_root / "subagent-3" / DEFAULT_LOCK_NAME).write_text(
+        json.dumps({"pid": 1, "host": "h", "request_id": "manual"}),
+        encoding="utf-8",
+    )
+
+    result = list_subagents(subagent_root=subagent_root, json_output=True, rebuild_index=True)
+
+    assert result == 0
+    subagents = json.loads(capsys.readouterr().out)["subagents"]
+    assert subagents[2]["locked"] is True
+    assert subagents[2]["request_id"] == "manual"
+    assert subagents[2]["lock_owner"] == "1@h"
+
+
+def test_unlock_all_releases_through_store(subagent_root: Path) -> None:
+    """Test that unlock --all clears locks and the store records it."""
+    claim_subagent(subagent_root)
+    claim_subagent(subagent_root)
+
+    unlocked = unlock_subagents(
+        target_root=subagent_root,
+        lock_name=DEFAULT_LOCK_NAME,
+        unlock_all=True,
+    )
+
+    assert [p.name for p in unlocked] == ["subagent-1", "subagent-2"]
+    with open_pool_state(subagent_root) as store:
+        assert store.list_subagents(status="locked") == []
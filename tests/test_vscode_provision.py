@@ -7,8 +7,10 @@ from pathlib import Path
 
 import pytest
 
-from lmspace.vscode.provision import provision_subagents, DEFAULT_LOCK_NAME
+from lmspace.vscode.pool_state import open_pool_state
+from lmspace.vscode.provision import ProvisionReport, provision_subagents, DEFAULT_LOCK_NAME
 from lmspace.vscode.cli import handle_provision
+from lmspace.vscode.defaults import DEFAULT_COPY_MODE, DEFAULT_PROVISION_WORKERS
 
 
 @pytest.fixture
@@ -349,17 +351,20 @@ def test_handle_provision_runs_warmup(
         force=False,
         dry_run=False,
         warmup=True,
+        workers=DEFAULT_PROVISION_WORKERS,
+        copy_mode=DEFAULT_COPY_MODE,
     )
 
     warmup_calls: dict[str, object] = {}
 
-    def fake_warmup(*, subagent_root: Path, subagents: int, dry_run: bool) -> int:
+    def fake_warmup(*, subagent_root: Path, subagents: int, dry_run: bool, wait_ready: bool) -> int:
         warmup_calls["root"] = subagent_root
         warmup_calls["count"] = subagents
         warmup_calls["dry_run"] = dry_run
+        warmup_calls["wait_ready"] = wait_ready
         return 0
 
-    monkeypatch.setattr("lmspace.vscode.cli.warmup_subagents", fake_warmup)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.warmup_subagents", fake_warmup)
 
     result = handle_provision(args)
 
@@ -368,9 +373,35 @@ def test_handle_provision_runs_warmup(
         "root": target_root,
         "count": 1,
         "dry_run": False,
+        "wait_ready": True,
     }
 
 
+def test_handle_provision_defaults_to_configured_root(
+    template_dir: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Ensure provisioning without --target-root honors LMSPACE_SUBAGENT_ROOT."""
+
+    target_root = tmp_path / "configured"
+    monkeypatch.setenv("LMSPACE_SUBAGENT_ROOT", str(target_root))
+    args = Namespace(
+        template=template_dir,
+        target_root=None,
+        subagents=1,
+        lock_name=DEFAULT_LOCK_NAME,
+        force=False,
+        dry_run=False,
+        warmup=False,
+        workers=DEFAULT_PROVISION_WORKERS,
+        copy_mode=DEFAULT_COPY_MODE,
+    )
+
+    assert handle_provision(args) == 0
+    assert (target_root / "subagent-1").is_dir()
+
+
 def test_handle_provision_skips_warmup_during_dry_run(
     template_dir: Path,
     tmp_path: Path,
@@ -387,12 +418,14 @@ def test_handle_provision_skips_warmup_during_dry_run(
         force=False,
         dry_run=True,
         warmup=True,
+        workers=DEFAULT_PROVISION_WORKERS,
+        copy_mode=DEFAULT_COPY_MODE,
     )
 
     def fake_warmup(*args: object, **kwargs: object) -> int:  # pragma: no cover
         raise AssertionError("warmup should not be called during dry run")
 
-    monkeypatch.setattr("lmspace.vscode.cli.warmup_subagents", fake_warmup)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.warmup_subagents", fake_warmup)
 
     result = handle_provision(args)
 
@@ -481,3 +514,139 @@ def test_provision_force_dir_in_use(
     assert extra_file.exists()
     # Lock file should be removed
     assert not lock_file.exists()
+
+
+def _pool_snapshot(root: Path) -> list[tuple]:
+    workspaces = sorted(root.glob("subagent-*/*.code-workspace"))
+    with open_pool_state(root) as store:
+        statuses = [(r["name"], r["status"]) for r in store.list_subagents()]
+    return [
+        (path.relative_to(root), path.read_text(), path.stat().st_mtime_ns) for path in workspaces
+    ] + statuses
+
+
+@pytest.mark.parametrize("copy_mode", ["auto", "copy", "hardlink"])
+def test_parallel_provision_matches_serial(
+    template_dir: Path, tmp_path: Path, copy_mode: str
+) -> None:
+    """Test that workers and copy mode do not change the provisioned pool."""
+    results = []
+    for name, workers in (("serial", 1), ("parallel", 8)):
+        root = tmp_path / name
+        (root / "subagent-2").mkdir(parents=True)
+        (root / "subagent-2" / DEFAULT_LOCK_NAME).touch()
+        provision_subagents(
+            template=template_dir, target_root=root, subagents=3,
+            lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False,
+        )
+        lists = provision_subagents(
+            template=template_dir, target_root=root, subagents=20,
+            lock_name=DEFAULT_LOCK_NAME, force=True, dry_run=False,
+            workers=workers, copy_mode=copy_mode,
+        )
+        results.append(([[p.relative_to(root) for p in paths] for paths in lists], _pool_snapshot(root)))
+
+    assert results[0] == results[1]
+    assert not list(tmp_path.glob("*/subagent-*/" + DEFAULT_LOCK_NAME))
+
+
+def test_provision_reports_progress_and_copy_methods(
+    template_dir: Path, target_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that auto mode falls back to copying and reports its progress."""
+    def no_reflink(src: Path, dst: Path) -> None:
+        raise OSError(95, "Operation not supported")
+
+    monkeypatch.setattr("lmspace.vscode.provision._reflink", no_reflink)
+    progress: list[tuple[int, int]] = []
+    report = ProvisionReport()
+
+    provision_subagents(
+        template=template_dir, target_root=target_root, subagents=5,
+        lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False,
+        workers=3, progress=lambda done, total: progress.append((done, total)), report=report,
+    )
+
+    assert progress == [(i, 5) for i in range(1, 6)]
+    assert report.copies == {"copy": 5}
+    assert report.workers == 3
+    assert "Wrote 5 workspace file(s)" in report.summary()
+
+
+def test_hardlink_mode_shares_template_inode(template_dir: Path, target_root: Path) -> None:
+    """Test that hardlink mode links workspace files to the template."""
+    provision_subagents(
+        template=template_dir, target_root=target_root, subagents=2,
+        lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False, copy_mode="hardlink",
+    )
+
+    template_inode = (template_dir / "subagent.code-workspace").stat().st_ino
+    assert (target_root / "subagent-2" / "subagent-2.code-workspace").stat().st_ino == template_inode
+
+
+def test_dispatch_into_hardlinked_workspace(
+    template_dir: Path, target_root: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a subagent provisioned with hard links can be dispatched to."""
+    from lmspace.vscode.agent_dispatch import dispatch_agent
+
+    provision_subagents(
+        template=template_dir, target_root=target_root, subagents=1,
+        lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False, copy_mode="hardlink",
+    )
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.get_subagent_root", lambda: target_root)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch._launch_vscode_with_chat", lambda *args, **kwargs: True)
+    monkeypatch.setenv("LMSPACE_NO_DAEMON", "1")
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+
+    assert dispatch_agent("hi", prompt_file) == 0
+    assert (target_root / "subagent-1" / DEFAULT_LOCK_NAME).exists()
+    assert (template_dir / "subagent.code-workspace").read_text() == "{}\n"
+
+
+def test_copy_mode_replaces_hardlinked_workspace(template_dir: Path, target_root: Path) -> None:
+    """Test that re-provisioning by copy never writes through a hard link into the template."""
+    provision_subagents(
+        template=template_dir, target_root=target_root, subagents=1,
+        lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False, copy_mode="hardlink",
+    )
+    template_file = template_dir / "subagent.code-workspace"
+    other = template_dir.parent / "other"
+    other.mkdir()
+    (other / "subagent.code-workspace").write_text('{"folders": []}\n')
+
+    provision_subagents(
+        template=other, target_root=target_root, subagents=1,
+        lock_name=DEFAULT_LOCK_NAME, force=True, dry_run=False, copy_mode="copy",
+    )
+
+    workspace = target_root / "subagent-1" / "subagent-1.code-workspace"
+    assert workspace.read_text() == '{"folders": []}\n'
+    assert workspace.stat().st_ino != template_file.stat().st_ino
+    assert template_file.read_text() == "{}\n"
+
+
+def test_provision_skips_subagents_locked_meanwhile(
+    template_dir: Path, target_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a subagent claimed between planning and writing is reported, not written."""
+    from lmspace.vscode import provision
+
+    lock = provision.try_lock_subagent
+
+    def claimed_by_other(subagent_dir: Path, **kwargs: object) -> bool:
+        return subagent_dir.name != "subagent-2" and lock(subagent_dir, **kwargs)
+
+    monkeypatch.setattr(provision, "try_lock_subagent", claimed_by_other)
+    report = ProvisionReport()
+
+    created, _, skipped_locked = provision_subagents(
+        template=template_dir, target_root=target_root, subagents=3,
+        lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False, workers=2, report=report,
+    )
+
+    assert [path.name for path in created] == ["subagent-1", "subagent-3"]
+    assert [path.name for path in skipped_locked] == ["subagent-2"]
+    assert not (target_root / "subagent-2" / "subagent-2.code-workspace").exists()
+    assert sum(report.copies.values()) == 2
@@ -0,0 +1,95 @@
+"""Tests for the FIFO claim queue."""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import (
+    claim_subagent,
+    claim_subagent_queued,
+    release_subagent,
+)
+from lmspace.vscode.pool_state import open_pool_state
+
+
+@pytest.fixture
+def busy_root(tmp_path: Path) -> Path:
+    """Create a pool with a single subagent that is already claimed."""
+    root = tmp_path / "agents"
+    (root / "subagent-1").mkdir(parents=True)
+    assert claim_subagent(root, request_id="holder") is not None
+    return root
+
+
+def _wait_for_queue_length(root: Path, length: int) -> None:
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline:
+        with open_pool_state(root) as store:
+            if len(store.queue_entries()) == length:
+                return
+        time.sleep(0.01)
+    raise AssertionError(f"queue never reached length {length}")
+
+
+def test_queued_claim_wakes_on_release(busy_root: Path) -> None:
+    """Test that a waiter gets the subagent as soon as it is released."""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(claim_subagent_queued, busy_root, request_id="waiter", max_wait=10.0)
+        _wait_for_queue_length(busy_root, 1)
+
+        released_at = time.monotonic()
+        assert release_subagent(busy_root / "subagent-1", request_id="holder")
+        claimed = future.result(timeout=5.0)
+
+    assert claimed == busy_root / "subagent-1"
+    # Woken by the release rather than the periodic re-check
+    assert time.monotonic() - released_at < 2.0
+    with open_pool_state(busy_root) as store:
+        assert store.queue_entries() == []
+
+
+def test_queue_is_fifo(busy_root: Path) -> None:
+    """Test that waiters are served in arrival order."""
+    order: list[str] = []
+
+    def wait(request_id: str) -> None:
+        subagent_dir = claim_subagent_queued(busy_root, request_id=request_id, max_wait=10.0)
+        order.append(request_id)
+        release_subagent(subagent_dir, request_id=request_id)
+
+    threads = []
+    for i, request_id in enumerate(("first", "second", "third"), 1):
+        thread = threading.Thread(target=wait, args=(request_id,))
+        thread.start()
+        threads.append(thread)
+        _wait_for_queue_length(busy_root, i)
+
+    release_subagent(busy_root / "subagent-1", request_id="holder")
+    for thread in threads:
+        thread.join(timeout=10.0)
+
+    assert order == ["first", "second", "third"]
+
+
+def test_queued_claim_times_out(busy_root: Path) -> None:
+    """Test that max_wait gives up and leaves the queue."""
+    assert claim_subagent_queued(busy_root, max_wait=0.1) is None
+
+    with open_pool_state(busy_root) as store:
+        assert store.queue_entries() == []
+
+
+def test_dead_waiter_is_skipped(busy_root: Path) -> None:
+    """Test that a queue entry left by an exited process does not block the queue."""
+    with open_pool_state(busy_root) as store:
+        with store.transaction() as conn:
+            ticket = store.enqueue("ghost", conn)
+            conn.execute("UPDATE queue SET pid = ? WHERE ticket = ?", (2**22 + 1, ticket))
+    release_subagent(busy_root / "subagent-1", request_id="holder")
+
+    assert claim_subagent_queued(busy_root, max_wait=2.0) == busy_root / "subagent-1"
@@ -0,0 +1,152 @@
+"""Tests for lease heartbeats and the stale lock reaper."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import (
+    DEFAULT_LEASE_TTL,
+    DEFAULT_LOCK_NAME,
+    LeaseHeartbeat,
+    claim_subagent,
+    read_subagent_lock,
+    release_subagent,
+    renew_lease,
+)
+from lmspace.vscode.history import get_record, write_request_info
+from lmspace.vscode.reaper import reap_subagents
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path) -> Path:
+    root = tmp_path / "agents"
+    for i in (1, 2):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    return root
+
+
+def _rewrite_lease(subagent_dir: Path, **changes: object) -> None:
+    lock_file = subagent_dir / DEFAULT_LOCK_NAME
+    lease = json.loads(lock_file.read_text(encoding="utf-8"))
+    lease.update(changes)
+    lock_file.write_text(json.dumps(lease), encoding="utf-8")
+
+
+def test_reap_expired_lease_archives_partial_response(subagent_root: Path) -> None:
+    """Test that an expired lease is released and its partial response archived to history."""
+    claimed = claim_subagent(subagent_root, request_id="lost")
+    (claimed / "messages").mkdir()
+    write_request_info(claimed / "messages", request_id="lost", prompt_file=Path("expert.prompt.md"))
+    (claimed / "messages" / "20250101000000_res.tmp.md").write_text("partial", encoding="utf-8")
+    _rewrite_lease(claimed, expires_at="2000-01-01T00:00:00+00:00")
+
+    reaped = reap_subagents(subagent_root)
+
+    assert [entry["subagent"] for entry in reaped] == ["subagent-1"]
+    assert read_subagent_lock(claimed) is None
+    assert reaped[0]["archived"] == ["20250101000000_res.tmp.md"]
+    record = get_record(subagent_root, "lost")
+    assert record["files"]["20250101000000_res.tmp.md"] == "partial"
+    assert not (subagent_root / ".lmspace-pool" / "reaped").exists()
+
+
+def test_lease_ttl_is_configurable(subagent_root: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that LMSPACE_LEASE_TTL sets the lifetime of an async lease."""
+    monkeypatch.setenv("LMSPACE_LEASE_TTL", "86400")
+    claimed = claim_subagent(subagent_root, request_id="long")
+
+    lease = read_subagent_lock(claimed)
+    lifetime = datetime.fromisoformat(lease["expires_at"]) - datetime.fromisoformat(lease["acquired_at"])
+    assert lifetime.total_seconds() == 86400
+
+
+def test_reap_keeps_live_leases(subagent_root: Path) -> None:
+    """Test that fresh async leases and live heartbeat leases are left alone."""
+    async_dir = claim_subagent(subagent_root, request_id="async")
+    sync_dir = claim_subagent(subagent_root, request_id="sync")
+    assert renew_lease(sync_dir, request_id="sync")
+
+    assert reap_subagents(subagent_root) == []
+    assert read_subagent_lock(async_dir)["request_id"] == "async"
+    assert read_subagent_lock(sync_dir)["heartbeat"] is True
+
+
+def test_reap_heartbeat_lease_of_exited_process(subagent_root: Path) -> None:
+    """Test that a heartbeat lease is reclaimed as soon as its owner has exited."""
+    claimed = claim_subagent(subagent_root, request_id="killed")
+    assert renew_lease(claimed, request_id="killed")
+    _rewrite_lease(claimed, pid=2**22 + 1)
+
+    reaped = reap_subagents(subagent_root)
+
+    assert reaped[0]["reason"].startswith("owner process")
+    assert read_subagent_lock(claimed) is None
+
+
+def test_reap_old_legacy_lock(subagent_root: Path) -> None:
+    """Test that an empty lock file is aged by its modification time."""
+    lock_file = subagent_root / "subagent-2" / DEFAULT_LOCK_NAME
+    lock_file.touch()
+    old = time.time() - DEFAULT_LEASE_TTL - 60
+    os.utime(lock_file, (old, old))
+
+    assert reap_subagents(subagent_root, dry_run=True)[0]["subagent"] == "subagent-2"
+    assert lock_file.exists()
+    assert [entry["subagent"] for entry in reap_subagents(subagent_root)] == ["subagent-2"]
+    assert not lock_file.exists()
+
+
+def test_reap_corrupt_expiry_falls_back_to_mtime(subagent_root: Path) -> None:
+    """Test that a lease with an unparsable expiry is aged like a legacy lock."""
+    claimed = claim_subagent(subagent_root, request_id="corrupt")
+    _rewrite_lease(claimed, expires_at="not a timestamp")
+    lock_file = claimed / DEFAULT_LOCK_NAME
+
+    assert reap_subagents(subagent_root) == []
+    old = time.time() - DEFAULT_LEASE_TTL - 60
+    os.utime(lock_file, (old, old))
+    assert [entry["subagent"] for entry in reap_subagents(subagent_root)] == ["subagent-1"]
+
+
+def test_reap_leaves_lease_renewed_after_scan(
+    subagent_root: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a lease renewed between the scan and the release keeps its partial response."""
+    from lmspace.vscode import reaper
+
+    claimed = claim_subagent(subagent_root, request_id="slow")
+    (claimed / "messages").mkdir()
+    partial = claimed / "messages" / "20250101000000_res.tmp.md"
+    partial.write_text("partial", encoding="utf-8")
+    _rewrite_lease(claimed, expires_at="2000-01-01T00:00:00+00:00")
+    scan = reaper.find_stale_subagents
+
+    def scan_then_renew(*args: object, **kwargs: object) -> list:
+        stale = scan(*args, **kwargs)
+        assert renew_lease(claimed, request_id="slow")
+        return stale
+
+    monkeypatch.setattr(reaper, "find_stale_subagents", scan_then_renew)
+
+    assert reap_subagents(subagent_root) == []
+    assert read_subagent_lock(claimed)["request_id"] == "slow"
+    assert partial.read_text(encoding="utf-8") == "partial"
+
+
+def test_heartbeat_stops_after_release(subagent_root: Path) -> None:
+    """Test that a heartbeat never recreates a lock released behind its back."""
+    claimed = claim_subagent(subagent_root, request_id="req")
+
+    with LeaseHeartbeat(claimed, "req", interval=0.01):
+        assert read_subagent_lock(claimed)["heartbeat"] is True
+        assert release_subagent(claimed, request_id="req")
+        time.sleep(0.05)
+
+    assert read_subagent_lock(claimed) is None
+    assert renew_lease(claimed, request_id="req") is False
@@ -0,0 +1,116 @@
+"""Tests for declarative pool reconciliation."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import claim_subagent, copy_agent_config, release_subagent
+from lmspace.vscode.manifest import MANIFEST_NAME, read_manifest
+from lmspace.vscode.provision import DEFAULT_LOCK_NAME, provision_subagents
+from lmspace.vscode.reconcile import load_pool_spec, reconcile_pool
+
+
+@pytest.fixture
+def template_dir(tmp_path: Path) -> Path:
+    template = tmp_path / "template"
+    template.mkdir()
+    (template / "subagent.code-workspace").write_text('{"v": 1}\n')
+    return template
+
+
+@pytest.fixture
+def spec_file(tmp_path: Path, template_dir: Path) -> Path:
+    path = tmp_path / "pool.yaml"
+    path.write_text("count: 3\ntemplate: template\nroot: agents\n")
+    return path
+
+
+def _workspace(root: Path, name: str) -> str:
+    return (root / name / f"{name}.code-workspace").read_text()
+
+
+def test_load_pool_spec_resolves_relative_paths(spec_file: Path, tmp_path: Path) -> None:
+    """Test that spec paths are relative to the spec file."""
+    spec = load_pool_spec(spec_file)
+
+    assert spec.count == 3
+    assert spec.template == tmp_path / "template"
+    assert spec.root == tmp_path / "agents"
+    assert spec.lock_name == DEFAULT_LOCK_NAME
+
+
+def test_load_pool_spec_rejects_bad_count(tmp_path: Path) -> None:
+    """Test that an invalid count is reported as a ValueError."""
+    path = tmp_path / "pool.yaml"
+    path.write_text("count: zero\n")
+
+    with pytest.raises(ValueError, match="count"):
+        load_pool_spec(path)
+
+
+def test_reconcile_creates_then_is_idempotent(spec_file: Path, tmp_path: Path) -> None:
+    """Test that a second reconcile touches nothing."""
+    first = reconcile_pool(load_pool_spec(spec_file))
+    assert first.created == ["subagent-1", "subagent-2", "subagent-3"]
+
+    mtime = (tmp_path / "agents" / "subagent-1" / "subagent-1.code-workspace").stat().st_mtime_ns
+    second = reconcile_pool(load_pool_spec(spec_file))
+
+    assert second.created == second.updated == second.deferred == []
+    assert second.current == ["subagent-1", "subagent-2", "subagent-3"]
+    assert (tmp_path / "agents" / "subagent-1" / "subagent-1.code-workspace").stat().st_mtime_ns == mtime
+
+
+def test_template_change_updates_idle_and_defers_locked(
+    spec_file: Path, template_dir: Path, tmp_path: Path
+) -> None:
+    """Test that only stale subagents change and locked ones are updated on claim."""
+    root = tmp_path / "agents"
+    reconcile_pool(load_pool_spec(spec_file))
+    busy = claim_subagent(root, request_id="busy")
+    assert busy == root / "subagent-1"
+    (template_dir / "subagent.code-workspace").write_text('{"v": 2}\n')
+
+    dry = reconcile_pool(load_pool_spec(spec_file), dry_run=True)
+    assert (dry.updated, dry.deferred) == (["subagent-2", "subagent-3"], ["subagent-1"])
+    assert _workspace(root, "subagent-2") == '{"v": 1}\n'
+
+    result = reconcile_pool(load_pool_spec(spec_file))
+
+    # Like provision, the spec's count is of unlocked subagents
+    assert result.created == ["subagent-4"]
+    assert result.updated == ["subagent-2", "subagent-3"]
+    assert result.deferred == ["subagent-1"]
+    assert _workspace(root, "subagent-2") == '{"v": 2}\n'
+    assert _workspace(root, "subagent-1") == '{"v": 1}\n'
+    assert json.loads((busy / DEFAULT_LOCK_NAME).read_text())["request_id"] == "busy"
+
+    # The next claim of the busy subagent applies the deferred update
+    release_subagent(busy, request_id="busy")
+    copy_agent_config(busy)
+    assert _workspace(root, "subagent-1") == '{"v": 2}\n'
+    assert "pending" not in read_manifest(busy)
+    final = reconcile_pool(load_pool_spec(spec_file))
+    assert final.current == ["subagent-1", "subagent-2", "subagent-3", "subagent-4"]
+    assert final.extra == ["subagent-4"]
+
+
+def test_reconcile_adopts_matching_legacy_subagents(
+    spec_file: Path, template_dir: Path, tmp_path: Path
+) -> None:
+    """Test that subagents without a manifest are not rewritten when already current."""
+    root = tmp_path / "agents"
+    provision_subagents(
+        template=template_dir, target_root=root, subagents=3,
+        lock_name=DEFAULT_LOCK_NAME, force=False, dry_run=False,
+    )
+    for manifest in root.glob(f"subagent-*/{MANIFEST_NAME}"):
+        manifest.unlink()
+
+    result = reconcile_pool(load_pool_spec(spec_file))
+
+    assert result.adopted == ["subagent-1", "subagent-2", "subagent-3"]
+    assert result.updated == []
@@ -0,0 +1,160 @@
+"""Tests for the response cache of repeated queries."""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode import agent_dispatch
+from lmspace.vscode.agent_dispatch import DEFAULT_LOCK_NAME, dispatch_agent, read_subagent_lock
+from lmspace.vscode.manifest import write_manifest
+from lmspace.vscode.response_cache import ResponseCache, cache_key, pool_template_digest
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a one-subagent pool used as the default root."""
+    root = tmp_path / "agents"
+    (root / "subagent-1").mkdir(parents=True)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.get_subagent_root", lambda: root)
+    monkeypatch.setenv("LMSPACE_NO_DAEMON", "1")
+    return root
+
+
+@pytest.fixture
+def launches(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Answer every launch with a numbered response and record its response file."""
+    launched: list[str] = []
+
+    def fake_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        final = re.search(r"-Destination '(.+?)'", sudolang_prompt).group(1)
+        launched.append(final)
+        Path(final).write_text(f"answer {len(launched)}", encoding="utf-8")
+        return True
+
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch._launch_vscode_with_chat", fake_launch)
+    return launched
+
+
+@pytest.fixture
+def prompt_file(tmp_path: Path) -> Path:
+    path = tmp_path / "expert.prompt.md"
+    path.write_text("# Expert\n", encoding="utf-8")
+    return path
+
+
+def test_cache_key_covers_prompt_attachments_and_query(tmp_path: Path, prompt_file: Path) -> None:
+    """Test that changing any input the agent sees changes the key."""
+    attachment = tmp_path / "notes"
+    attachment.mkdir()
+    (attachment / "a.txt").write_text("one", encoding="utf-8")
+    key = cache_key(prompt_file, [attachment], "hello")
+
+    assert cache_key(prompt_file, [attachment], "hello") == key
+    assert cache_key(prompt_file, [attachment], "hello!") != key
+    assert cache_key(prompt_file, [], "hello") != key
+    (attachment / "a.txt").write_text("two", encoding="utf-8")
+    assert cache_key(prompt_file, [attachment], "hello") != key
+    before = cache_key(prompt_file, [], "hello")
+    prompt_file.write_text("# Other expert\n", encoding="utf-8")
+    assert cache_key(prompt_file, [], "hello") != before
+
+
+def test_cache_key_covers_pool_template(subagent_root: Path, prompt_file: Path) -> None:
+    """Test that reprovisioning the pool from another template changes the key."""
+    key = cache_key(prompt_file, [], "hello", template_digest=pool_template_digest(subagent_root))
+
+    write_manifest(subagent_root / "subagent-1", subagent_root / "custom", "f" * 64)
+
+    assert cache_key(prompt_file, [], "hello", template_digest=pool_template_digest(subagent_root)) != key
+
+
+def test_sync_dispatch_keeps_lease_until_response_is_cached(
+    subagent_root: Path,
+    launches: list[str],
+    prompt_file: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that the agent is not told to unlock, so the response is cached under the claim."""
+    prompts: list[str] = []
+    locked_at_put: list[bool] = []
+    # The fixture's fake launch, which answers the request
+    launch = agent_dispatch._launch_vscode_with_chat
+    put = ResponseCache.put
+
+    def recording_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        prompts.append(sudolang_prompt)
+        return launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp)
+
+    def recording_put(self, key, response_file):
+        locked_at_put.append(read_subagent_lock(subagent_root / "subagent-1") is not None)
+        return put(self, key, response_file)
+
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch._launch_vscode_with_chat", recording_launch)
+    monkeypatch.setattr(ResponseCache, "put", recording_put)
+
+    assert dispatch_agent("hello", prompt_file, wait=True, cache=True) == 0
+
+    assert "lmspace code unlock" not in prompts[0]
+    assert locked_at_put == [True]
+    assert read_subagent_lock(subagent_root / "subagent-1") is None
+
+
+def test_repeated_query_is_served_without_claiming(
+    subagent_root: Path,
+    launches: list[str],
+    prompt_file: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that a cache hit prints the stored response and launches nothing."""
+    assert dispatch_agent("hello", prompt_file, wait=True, cache=True) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "answer 1"
+    assert read_subagent_lock(subagent_root / "subagent-1") is None
+
+    # Lock the only subagent: a hit must not need it
+    (subagent_root / "subagent-1" / DEFAULT_LOCK_NAME).write_text("{}", encoding="utf-8")
+    assert dispatch_agent("hello", prompt_file, wait=True, cache=True) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert json.loads(out[0])["cached"] is True
+    assert out[-1] == "answer 1"
+    assert len(launches) == 1
+
+    (subagent_root / "subagent-1" / DEFAULT_LOCK_NAME).unlink()
+    assert dispatch_agent("hello", prompt_file, wait=True, cache=False) == 0
+    assert capsys.readouterr().out.splitlines()[-1] == "answer 2"
+
+
+def test_expired_entries_are_misses(tmp_path: Path) -> None:
+    """Test that entries older than the TTL are dropped on lookup."""
+    response = tmp_path / "res.md"
+    response.write_text("old answer", encoding="utf-8")
+    ResponseCache(tmp_path, ttl=60).put("ab" * 32, response)
+
+    assert ResponseCache(tmp_path, ttl=60).get("ab" * 32) is not None
+    assert ResponseCache(tmp_path, ttl=0).get("ab" * 32) is None
+    assert ResponseCache(tmp_path, ttl=60).get("ab" * 32) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path) -> None:
+    """Test that storing past max_bytes evicts the entries used longest ago."""
+    response = tmp_path / "res.md"
+    response.write_text("x" * 10, encoding="utf-8")
+    cache = ResponseCache(tmp_path, max_bytes=25)
+    first, second, third = ("a" * 64, "b" * 64, "c" * 64)
+    cache.put(first, response)
+    time.sleep(0.01)
+    cache.put(second, response)
+    time.sleep(0.01)
+    assert cache.get(first) is not None
+    time.sleep(0.01)
+    cache.put(third, response)
+
+    assert cache.get(second) is None
+    assert not os.path.exists(cache.path_for(second))
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
@@ -0,0 +1,311 @@
+"""Tests for coalescing identical in-flight dispatches."""
+
+from __future__ import annotations
+
+import io
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.agent_dispatch import (
+    claim_subagent,
+    dispatch_agent,
+    read_subagent_lock,
+    release_subagent,
+)
+from lmspace.vscode.async_dispatch import DispatchHandle, dispatch_agent_async
+from lmspace.vscode.batch import dispatch_batch
+from lmspace.vscode.history import archive_messages
+from lmspace.vscode.pool_state import open_pool_state
+from lmspace.vscode.singleflight import SINGLE_FLIGHT_ENV, SingleFlight, dispatch_fingerprint
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Create a pool of three subagents used as the default root."""
+    root = tmp_path / "agents"
+    for i in range(1, 4):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch.get_subagent_root", lambda: root)
+    monkeypatch.setenv("LMSPACE_NO_DAEMON", "1")
+    monkeypatch.setenv(SINGLE_FLIGHT_ENV, "1")
+    return root
+
+
+@pytest.fixture
+def launches(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Answer every launch after a short delay and record the subagents launched."""
+    launched: list[str] = []
+
+    def fake_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        launched.append(subagent_dir.name)
+        final = re.search(r"-Destination '(.+?)'", sudolang_prompt).group(1)
+        answer = f"answer from {subagent_dir.name}"
+        threading.Timer(0.3, Path(final).write_text, args=(answer,)).start()
+        return True
+
+    for module in ("agent_dispatch", "async_dispatch", "batch"):
+        monkeypatch.setattr(f"lmspace.vscode.{module}._launch_vscode_with_chat", fake_launch)
+    return launched
+
+
+def _inflight(subagent_root: Path) -> list[dict]:
+    with open_pool_state(subagent_root) as store:
+        return [dict(row) for row in store.query("SELECT * FROM inflight")]
+
+
+def test_batch_duplicates_share_one_subagent(
+    subagent_root: Path, launches: list[str], tmp_path: Path
+) -> None:
+    """Test that identical jobs run once and every duplicate gets the same response."""
+    (tmp_path / "expert.prompt.md").write_text("# Expert\n", encoding="utf-8")
+    queries = ["same question", "same question", "same question", "other question"]
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text(
+        "".join(
+            json.dumps({"id": f"job-{i}", "prompt_file": "expert.prompt.md", "query": q}) + "\n"
+            for i, q in enumerate(queries)
+        ),
+        encoding="utf-8",
+    )
+    output = io.StringIO()
+
+    result = dispatch_batch(
+        jobs, subagent_root=subagent_root, max_concurrency=4, timeout=10.0, output=output
+    )
+
+    assert result == 0
+    results = {line["id"]: line for line in map(json.loads, output.getvalue().splitlines())}
+    assert len(launches) == 2
+    same = [results[f"job-{i}"] for i in range(3)]
+    assert len({result["response"] for result in same}) == 1
+    assert sum("coalesced_with" in result for result in same) == 2
+    assert _inflight(subagent_root) == []
+
+
+def test_concurrent_chats_coalesce_and_clear_registry(
+    subagent_root: Path,
+    launches: list[str],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that a duplicate sync chat attaches to the first and the registry empties."""
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+    results: list[int] = []
+    threads = [
+        threading.Thread(target=lambda: results.append(dispatch_agent("hi", prompt_file, wait=True)))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [0, 0]
+    assert launches == ["subagent-1"]
+    out = capsys.readouterr().out.splitlines()
+    assert out.count("answer from subagent-1") == 2
+    assert _inflight(subagent_root) == []
+    assert read_subagent_lock(subagent_root / "subagent-1") is None
+
+
+def test_async_leader_stays_registered_until_unlock(
+    subagent_root: Path,
+    launches: list[str],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that an async duplicate is pointed at the running request's response file."""
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+
+    assert dispatch_agent("hi", prompt_file) == 0
+    leader = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert dispatch_agent("hi", prompt_file) == 0
+    follower = json.loads(capsys.readouterr().out.splitlines()[0])
+
+    assert follower["response_file"] == leader["response_file"]
+    assert follower["coalesced_with"] == _inflight(subagent_root)[0]["request_id"]
+    assert launches == ["subagent-1"]
+
+    release_subagent(subagent_root / "subagent-1")
+    assert _inflight(subagent_root) == []
+
+
+def _publish_silent_leader(subagent_root: Path, prompt_file: Path) -> Path:
+    """Register a launched request for "hi" on subagent-1 that never answers."""
+    subagent_dir = claim_subagent(subagent_root, request_id="silent")
+    fingerprint = dispatch_fingerprint(subagent_root, prompt_file, [], "hi")
+    with SingleFlight(subagent_root, fingerprint, request_id="silent") as flight:
+        flight.publish(subagent_dir, subagent_dir / "messages" / "silent_res.md")
+        flight.keep()
+    return subagent_dir
+
+
+def _wait_for_follower(capsys: pytest.CaptureFixture[str]) -> str:
+    """Wait until a dispatch has joined the request in flight; return its stderr so far."""
+    err = ""
+    deadline = time.monotonic() + 10
+    while "Joined identical in-flight request" not in err and time.monotonic() < deadline:
+        time.sleep(0.02)
+        err += capsys.readouterr().err
+    return err
+
+
+def test_failed_launch_does_not_strand_duplicates(
+    subagent_root: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that a duplicate of a leader whose launch fails dispatches the query itself."""
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+    launched: list[str] = []
+
+    def flaky_launch(subagent_dir, chat_id, attachment_paths, sudolang_prompt, timestamp, bundle=None):
+        launched.append(subagent_dir.name)
+        if len(launched) == 1:
+            time.sleep(0.3)
+            return False
+        final = re.search(r"-Destination '(.+?)'", sudolang_prompt).group(1)
+        Path(final).write_text(f"answer from {subagent_dir.name}", encoding="utf-8")
+        return True
+
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch._launch_vscode_with_chat", flaky_launch)
+    results: list[int] = []
+    threads = [
+        threading.Thread(target=lambda: results.append(dispatch_agent("hi", prompt_file, wait=True)))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert sorted(results) == [0, 1]
+    assert len(launched) == 2
+    assert _inflight(subagent_root) == []
+
+
+def test_follower_takes_over_when_leader_ends_without_response(
+    subagent_root: Path,
+    launches: list[str],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that a waiting duplicate claims its own subagent once the leader is released unanswered."""
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+    silent = _publish_silent_leader(subagent_root, prompt_file)
+    results: list[int] = []
+    follower = threading.Thread(target=lambda: results.append(dispatch_agent("hi", prompt_file, wait=True)))
+    follower.start()
+    assert "silent" in _wait_for_follower(capsys)
+
+    release_subagent(silent, request_id="silent")
+    follower.join(timeout=30)
+
+    assert results == [0]
+    assert launches == ["subagent-1"]
+    captured = capsys.readouterr()
+    assert "Request silent ended without a response" in captured.err
+    assert captured.out.splitlines()[-1] == "answer from subagent-1"
+
+
+@pytest.mark.asyncio
+async def test_shared_handle_takes_over_when_leader_ends_without_response(
+    subagent_root: Path, launches: list[str], tmp_path: Path
+) -> None:
+    """Test that a joined async handle dispatches the query itself once the leader is gone."""
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+    silent = _publish_silent_leader(subagent_root, prompt_file)
+    handle = await dispatch_agent_async("hi", prompt_file, subagent_root=subagent_root)
+    assert handle.shared
+
+    release_subagent(silent, request_id="silent")
+    result = await handle.result(timeout=30)
+
+    assert result.response == "answer from subagent-1"
+    assert result.request_id != "silent"
+    assert launches == ["subagent-1"]
+    assert read_subagent_lock(subagent_root / "subagent-1") is None
+
+
+def test_duplicate_stops_waiting_for_unpublished_leader(subagent_root: Path) -> None:
+    """Test that a duplicate gives up on a leader that stays unpublished past the join timeout."""
+    with SingleFlight(subagent_root, "f" * 64, request_id="queued") as flight:
+        flight.keep()
+
+    with SingleFlight(subagent_root, "f" * 64, request_id="impatient", join_timeout=0.1) as flight:
+        assert flight.leader is None
+        flight.publish(subagent_root / "subagent-2", subagent_root / "subagent-2" / "x_res.md")
+    assert [entry["request_id"] for entry in _inflight(subagent_root)] == ["queued"]
+    assert _inflight(subagent_root)[0]["subagent"] is None
+
+
+def test_dead_unpublished_leader_is_taken_over(subagent_root: Path) -> None:
+    """Test that an entry left by an exited process does not block its duplicates."""
+    with SingleFlight(subagent_root, "f" * 64, request_id="dead") as flight:
+        flight.keep()
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    with open_pool_state(subagent_root) as store:
+        with store.transaction() as conn:
+            conn.execute("UPDATE inflight SET pid = ?", (exited.pid,))
+
+    with SingleFlight(subagent_root, "f" * 64, request_id="live") as flight:
+        assert flight.leader is None
+        assert [entry["request_id"] for entry in _inflight(subagent_root)] == ["live"]
+    assert _inflight(subagent_root) == []
+
+
+@pytest.mark.asyncio
+async def test_shared_handle_reads_archived_response(
+    subagent_root: Path, launches: list[str], tmp_path: Path
+) -> None:
+    """Test that a joined async handle finds the response after the next claim archived it."""
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+    leader = await dispatch_agent_async("hi", prompt_file, subagent_root=subagent_root)
+    answer = (await leader.result(timeout=5)).response
+    # What claiming subagent-1 again does to the leader's messages
+    archive_messages(leader.subagent_dir)
+    for message in (leader.subagent_dir / "messages").iterdir():
+        message.unlink()
+
+    follower = DispatchHandle(
+        request_id=leader.request_id,
+        subagent_dir=leader.subagent_dir,
+        response_file=leader.response_file,
+        temp_file=leader.temp_file,
+        release_on_completion=False,
+        shared=True,
+    )
+
+    assert (await follower.result(timeout=5)).response == answer
+
+
+def test_single_flight_is_opt_in(
+    subagent_root: Path,
+    launches: list[str],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that without LMSPACE_SINGLE_FLIGHT every request gets its own subagent."""
+    monkeypatch.delenv(SINGLE_FLIGHT_ENV)
+    prompt_file = tmp_path / "expert.prompt.md"
+    prompt_file.write_text("# Expert\n", encoding="utf-8")
+
+    assert dispatch_agent("hi", prompt_file) == 0
+    assert dispatch_agent("hi", prompt_file) == 0
+
+    assert launches == ["subagent-1", "subagent-2"]
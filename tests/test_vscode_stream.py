@@ -0,0 +1,66 @@
+"""Tests for printing agent responses, whole and streamed."""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode import agent_dispatch
+from lmspace.vscode.agent_dispatch import wait_for_response_output
+
+
+class RecordingStdout(io.StringIO):
+    """Stdout that signals when a given text has been printed."""
+
+    def __init__(self, expected: str) -> None:
+        super().__init__()
+        self.expected = expected
+        self.seen = threading.Event()
+
+    def write(self, text: str) -> int:
+        written = super().write(text)
+        if self.expected in self.getvalue():
+            self.seen.set()
+        return written
+
+
+def test_stream_prints_partial_output_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that streamed output arrives before the rename and is not repeated after it."""
+    tmp_file = tmp_path / "1_res.tmp.md"
+    final_file = tmp_path / "1_res.md"
+    stdout = RecordingStdout("first part\n")
+    monkeypatch.setattr("sys.stdout", stdout)
+    streamed_early = []
+
+    def agent() -> None:
+        with tmp_file.open("a", encoding="utf-8") as handle:
+            handle.write("first part\n")
+        streamed_early.append(stdout.seen.wait(5.0))
+        with tmp_file.open("a", encoding="utf-8") as handle:
+            handle.write("second part")
+        os.replace(tmp_file, final_file)
+
+    writer = threading.Thread(target=agent)
+    writer.start()
+    assert wait_for_response_output(final_file, response_file_tmp=tmp_file, stream=True)
+    writer.join()
+
+    assert streamed_early == [True]
+    assert stdout.getvalue() == "first part\nsecond part\n"
+
+
+def test_response_is_copied_in_chunks(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test that chunked copying keeps multi-byte characters split across chunks intact."""
+    monkeypatch.setattr(agent_dispatch, "RESPONSE_CHUNK_SIZE", 3)
+    final_file = tmp_path / "1_res.md"
+    final_file.write_text("héllo wörld ✓", encoding="utf-8")
+
+    assert wait_for_response_output(final_file)
+
+    assert capsys.readouterr().out == "héllo wörld ✓\n"
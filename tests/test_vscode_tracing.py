@@ -0,0 +1,111 @@
+"""Tests for per-phase dispatch tracing."""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.loadtest import run_load_test
+from lmspace.vscode.tracing import (
+    TRACE_ENV,
+    TRACE_MAX_BYTES_ENV,
+    rotated_trace_file,
+    set_attribute,
+    span,
+    trace,
+)
+
+REQUEST_ID = "0123456789abcdef0123456789abcdef"
+
+
+def _read_spans(trace_file: Path) -> list[list[dict]]:
+    traces = []
+    for line in trace_file.read_text(encoding="utf-8").splitlines():
+        record = json.loads(line)
+        (resource,) = record["resourceSpans"]
+        (scope,) = resource["scopeSpans"]
+        traces.append(scope["spans"])
+    return traces
+
+
+def test_trace_writes_nested_spans_as_otlp_json(tmp_path: Path) -> None:
+    """Test that a trace is written as one OTLP/JSON line with parent links."""
+    trace_file = tmp_path / "traces.jsonl"
+
+    with trace("dispatch", request_id=REQUEST_ID, trace_file=trace_file):
+        with span("pool.claim"):
+            set_attribute("lmspace.subagent", "subagent-1")
+        with pytest.raises(RuntimeError):
+            with span("chat.send"):
+                raise RuntimeError("no window")
+
+    (spans,) = _read_spans(trace_file)
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["dispatch"]
+    assert "parentSpanId" not in root
+    assert {s["traceId"] for s in spans} == {REQUEST_ID}
+    assert by_name["pool.claim"]["parentSpanId"] == root["spanId"]
+    assert {"key": "lmspace.subagent", "value": {"stringValue": "subagent-1"}} in by_name["pool.claim"]["attributes"]
+    assert by_name["chat.send"]["status"] == {"code": 2, "message": "RuntimeError: no window"}
+    assert int(root["endTimeUnixNano"]) >= int(by_name["chat.send"]["endTimeUnixNano"])
+
+
+def test_span_outside_trace_and_disabled_tracing_write_nothing(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that spans are no-ops without a trace and that LMSPACE_TRACE=0 disables tracing."""
+    trace_file = tmp_path / "traces.jsonl"
+    with span("pool.claim") as orphan:
+        set_attribute("ignored", True)
+    assert orphan is None
+
+    monkeypatch.setenv(TRACE_ENV, "0")
+    with trace("dispatch", request_id=REQUEST_ID, trace_file=trace_file) as root:
+        with span("pool.claim"):
+            pass
+
+    assert root is None
+    assert not trace_file.exists()
+
+
+def test_trace_file_is_rotated_once_full(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a trace that would push the file past the limit moves it to .1 first."""
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setenv(TRACE_MAX_BYTES_ENV, "2000")
+
+    for _ in range(3):
+        with trace("dispatch", request_id=REQUEST_ID, trace_file=trace_file, padding="x" * 400):
+            pass
+
+    assert len(_read_spans(trace_file)) == 1
+    assert len(_read_spans(rotated_trace_file(trace_file))) == 2
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fake windows are POSIX processes")
+def test_dispatch_traces_every_phase(tmp_path: Path) -> None:
+    """Test that a sync dispatch records its phases under the request id in req.md."""
+    run_load_test(dispatches=1, concurrency=1, subagents=1, startup=0.05, latency=0.05, workdir=tmp_path)
+
+    (spans,) = _read_spans(tmp_path / "agents" / ".lmspace-pool" / "traces.jsonl")
+    names = {s["name"] for s in spans}
+    assert {
+        "dispatch",
+        "pool.claim",
+        "subagent.prepare",
+        "vscode.launch",
+        "launch.lock_wait",
+        "window.focus",
+        "window.open",
+        "window.ready",
+        "chat.send",
+        "agent.answer",
+        "response.read",
+    } <= names
+
+    (request,) = (tmp_path / "agents" / "subagent-1" / "messages").glob("*_req.md")
+    request_id = re.search(r"lmspace-request-id: (\w+)", request.read_text(encoding="utf-8")).group(1)
+    assert {s["traceId"] for s in spans} == {request_id}
@@ -12,6 +12,7 @@ import pytest
 sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
 
 from lmspace.vscode.agent_dispatch import (
+    claim_subagent,
     get_all_subagent_workspaces,
     warmup_subagents,
 )
@@ -69,8 +70,8 @@ def test_warmup_subagents_no_workspaces(tmp_path: Path) -> None:
     assert result == 1
 
 
-@patch("subprocess.Popen")
-def test_warmup_subagents_dry_run(mock_popen: MagicMock, tmp_path: Path) -> None:
+@patch("subprocess.run")
+def test_warmup_subagents_dry_run(mock_run: MagicMock, tmp_path: Path) -> None:
     """Test that warmup_subagents in dry-run mode doesn't open workspaces."""
     # Create subagent with workspace
     subagent_dir = tmp_path / "subagent-1"
@@ -81,12 +82,12 @@ def test_warmup_subagents_dry_run(mock_popen: MagicMock, tmp_path: Path) -> None
     result = warmup_subagents(subagent_root=tmp_path, dry_run=True)
     
     assert result == 0
-    mock_popen.assert_not_called()
+    mock_run.assert_not_called()
 
 
-@patch("subprocess.Popen")
+@patch("subprocess.run")
 def test_warmup_subagents_opens_workspaces(
-    mock_popen: MagicMock,
+    mock_run: MagicMock,
     tmp_path: Path,
 ) -> None:
     """Test that warmup_subagents opens all workspaces."""
@@ -100,12 +101,12 @@ def test_warmup_subagents_opens_workspaces(
     result = warmup_subagents(subagent_root=tmp_path, subagents=3)
     
     assert result == 0
-    assert mock_popen.call_count == 3
+    assert mock_run.call_count == 3
 
 
-@patch("subprocess.Popen", side_effect=Exception("Failed to open"))
+@patch("subprocess.run", side_effect=Exception("Failed to open"))
 def test_warmup_subagents_handles_errors(
-    mock_popen: MagicMock,
+    mock_run: MagicMock,
     tmp_path: Path,
 ) -> None:
     """Test that warmup_subagents handles errors gracefully."""
@@ -118,12 +119,12 @@ def test_warmup_subagents_handles_errors(
     # Should complete despite the error
     result = warmup_subagents(subagent_root=tmp_path)
     assert result == 0
-    mock_popen.assert_called_once()
+    mock_run.assert_called_once()
 
 
-@patch("subprocess.Popen")
+@patch("subprocess.run")
 def test_warmup_subagents_respects_count_limit(
-    mock_popen: MagicMock,
+    mock_run: MagicMock,
     tmp_path: Path,
 ) -> None:
     """Test that warmup_subagents only opens the specified number of workspaces."""
@@ -138,12 +139,12 @@ def test_warmup_subagents_respects_count_limit(
     result = warmup_subagents(subagent_root=tmp_path, subagents=2)
     
     assert result == 0
-    assert mock_popen.call_count == 2
+    assert mock_run.call_count == 2
 
 
-@patch("subprocess.Popen")
+@patch("subprocess.run")
 def test_warmup_subagents_default_opens_one(
-    mock_popen: MagicMock,
+    mock_run: MagicMock,
     tmp_path: Path,
 ) -> None:
     """Test that warmup_subagents defaults to opening 1 workspace."""
@@ -158,4 +159,67 @@ def test_warmup_subagents_default_opens_one(
     result = warmup_subagents(subagent_root=tmp_path)
     
     assert result == 0
-    assert mock_popen.call_count == 1
+    assert mock_run.call_count == 1
+
+
+def _make_subagents(root: Path, count: int) -> None:
+    for i in range(1, count + 1):
+        subagent_dir = root / f"subagent-{i}"
+        subagent_dir.mkdir()
+        (subagent_dir / f"subagent-{i}.code-workspace").write_text("{}", encoding="utf-8")
+
+
+@patch("subprocess.run")
+def test_warmup_prefers_unlocked_subagents(mock_run: MagicMock, tmp_path: Path) -> None:
+    """Test that locked subagents are warmed only after unlocked ones."""
+    _make_subagents(tmp_path, 3)
+    assert claim_subagent(tmp_path, request_id="busy") == tmp_path / "subagent-1"
+
+    assert warmup_subagents(subagent_root=tmp_path, subagents=2) == 0
+
+    opened = [Path(c.args[0][-1]).parent.name for c in mock_run.call_args_list]
+    assert opened == ["subagent-2", "subagent-3"]
+
+
+def test_staged_warmup_limits_concurrency_and_retries(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test that staged warmup caps windows in flight and retries failed ones."""
+    import threading
+    import time
+
+    _make_subagents(tmp_path, 4)
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    attempts: dict[str, int] = {}
+
+    def fake_open(workspace_path, subagent_dir, timeout, *, launch_lock=None):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+            attempts[subagent_dir.name] = attempts.get(subagent_dir.name, 0) + 1
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        # subagent-2 misses its first readiness check, subagent-4 never answers
+        if subagent_dir.name == "subagent-4":
+            return False
+        return subagent_dir.name != "subagent-2" or attempts["subagent-2"] > 1
+
+    monkeypatch.setattr("lmspace.vscode.agent_dispatch._open_and_wait_ready", fake_open)
+
+    result = warmup_subagents(
+        subagent_root=tmp_path, subagents=4, wait_ready=True, concurrency=2, retries=1
+    )
+
+    err = capsys.readouterr().err
+    assert result == 1
+    assert peak == 2
+    assert attempts == {"subagent-1": 1, "subagent-2": 2, "subagent-3": 1, "subagent-4": 2}
+    assert "subagent-2  ready in" in err and "(2 attempts)" in err
+    assert "subagent-4  not ready after 2 attempt(s)" in err
+    assert "3/4 windows ready" in err
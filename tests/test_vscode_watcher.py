@@ -0,0 +1,96 @@
+"""Tests for the shared file watcher."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from lmspace.vscode.watcher import FileWatcher, InotifyWatcher, PollingWatcher
+
+
+def _backends() -> list:
+    backends = [pytest.param(PollingWatcher, id="polling")]
+    try:
+        InotifyWatcher()
+    except (OSError, AttributeError):
+        pass
+    else:
+        backends.append(pytest.param(InotifyWatcher, id="inotify"))
+    return backends
+
+
+@pytest.fixture(params=_backends())
+def watcher(request: pytest.FixtureRequest) -> FileWatcher:
+    return request.param()
+
+
+def test_wait_for_detects_rename(watcher: FileWatcher, tmp_path: Path) -> None:
+    """Test that renaming the temp response into place wakes the waiter quickly."""
+    tmp_file = tmp_path / "1_res.tmp.md"
+    final_file = tmp_path / "1_res.md"
+    tmp_file.write_text("answer", encoding="utf-8")
+    threading.Timer(0.05, tmp_file.rename, args=(final_file,)).start()
+
+    started = time.monotonic()
+    assert watcher.wait_for(final_file, timeout=5.0) is True
+    assert time.monotonic() - started < 1.0
+
+
+def test_wait_for_existing_file_returns_immediately(watcher: FileWatcher, tmp_path: Path) -> None:
+    """Test that a file that already exists does not wait for an event."""
+    path = tmp_path / "done.md"
+    path.write_text("x", encoding="utf-8")
+
+    assert watcher.wait_for(path, timeout=0.0) is True
+
+
+def test_wait_for_timeout(watcher: FileWatcher, tmp_path: Path) -> None:
+    """Test that a missing file times out."""
+    assert watcher.wait_for(tmp_path / "never.md", timeout=0.05) is False
+
+
+def test_one_watcher_serves_many_waiters(watcher: FileWatcher, tmp_path: Path) -> None:
+    """Test that concurrent waiters on different files each wake on their own file."""
+    paths = [tmp_path / f"{i}_res.md" for i in range(20)]
+    for i, path in enumerate(paths):
+        threading.Timer(0.01 * i, path.write_text, args=("x",)).start()
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        results = list(executor.map(lambda p: watcher.wait_for(p, timeout=5.0), paths))
+
+    assert results == [True] * len(paths)
+
+
+def test_wait_for_async(watcher: FileWatcher, tmp_path: Path) -> None:
+    """Test that the async wait wakes without blocking the event loop."""
+    path = tmp_path / "async_res.md"
+
+    async def scenario() -> tuple[bool, bool]:
+        waiting = asyncio.ensure_future(watcher.wait_for_async(path, timeout=5.0))
+        await asyncio.sleep(0.05)
+        path.write_text("x", encoding="utf-8")
+        missing = await watcher.wait_for_async(tmp_path / "missing.md", timeout=0.05)
+        return await waiting, missing
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_inotify_falls_back_for_missing_directory(tmp_path: Path) -> None:
+    """Test that a directory created after the wait started is still noticed."""
+    if not any(p.id == "inotify" for p in _backends()):
+        pytest.skip("inotify unavailable")
+    watcher = InotifyWatcher()
+    path = tmp_path / "messages" / "1_res.md"
+
+    def create() -> None:
+        path.parent.mkdir()
+        path.write_text("x", encoding="utf-8")
+
+    threading.Timer(0.05, create).start()
+
+    assert watcher.wait_for(path, timeout=5.0) is True
@@ -0,0 +1,79 @@
+"""Tests for the cached VS Code window registry."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from lmspace.vscode.pool_state import open_pool_state
+from lmspace.vscode.windows import WindowRegistry, parse_code_status
+
+STATUS_OUTPUT = """\
+Version:          Code 1.95.0
+CPU %\tMem MB\t   PID\tProcess
+    0\t   123\t  4000\tcode main
+    0\t    98\t  4001\t  window [1] (subagent-10 (Workspace) - Visual Studio Code)
+    0\t    97\t  4002\t  window [2] (notes.md - subagent-2 (Workspace) - Visual Studio Code)
+    0\t    50\t  4003\t    extensionHost [1]
+"""
+
+
+@pytest.fixture
+def subagent_root(tmp_path: Path) -> Path:
+    root = tmp_path / "agents"
+    for i in (1, 2):
+        (root / f"subagent-{i}").mkdir(parents=True)
+    return root
+
+
+def test_parse_code_status_matches_names_exactly() -> None:
+    """Test that window titles map to exact workspace names and PIDs."""
+    windows = parse_code_status(STATUS_OUTPUT)
+
+    assert windows == {"subagent-10": 4001, "subagent-2": 4002}
+    assert "subagent-1" not in windows
+
+
+def test_registry_probes_once_within_ttl(subagent_root: Path) -> None:
+    """Test that a fresh snapshot answers later lookups without probing."""
+    probe = MagicMock(return_value={"subagent-1": os.getpid()})
+
+    with open_pool_state(subagent_root) as store:
+        windows = WindowRegistry(store, probe=probe)
+        assert windows.is_open("subagent-1") is True
+        assert windows.is_open("subagent-2") is False
+        assert windows.is_open("subagent-1") is True
+
+    assert probe.call_count == 1
+
+
+def test_registry_forgets_window_with_dead_process(subagent_root: Path) -> None:
+    """Test that a cached window whose process has exited is reported closed."""
+    probe = MagicMock(return_value={"subagent-1": 2**22 + 1})
+
+    with open_pool_state(subagent_root) as store:
+        windows = WindowRegistry(store, probe=probe)
+        windows.refresh()
+        assert windows.lookup("subagent-1") is not None
+
+        assert windows.is_open("subagent-1") is False
+        assert windows.lookup("subagent-1") is None
+
+
+def test_registry_keeps_ready_time_across_refresh(subagent_root: Path) -> None:
+    """Test that readiness survives a refresh while the window process is the same."""
+    pid = os.getpid()
+    probe = MagicMock(return_value={"subagent-1": pid})
+
+    with open_pool_state(subagent_root) as store:
+        windows = WindowRegistry(store, probe=probe)
+        windows.mark_ready("subagent-1")
+        ready_at = windows.lookup("subagent-1").ready_at
+        windows.refresh()
+
+        record = windows.lookup("subagent-1")
+        assert record.pid == pid
+        assert record.ready_at == ready_at